@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark harness for the replacement, XML diff and conversion paths.
+
+Generates synthetic mod trees (dialogs shaped like the game's, an
+english.xml pair and a set of re-versioned "colliding" handles), runs each
+stage against them and prints a JSON report with per-stage timings,
+throughput and peak RSS:
+
+    python benchmark.py --scale small --scale medium > bench_output.txt
+    python benchmark.py --dialogs 40 --handles 20000 --collisions 3000
+
+Nothing in the repository is touched; trees are generated in a temporary
+directory (or --workdir) and removed afterwards unless --keep is given.
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import lsf_codec
+from lsf_codec import Node, Resource, TranslatedString
+import fix_translations as ft
+
+# name: (dialogs, handles, collisions)
+SCALES = {
+    "small": (10, 2000, 200),
+    "medium": (50, 20000, 2000),
+    "large": (200, 100000, 10000),
+}
+
+STAGES = ("diff", "index_cold", "index_warm", "replace_files", "replace_run", "lsx_to_lsf", "lsf_to_lsx")
+
+# editorData keys of a real dialog node, used as filler so node sizes look like the game's
+EDITOR_DATA_KEYS = ("AnimationTags", "Attitude", "CinematicNodeContext", "CinematicObjects",
+                    "CustomCineArtKeysPresent", "CustomLightingPresent", "CustomSoundPresent",
+                    "CustomVFXPresent", "Emotion", "ForceNPCAnimation", "HasVoiceOverAudio", "NodeContext")
+
+
+def random_handle(rng):
+    """A handle in the game's h########g####g####g####g############ form."""
+    digits = "%032x" % rng.getrandbits(128)
+    return f"h{digits[:8]}g{digits[8:12]}g{digits[12:16]}g{digits[16:20]}g{digits[20:]}"
+
+
+def random_uuid(rng):
+    digits = "%032x" % rng.getrandbits(128)
+    return f"{digits[:8]}-{digits[8:12]}-{digits[12:16]}-{digits[16:20]}-{digits[20:]}"
+
+
+def build_dialog(rng, handles, versions):
+    """A dialog Resource with one TagAnswer node per handle, laid out like CAMP_Halsin2_000.
+
+    versions maps handles whose references carry a bumped version to that version.
+    """
+    dialog = Node("dialog")
+    dialog.attributes["UUID"] = (lsf_codec.DT_FIXEDSTRING, random_uuid(rng))
+    dialog.attributes["category"] = (lsf_codec.DT_LSSTRING, "Generic NPC Dialog")
+    nodes = Node("nodes")
+    dialog.children.append(nodes)
+    for group_index, handle in enumerate(handles):
+        node = Node("node")
+        node.attributes["GroupID"] = (lsf_codec.DT_FIXEDSTRING, random_uuid(rng))
+        node.attributes["GroupIndex"] = (lsf_codec.DT_INT, group_index)
+        node.attributes["UUID"] = (lsf_codec.DT_FIXEDSTRING, random_uuid(rng))
+        node.attributes["constructor"] = (lsf_codec.DT_FIXEDSTRING, "TagAnswer")
+        tagged_texts = Node("TaggedTexts")
+        tagged_text = Node("TaggedText")
+        tagged_text.attributes["HasTagRule"] = (lsf_codec.DT_BOOL, True)
+        tag_texts = Node("TagTexts")
+        tag_text = Node("TagText")
+        tag_text.attributes["LineId"] = (lsf_codec.DT_UUID, random_uuid(rng))
+        tag_text.attributes["TagText"] = (lsf_codec.DT_TRANSLATEDSTRING, TranslatedString(handle, versions.get(handle, 1)))
+        tag_text.attributes["stub"] = (lsf_codec.DT_BOOL, True)
+        tag_texts.children.append(tag_text)
+        tagged_text.children.append(tag_texts)
+        tagged_texts.children.append(tagged_text)
+        node.children.append(tagged_texts)
+        editor_data = Node("editorData")
+        for key in EDITOR_DATA_KEYS:
+            data = Node("data")
+            data.attributes["key"] = (lsf_codec.DT_FIXEDSTRING, key)
+            data.attributes["val"] = (lsf_codec.DT_LSSTRING, rng.choice(("", "Default", "False")))
+            editor_data.children.append(data)
+        node.children.append(editor_data)
+        nodes.children.append(node)
+    return Resource([dialog], engine_version=(4, 7, 1, 3))
+
+
+def _lsj_scalar(type_id, value):
+    if type_id == lsf_codec.DT_BOOL:
+        return "true" if value else "false"
+    if isinstance(value, str):
+        return json.dumps(value)
+    return str(value)
+
+
+def write_lsj(resource):
+    """Render a Resource as LSJ text in LSLib's layout (3-space indent, "key" : value)."""
+    lines = ["{", '   "save" : {', '      "header" : {',
+             '         "version" : "%d.%d.%d.%d"' % resource.engine_version, "      },", '      "regions" : {']
+
+    def node_members(node, indent):
+        members = []
+        for name, (type_id, value) in node.attributes.items():
+            if type_id == lsf_codec.DT_TRANSLATEDSTRING:
+                members.append((name, [f'{indent}"{name}" : {{',
+                                       f'{indent}   "handle" : "{value.handle}",',
+                                       f'{indent}   "type" : "TranslatedString",',
+                                       f'{indent}   "version" : {value.version}',
+                                       f"{indent}}}"]))
+            else:
+                members.append((name, [f'{indent}"{name}" : {{"type" : "{lsf_codec.TYPE_NAMES[type_id]}", '
+                                       f'"value" : {_lsj_scalar(type_id, value)}}}']))
+        groups = {}
+        for child in node.children:
+            groups.setdefault(child.name, []).append(child)
+        for name, children in groups.items():
+            block = [f'{indent}"{name}" : [']
+            for index, child in enumerate(children):
+                block.append(f"{indent}   {{")
+                block.extend(node_members(child, indent + "      "))
+                block.append(f"{indent}   }}" + ("," if index < len(children) - 1 else ""))
+            block.append(f"{indent}]")
+            members.append((name, block))
+        out = []
+        members.sort(key=lambda member: member[0])
+        for index, (_, block) in enumerate(members):
+            if index < len(members) - 1:
+                block = block[:-1] + [block[-1] + ","]
+            out.extend(block)
+        return out
+
+    for index, region in enumerate(resource.regions):
+        lines.append(f'         "{region.name}" : {{')
+        lines.extend(node_members(region, "            "))
+        lines.append("         }" + ("," if index < len(resource.regions) - 1 else ""))
+    lines += ["      }", "   }", "}"]
+    return "\n".join(lines).encode("utf-8")
+
+
+def write_localization(path, entries):
+    """Write an english.xml: entries are (contentuid, version, text)."""
+    lines = ['<?xml version="1.0" encoding="utf-8"?>', "<contentList>"]
+    for contentuid, version, text in entries:
+        lines.append(f'  <content contentuid="{contentuid}" version="{version}">{text}</content>')
+    lines.append("</contentList>")
+    Path(path).write_text("\n".join(lines), encoding="utf-8")
+
+
+def generate_tree(root, dialogs, handles, collisions, seed=1):
+    """Generate a synthetic mod tree and return its description.
+
+    Half of the dialogs are LSJ, half LSX. english.xml re-versions
+    `collisions` handles with unchanged text (these get reverted and
+    rewritten everywhere) and another tenth as many with changed text
+    (these must be left alone).
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    dialog_dir = root / "Mods" / "Bench" / "Story" / "Dialogs"
+    dialog_dir.mkdir(parents=True, exist_ok=True)
+    all_handles = [random_handle(rng) for _ in range(handles)]
+    colliding = set(rng.sample(all_handles, min(collisions, handles)))
+    changed = set(rng.sample(sorted(set(all_handles) - colliding), min(collisions // 10, handles - len(colliding))))
+    # The dialogs already reference the bumped versions, as after the game re-exported them
+    bumped = {handle: 2 for handle in colliding | changed}
+    per_dialog = max(1, handles // max(dialogs, 1))
+    for index in range(dialogs):
+        chunk = all_handles[index * per_dialog:(index + 1) * per_dialog]
+        resource = build_dialog(rng, chunk, bumped)
+        if index % 2 == 0:
+            (dialog_dir / f"BENCH_Dialog{index:04d}_000.lsj").write_bytes(write_lsj(resource))
+        else:
+            (dialog_dir / f"BENCH_Dialog{index:04d}_000.lsx").write_bytes(lsf_codec.write_lsx(resource, "\n"))
+
+    original = [(handle, 1, f"Line {index}") for index, handle in enumerate(all_handles)]
+    new = []
+    for index, handle in enumerate(all_handles):
+        if handle in colliding:
+            new.append((handle, 2, f"Line {index}"))
+        elif handle in changed:
+            new.append((handle, 2, f"Changed line {index}"))
+        else:
+            new.append((handle, 1, f"Line {index}"))
+    localization = root / "Localization"
+    localization.mkdir(exist_ok=True)
+    write_localization(root / "original_english.xml", original)
+    write_localization(localization / "english.xml", new)
+    return {"dialogs": dialogs, "handles": handles, "collisions": len(colliding), "changed_text": len(changed)}
+
+
+def tree_size(root, suffixes):
+    files = [path for path in Path(root).rglob("*") if path.is_file() and path.suffix.lower() in suffixes
+             and ft.CACHE_DIR_NAME not in path.parts]
+    return files, sum(path.stat().st_size for path in files)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its finished children, in MB."""
+    if resource is None:
+        return {"self": None, "children": None}
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB elsewhere
+    return {"self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1),
+            "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor, 1)}
+
+
+def stage_record(seconds, files=None, size=None, **extra):
+    record = {"seconds": round(seconds, 4)}
+    if files is not None:
+        record["files"] = files
+        record["files_per_s"] = round(files / seconds, 1) if seconds else None
+    if size is not None:
+        record["bytes"] = size
+        record["mb_per_s"] = round(size / seconds / 1e6, 2) if seconds else None
+    record.update(extra)
+    record["peak_rss_mb"] = peak_rss_mb()
+    return record
+
+
+def run_worker(worker):
+    """Run a worker synchronously; returns (seconds, summary) and raises on a worker error."""
+    outcome = {}
+    worker.finished_signal.connect(lambda result: outcome.__setitem__("summary", result))
+    worker.error_signal.connect(lambda message: outcome.__setitem__("error", message))
+    start = time.perf_counter()
+    worker.run()
+    seconds = time.perf_counter() - start
+    if "error" in outcome:
+        raise RuntimeError(outcome["error"])
+    return seconds, outcome.get("summary", {})
+
+
+def benchmark_scale(workdir, name, dialogs, handles, collisions, processes, stages, seed=1):
+    """Generate one tree and run the selected stages on it; returns the scale's report."""
+    root = Path(workdir) / name
+    if root.exists():
+        shutil.rmtree(root)
+    start = time.perf_counter()
+    params = generate_tree(root, dialogs, handles, collisions, seed)
+    report = {"scale": name, "params": params, "generate_seconds": round(time.perf_counter() - start, 3),
+              "stages": {}}
+    original_file = str(root / "original_english.xml")
+    new_file = str(root / "Localization" / "english.xml")
+    dialog_files, dialog_bytes = tree_size(root, {".lsj", ".lsx"})
+    report["tree"] = {"files": len(dialog_files), "bytes": dialog_bytes,
+                      "english_xml_bytes": os.path.getsize(new_file)}
+    stage_results = report["stages"]
+
+    def worker(**options):
+        return ft.XMLWorker(original_file, new_file, str(root), True, False, processes, **options)
+
+    if "diff" in stages:
+        start = time.perf_counter()
+        handle_table, delete_uids = worker()._diff_xml_files()
+        stage_results["diff"] = stage_record(time.perf_counter() - start,
+                                             size=os.path.getsize(original_file) + os.path.getsize(new_file),
+                                             replacements=len(handle_table), nodes_to_delete=len(delete_uids))
+    else:
+        handle_table, _ = worker()._diff_xml_files()
+
+    if "index_cold" in stages or "index_warm" in stages:
+        for stage in ("index_cold", "index_warm"):
+            index = ft.HandleIndex(root)
+            start = time.perf_counter()
+            reindexed, unchanged, _ = index.update(dialog_files, processes)
+            index.save()
+            if stage in stages:
+                stage_results[stage] = stage_record(time.perf_counter() - start, len(dialog_files), dialog_bytes,
+                                                    reindexed=reindexed, unchanged=unchanged)
+
+    if "replace_files" in stages:
+        # The per-file worker function in this process, as a dry run so the tree stays as generated
+        ft.init_replacement_worker(ft.PatternRegistry(handle_table), handle_table, None, 0, True)
+        start = time.perf_counter()
+        planned = sum(1 for path in dialog_files
+                      if ft.process_single_file_for_xml_replacement(str(path))["plan"])
+        stage_results["replace_files"] = stage_record(time.perf_counter() - start, len(dialog_files),
+                                                      dialog_bytes, files_changed=planned)
+
+    if "replace_run" in stages:
+        seconds, summary = run_worker(worker())
+        stage_results["replace_run"] = stage_record(seconds, len(dialog_files), dialog_bytes,
+                                                    files_modified=summary.get("files_modified"),
+                                                    nodes_deleted=summary.get("nodes_deleted"),
+                                                    worker_timings=summary.get("timings"))
+
+    if "lsx_to_lsf" in stages or "lsf_to_lsx" in stages:
+        # Conversions run on their own copy, holding only the LSX dialogs
+        convert_root = Path(workdir) / f"{name}_convert"
+        if convert_root.exists():
+            shutil.rmtree(convert_root)
+        for path in dialog_files:
+            if path.suffix.lower() == ".lsx":
+                destination = convert_root / path.relative_to(root)
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(path, destination)
+        for stage, worker_class, suffix in (("lsx_to_lsf", ft.LsxConverterWorker, ".lsx"),
+                                            ("lsf_to_lsx", ft.LsfConverterWorker, ".lsf")):
+            files, size = tree_size(convert_root, {suffix})
+            converter = worker_class(str(convert_root), True, True, False, True, processes)
+            seconds, summary = run_worker(converter)
+            if stage in stages:
+                stage_results[stage] = stage_record(seconds, len(files), size,
+                                                    converted=summary.get("converted_files"),
+                                                    errors=len(summary.get("error_files", [])),
+                                                    worker_timings=summary.get("timings"))
+        shutil.rmtree(convert_root, ignore_errors=True)
+    return report
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark fix_translations on synthetic mod trees; "
+                                                 "prints a JSON report.")
+    parser.add_argument("--scale", action="append", choices=sorted(SCALES),
+                        help="Preset tree size (repeatable; default: small)")
+    parser.add_argument("--dialogs", type=int, help="Custom scale: number of dialog files")
+    parser.add_argument("--handles", type=int, help="Custom scale: handles in english.xml")
+    parser.add_argument("--collisions", type=int, help="Custom scale: re-versioned handles with unchanged text")
+    parser.add_argument("--stage", action="append", choices=STAGES, help="Only run these stages (repeatable)")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(),
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the generated trees")
+    parser.add_argument("--workdir", help="Where to generate the trees (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated trees")
+    parser.add_argument("--output", help="Write the report to this file instead of stdout")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    scales = []
+    if args.dialogs or args.handles or args.collisions:
+        dialogs, handles, collisions = SCALES["small"]
+        scales.append(("custom", args.dialogs or dialogs, args.handles or handles,
+                       args.collisions if args.collisions is not None else collisions))
+    for name in args.scale or ([] if scales else ["small"]):
+        scales.append((name, *SCALES[name]))
+    stages = set(args.stage or STAGES)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="fix_translations_bench_")
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "processes": args.processes,
+        "scales": [],
+    }
+    try:
+        for name, dialogs, handles, collisions in scales:
+            print(f"Benchmarking {name}: {dialogs} dialogs, {handles} handles, {collisions} collisions",
+                  file=sys.stderr, flush=True)
+            report["scales"].append(benchmark_scale(workdir, name, dialogs, handles, collisions,
+                                                    args.processes, stages, args.seed))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
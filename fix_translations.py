@@ -3,54 +3,629 @@
 
 import sys
 import os
+import io
 import re
 import xml.etree.ElementTree as ET
 import shutil
-import keyring
+import hashlib
+import tempfile
 import json
+import pickle
 import subprocess # Added for Divine.exe
 import multiprocessing
+import mmap
+import time
+import argparse
+import signal
+import fnmatch
+import threading
+import concurrent.futures
+import contextlib
+import functools
+import heapq
+import cProfile
+import pstats
 from pathlib import Path
-from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                           QLabel, QLineEdit, QPushButton, QTextEdit, QFileDialog,
-                           QProgressBar, QMessageBox, QCheckBox, QGridLayout, QStatusBar)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+
+import lsf_codec
+import lsj_rewriter
+import lsx_rewriter
+
+# Per-search-directory folder for the tool's own caches; never scanned or converted
+CACHE_DIR_NAME = ".fix_translations"
+
+# Extensions the handle replacement never opens
+BINARY_EXTENSIONS = {'.pak', '.bin', '.exe', '.dll', '.so', '.dylib', '.jpg', '.png', '.ttf', '.dat', '.db'}
+
+
+class Signal:
+    """Minimal stand-in for pyqtSignal, so the workers run without Qt.
+
+    The GUI wraps each worker in a QThread (fix_translations_gui.WorkerThread)
+    that forwards these to real Qt signals.
+    """
+
+    def __init__(self):
+        self._slots = []
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def emit(self, *args):
+        for slot in self._slots:
+            slot(*args)
+
+
+class Worker:
+    """Base class for the background jobs run by the GUI and the CLI."""
+
+    def __init__(self):
+        self.progress_update = Signal()  # str: log line
+        self.progress_percent = Signal()  # int: 0-100
+        self.finished_signal = Signal()  # dict: run summary
+        self.error_signal = Signal()  # str: fatal error
+        self.file_result = Signal()  # dict: result for one processed file
+        # Optional fnmatch globs narrowing which files scan_files yields
+        self.include_globs = None
+        self.exclude_globs = None
+        # Capture a cProfile of the run (parent and pool workers), saved next to the report
+        self.profile = False
+        # Where the timing report goes; None means .fix_translations/reports/ in the search directory
+        self.report_path = None
+        # Replaced by begin_metrics() at the start of run()
+        self.metrics = RunMetrics()
+        # Optional worker_pool.WarmPool to run on instead of starting a pool for this run
+        self.pool = None
+        # The pool's cancel event while the run has one open (see open_pool)
+        self.cancel_event = None
+        self.running = True
+
+    def run(self):
+        raise NotImplementedError
+
+    def stop(self):
+        """Cancel the run: pool tasks not started yet are skipped and running Divine.exe calls killed.
+
+        Safe to call from another thread. Files already being rewritten are
+        finished (writes are atomic), so the run winds down within about a
+        second and still reports what it did.
+        """
+        self.running = False
+        cancel_event = self.cancel_event
+        if cancel_event is not None:
+            cancel_event.set()
+
+    @contextlib.contextmanager
+    def open_pool(self, processes, subprocess_bound=False):
+        """Yield the process pool to run on: the shared WarmPool, if any, or a new one.
+
+        A new pool gets processes processes and is terminated on exit. The
+        shared pool keeps its size for every run (see pool_size) and is only
+        terminated when the run fails. Either way the pool's processes share
+        a cancel event that stop() sets; the caller keeps consuming results
+        after a cancel until the skipped tasks have all come back.
+        """
+        start = time.perf_counter()
+        if self.pool is None:
+            cancel_event = multiprocessing.Event()
+            pool = multiprocessing.Pool(processes=processes, initializer=init_pool_process,
+                                        initargs=(cancel_event,))
+        else:
+            pool = self.pool.get(pool_size(None, self.processes, subprocess_bound))
+            cancel_event = self.pool.cancel_event
+            cancel_event.clear()
+        self.cancel_event = cancel_event
+        if not self.running:  # stop() came before the event was there to set
+            cancel_event.set()
+        self.metrics.add_stage("pool_start", time.perf_counter() - start)
+        try:
+            yield pool
+        except BaseException:
+            if self.pool is not None:
+                self.pool.terminate()
+            raise
+        finally:
+            self.cancel_event = None
+            if self.pool is None:
+                pool.terminate()
+
+    def begin_metrics(self):
+        """Start timing a run; returns the RunMetrics the run records into."""
+        self.metrics = RunMetrics()
+        if self.profile:
+            self.metrics.start_profile()
+        return self.metrics
+
+    def finish_metrics(self, result, operation):
+        """Log the run's timings, write the JSON report and add the summary to result as "timings"."""
+        metrics = self.metrics
+        report_path = self.report_path or default_report_path(self.search_dir, operation)
+        try:
+            metrics.finish_profile(Path(report_path).with_suffix(".prof"))
+            for line in metrics.log_lines():
+                self.progress_update.emit(line)
+            result["timings"] = metrics.summary()
+            metrics.write_report(report_path, operation, result)
+            result["timings"]["report_path"] = str(report_path)
+            self.progress_update.emit(f"Timing report saved to {report_path}")
+        except (OSError, ValueError) as e:
+            self.progress_update.emit(f"Could not write the timing report: {e}")
+        return result
+
+
+class LogSink:
+    """Thread-safe buffer that lets a worker log faster than a consumer can display.
+
+    write() can be connected to a worker's progress_update and run in the
+    worker thread: it only appends to a list (and to a buffered log file, if
+    one is open). The consumer calls drain() on its own schedule and gets
+    every line since the last call in one batch. When more than max_pending
+    lines pile up, the oldest are dropped from the batch (never from the
+    file) and counted instead.
+    """
+
+    def __init__(self, max_pending=5000):
+        self.max_pending = max_pending
+        self.log_path = None
+        self._lock = threading.Lock()
+        self._pending = []
+        self._dropped = 0
+        self._file = None
+
+    def open_file(self, path):
+        """Also write every line to path from now on, replacing any file already open."""
+        self.close_file()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        log_file = open(path, "w", encoding="utf-8")
+        with self._lock:
+            self._file = log_file
+            self.log_path = str(path)
+
+    def close_file(self):
+        with self._lock:
+            log_file, self._file = self._file, None
+        if log_file is not None:
+            log_file.close()
+
+    def write(self, message):
+        with self._lock:
+            self._pending.append(message)
+            if len(self._pending) > 2 * self.max_pending:
+                # Trim in bulk so a flood costs amortised O(1) per line
+                excess = len(self._pending) - self.max_pending
+                del self._pending[:excess]
+                self._dropped += excess
+            if self._file is not None:
+                self._file.write(message + "\n")
+
+    def drain(self):
+        """Return (lines, dropped): the lines written since the last call and how many were dropped."""
+        with self._lock:
+            lines, self._pending = self._pending, []
+            dropped, self._dropped = self._dropped, 0
+            if self._file is not None:
+                self._file.flush()
+        if len(lines) > self.max_pending:
+            dropped += len(lines) - self.max_pending
+            lines = lines[-self.max_pending:]
+        return lines, dropped
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an ascending list (0.0 when it is empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = -(-len(sorted_values) * percent // 100)  # ceil without float rounding
+    return sorted_values[max(0, min(len(sorted_values), int(rank)) - 1)]
+
+
+def default_report_path(search_dir, operation):
+    """Where a run's timing report goes unless told otherwise."""
+    name = time.strftime("%Y%m%d-%H%M%S") + f"-{operation}.json"
+    return Path(search_dir) / CACHE_DIR_NAME / "reports" / name
+
+
+# Per-process profiler of a pool worker and the profile_dir it is for; see run_profiled()
+_task_profiler = (None, None)
+
+
+def run_profiled(profile_dir, function, task):
+    """Run one pool task under this process's profiler.
+
+    The profiler accumulates across the tasks a worker runs for one
+    profile_dir (a pool can outlive the run) and its stats are dumped there
+    after every task, because pool workers are killed rather than shut down
+    when the pool exits.
+    """
+    global _task_profiler
+    if _task_profiler[0] != profile_dir:
+        _task_profiler = (profile_dir, cProfile.Profile())
+    profiler = _task_profiler[1]
+    profiler.enable()
+    try:
+        return function(task)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(os.path.join(profile_dir, f"worker-{os.getpid()}.prof"))
+
+
+def timed_iter(iterable, metrics, stage):
+    """Yield from iterable, adding the time spent waiting for each item to a metrics stage."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            metrics.add_stage(stage, time.perf_counter() - start)
+        yield item
+
+
+class RunMetrics:
+    """Where the time of one worker run went.
+
+    Stages are wall-clock spans in the worker itself (XML parse, diff, scan,
+    the pool as a whole, ...). Pool tasks return a "timings" dict per file
+    ({"read": s, "match": s, "write": s, "divine": s, ..., "total": s}); the
+    parts are summed over all files and "total" feeds the latency histogram.
+    With profiling on, the worker thread and every pool process run under
+    cProfile and finish_profile() merges their stats into one file.
+    """
+
+    SLOWEST_FILES = 10
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.file_stages = {}
+        self.file_times = []  # (seconds, path)
+        self.profile_dir = None
+        self.profile_path = None
+        self.profile_top = []
+        self._profiler = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the with-block and add it to stage name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_file(self, path, timings):
+        """Record the timings dict a pool task returned for path."""
+        if not timings:
+            return
+        for name, seconds in timings.items():
+            if name == "total":
+                self.file_times.append((seconds, path))
+            else:
+                self.file_stages[name] = self.file_stages.get(name, 0.0) + seconds
+
+    def task(self, function):
+        """Return the pool task function to map: function itself, or a profiled wrapper of it."""
+        if self.profile_dir is None:
+            return function
+        return functools.partial(run_profiled, self.profile_dir, function)
+
+    def start_profile(self):
+        """Profile the calling thread and, through task(), the pool workers."""
+        self.profile_dir = tempfile.mkdtemp(prefix="fix_translations_profile_")
+        self._profiler = cProfile.Profile()
+        try:
+            self._profiler.enable()
+        except ValueError:  # Another profiler is already active in this thread
+            self._profiler = None
+
+    def finish_profile(self, profile_path, top=15):
+        """Merge the captured profiles into profile_path; no-op unless profiling."""
+        if self.profile_dir is None:
+            return
+        try:
+            if self._profiler is not None:
+                self._profiler.disable()
+                self._profiler.dump_stats(os.path.join(self.profile_dir, "parent.prof"))
+                self._profiler = None
+            dumps = sorted(Path(self.profile_dir).glob("*.prof"))
+            if not dumps:
+                return
+            output = io.StringIO()
+            stats = pstats.Stats(str(dumps[0]), stream=output)
+            for dump in dumps[1:]:
+                stats.add(str(dump))
+            Path(profile_path).parent.mkdir(parents=True, exist_ok=True)
+            stats.dump_stats(str(profile_path))
+            stats.sort_stats("cumulative").print_stats(top)
+            self.profile_path = str(profile_path)
+            # Keep the table rows, without pstats' header
+            lines = output.getvalue().splitlines()
+            start = next((i for i, line in enumerate(lines) if line.lstrip().startswith("ncalls")), len(lines))
+            self.profile_top = [line for line in lines[start:] if line.strip()]
+        finally:
+            self.stop_profile()
+
+    def stop_profile(self):
+        """Stop profiling and throw the capture away, e.g. when the run failed."""
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler = None
+        if self.profile_dir is not None:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+    def summary(self):
+        """Return the timings as a JSON-ready dict (seconds)."""
+        times = sorted(seconds for seconds, _ in self.file_times)
+        summary = {
+            "wall": round(time.perf_counter() - self.started, 6),
+            "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            "file_stages": {name: round(seconds, 6) for name, seconds in self.file_stages.items()},
+            "files": {
+                "count": len(times),
+                "p50": round(percentile(times, 50), 6),
+                "p95": round(percentile(times, 95), 6),
+                "max": round(times[-1], 6) if times else 0.0,
+                "sum": round(sum(times), 6),
+            },
+            "slowest": [{"path": path, "seconds": round(seconds, 6)}
+                        for seconds, path in heapq.nlargest(self.SLOWEST_FILES, self.file_times)],
+        }
+        if self.profile_path is not None:
+            summary["profile_path"] = self.profile_path
+        return summary
+
+    def log_lines(self, slowest=5):
+        """Return a short human-readable summary for the log."""
+        summary = self.summary()
+        lines = [f"Timings: {summary['wall']:.3f}s in total"]
+        if summary["stages"]:
+            lines.append("  Stages: " + ", ".join(f"{name} {seconds:.3f}s"
+                                                  for name, seconds in summary["stages"].items()))
+        files = summary["files"]
+        if files["count"]:
+            lines.append(f"  Per file ({files['count']} files): p50 {files['p50'] * 1000:.1f} ms, "
+                         f"p95 {files['p95'] * 1000:.1f} ms, max {files['max'] * 1000:.1f} ms")
+        if summary["file_stages"]:
+            lines.append("  Summed over workers: " + ", ".join(f"{name} {seconds:.3f}s"
+                                                            for name, seconds in summary["file_stages"].items()))
+        for entry in summary["slowest"][:slowest]:
+            lines.append(f"  Slow: {entry['path']} ({entry['seconds'] * 1000:.1f} ms)")
+        if self.profile_path is not None:
+            lines.append(f"Profile saved to {self.profile_path} (python -m pstats); top functions by cumulative time:")
+            lines.extend("  " + line for line in self.profile_top)
+        return lines
+
+    def write_report(self, report_path, operation, result):
+        """Write the timings and the run's result counts as a JSON report."""
+        report = {
+            "operation": operation,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "result": {key: value for key, value in result.items() if key != "timings"},
+            "timings": self.summary(),
+        }
+        Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(report_path, json.dumps(report, indent=1, default=str).encode("utf-8"))
+
+
+# Directories never worth descending into when looking for mod files
+SCAN_EXCLUDED_DIRS = frozenset({".git", "Tools", CACHE_DIR_NAME})
+
+
+def _scan_directory(path):
+    """List one directory as (file paths, subdirectory paths); unreadable directories are empty."""
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        files.append(entry.path)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return files, subdirs
+
+
+def scan_files(root, extensions=None, recursive=True, exclude_dirs=SCAN_EXCLUDED_DIRS,
+               include=None, exclude=None, threads=4):
+    """Yield the files under root as Paths, lazily, while the walk continues.
+
+    Directories named in exclude_dirs (or matching an exclude glob) are pruned
+    before they are listed, and files are filtered by extension (lower-case,
+    with the dot) and by include/exclude globs during the walk. Globs match
+    either the file name or the path relative to root. Subdirectories are
+    listed concurrently on a few threads, so the order is not sorted.
+    """
+    root = os.fspath(root)
+    extensions = {extension.lower() for extension in extensions} if extensions else None
+    include = list(include or ())
+    exclude = list(exclude or ())
+
+    def matches(path, patterns):
+        name = os.path.basename(path)
+        relative = os.path.relpath(path, root).replace(os.sep, "/")
+        return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative, pattern) for pattern in patterns)
+
+    def wanted_dir(path):
+        return os.path.basename(path) not in exclude_dirs and not (exclude and matches(path, exclude))
+
+    def wanted_file(path):
+        if extensions is not None and os.path.splitext(path)[1].lower() not in extensions:
+            return False
+        if include and not matches(path, include):
+            return False
+        return not (exclude and matches(path, exclude))
+
+    if not recursive:
+        files, _ = _scan_directory(root)
+        for path in files:
+            if wanted_file(path):
+                yield Path(path)
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        pending = {executor.submit(_scan_directory, root)}
+        try:
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    for subdir in subdirs:
+                        if wanted_dir(subdir):
+                            pending.add(executor.submit(_scan_directory, subdir))
+                    for path in files:
+                        if wanted_file(path):
+                            yield Path(path)
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+# Set in every pool process by init_pool_process; the parent sets the event to cancel a run
+_cancel_event = None
+# How often a running Divine.exe is checked for cancellation, in seconds
+CANCEL_POLL_INTERVAL = 0.1
+
+
+def init_pool_process(cancel_event):
+    """Pool initializer: keep the pool's cancel event where tasks can check it.
+
+    Ctrl+C reaches the pool processes too; they ignore it and wind down
+    through the cancel event the parent sets, so no task is lost.
+    """
+    global _cancel_event
+    _cancel_event = cancel_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def cancel_requested():
+    """True when the run this pool process works for has been cancelled."""
+    return _cancel_event is not None and _cancel_event.is_set()
+
+
+def run_divine(command):
+    """Run Divine.exe and return its CompletedProcess (text output captured).
+
+    Returns None if the run was cancelled meanwhile; Divine is then killed
+    and waited for, so it no longer holds any file open.
+    """
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, shell=False)
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=CANCEL_POLL_INTERVAL)
+        except subprocess.TimeoutExpired:
+            if cancel_requested():
+                process.kill()
+                process.communicate()
+                return None
+            continue
+        if process.returncode != 0 and cancel_requested():
+            return None  # Divine.exe got the same Ctrl+C as the run
+        return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+
+def divine_temp_path(destination_path):
+    """Where a single-file Divine.exe conversion writes before its output is moved into place.
+
+    The extension stays the same, since Divine picks the output format by it.
+    """
+    destination_path = Path(destination_path)
+    return destination_path.with_name(f".{destination_path.stem}.divine-tmp{destination_path.suffix}")
+
+
+def remove_file(path):
+    """Delete path if it exists; for cleaning up temporary outputs."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def cancelled_conversion(source_path):
+    return {"status": "cancelled", "path": source_path, "logs": []}
+
+
+def convert_with_codec(source_path, destination_path, delete_original):
+    """Convert one LSF/LSX file in-process with the built-in codec.
+
+    Returns a conversion result dict; its status is "unsupported" when the file
+    has to go through Divine.exe instead (unknown format variant, missing
+    optional decompressor, unreadable input).
+    """
+    logs = [f"Converting (built-in): {source_path} -> {destination_path}"]
+    start = time.perf_counter()
+    try:
+        lsf_codec.convert_file(source_path, str(destination_path))
+    except Exception as e:
+        logs = [f"Built-in converter cannot handle {source_path} ({e}); using Divine.exe"]
+        return {"status": "unsupported", "path": source_path, "logs": logs}
+    convert_time = time.perf_counter() - start
+    logs.append(f"Successfully converted: {destination_path}")
+    if delete_original:
+        try:
+            os.remove(source_path)
+            logs.append(f"Successfully deleted original file: {source_path}")
+        except OSError as e:
+            logs.append(f"Error deleting original file {source_path}: {e}")
+    return {"status": "converted", "path": source_path, "logs": logs,
+            "timings": {"convert": convert_time, "total": time.perf_counter() - start}}
 
 # Helper function for multiprocessing LSX conversion
 def process_lsx_file_conversion(args):
-    divine_exe_path, file_path_str, delete_original = args
+    divine_exe_path, file_path_str, delete_original, use_native = args
+    start = time.perf_counter()
     file_path_obj = Path(file_path_str)
     source_path = str(file_path_obj)
     filename = file_path_obj.name
     logs = []
+    if cancel_requested():
+        return cancelled_conversion(source_path)
 
     if filename.lower() == "meta.lsx":
         logs.append(f"Skipping: {source_path} (meta.lsx)")
         return {"status": "skipped", "path": source_path, "logs": logs}
 
     destination_path = file_path_obj.with_suffix(".lsf")
+    if use_native:
+        native_result = convert_with_codec(source_path, destination_path, delete_original)
+        if native_result["status"] != "unsupported":
+            return native_result
+        logs.extend(native_result["logs"])
+
+    # Divine writes next to the destination and the output is only moved into place once it
+    # has finished, so a failed or cancelled conversion never leaves a partial file behind
+    temp_path = divine_temp_path(destination_path)
     command = [
         divine_exe_path,
         "--action", "convert-resource",
         "--game", "bg3",
         "--source", source_path,
-        "--destination", str(destination_path),
+        "--destination", str(temp_path),
         "--loglevel", "error"
     ]
 
     try:
         logs.append(f"Converting: {source_path} -> {destination_path}")
-        process_run_args = {"capture_output": True, "text": True, "check": False}
-        if sys.platform != "win32": # shell=False is default and preferred
-            process_run_args["shell"] = False
-        else: # On Windows, sometimes shell=True is needed for .exe if not in PATH
-             # However, Divine.exe is called by full path, so shell=False should be fine.
-             # Forcing shell=False for security and consistency.
-            process_run_args["shell"] = False
-
-        process = subprocess.run(command, **process_run_args)
+        divine_start = time.perf_counter()
+        process = run_divine(command)
+        timings = {"divine": time.perf_counter() - divine_start, "total": time.perf_counter() - start}
+        if process is None:
+            remove_file(temp_path)
+            logs.append(f"Cancelled: {source_path}")
+            return dict(cancelled_conversion(source_path), logs=logs, timings=timings)
 
         if process.returncode == 0:
+            os.replace(temp_path, destination_path)
             logs.append(f"Successfully converted: {destination_path}")
             if delete_original:
                 try:
@@ -58,7 +633,7 @@ def process_lsx_file_conversion(args):
                     logs.append(f"Successfully deleted original file: {source_path}")
                 except OSError as e:
                     logs.append(f"Error deleting original file {source_path}: {e}")
-            return {"status": "converted", "path": source_path, "logs": logs}
+            return {"status": "converted", "path": source_path, "logs": logs, "timings": timings}
         else:
             log_msg = f"Error converting {source_path}:\n"
             log_msg += f"  Return code: {process.returncode}\n"
@@ -67,136 +642,623 @@ def process_lsx_file_conversion(args):
             if process.stderr:
                 log_msg += f"  Stderr: {process.stderr.strip()}\n"
             logs.append(log_msg)
-            return {"status": "error", "path": source_path, "details": log_msg, "logs": logs}
+            remove_file(temp_path)
+            return {"status": "error", "path": source_path, "details": log_msg, "logs": logs, "timings": timings}
     except Exception as e:
+        remove_file(temp_path)
         error_msg = f"Exception during conversion of {source_path}: {e}"
         logs.append(error_msg)
         return {"status": "error", "path": source_path, "details": error_msg, "logs": logs}
 
-class LsxConverterWorker(QThread):
+class LsxConverterWorker(Worker):
     """Worker thread for converting LSX to LSF files."""
-    progress_update = pyqtSignal(str)
-    progress_percent = pyqtSignal(int)
-    finished_signal = pyqtSignal(dict)
-    error_signal = pyqtSignal(str)
 
-    def __init__(self, search_dir, recursive=True):
+    def __init__(self, search_dir, recursive=True, batch_mode=True, use_cache=True, native=True, processes=None):
         super().__init__()
         self.search_dir = search_dir
         self.recursive = recursive
-        self.running = True
+        # Batch mode converts each worker's share of files with one Divine.exe launch (without native)
+        self.batch_mode = batch_mode
+        # Skip files whose converted output is already in the conversion cache
+        self.use_cache = use_cache
+        # Convert in-process with lsf_codec, keeping Divine.exe only as a fallback
+        self.native = native
+        # Pool size; None sizes it from the CPU count and the kind of conversion (see pool_size)
+        self.processes = processes
         self.divine_exe_path = os.path.join(os.getcwd(), "Tools", "Divine.exe")
 
     def run(self):
         try:
+            metrics = self.begin_metrics()
             if not os.path.exists(self.divine_exe_path):
-                self.error_signal.emit(f"Error: Divine.exe not found at {self.divine_exe_path}")
-                return
-
-            self.progress_update.emit(f"Starting LSX to LSF conversion using Divine.exe from: {self.divine_exe_path}")
+                if not self.native:
+                    self.error_signal.emit(f"Error: Divine.exe not found at {self.divine_exe_path}")
+                    return
+                self.progress_update.emit(f"Divine.exe not found at {self.divine_exe_path}; "
+                                          "files the built-in converter cannot handle will fail.")
+
+            if self.native:
+                self.progress_update.emit(f"Starting LSX to LSF conversion with the built-in converter "
+                                          f"(Divine.exe fallback: {self.divine_exe_path})")
+            else:
+                self.progress_update.emit(f"Starting LSX to LSF conversion using Divine.exe from: {self.divine_exe_path}")
             self.progress_update.emit(f"Scanning directory: {self.search_dir}")
 
             search_path_obj = Path(self.search_dir)
             if self.recursive:
                 self.progress_update.emit(f"Scanning directory recursively: {search_path_obj}")
-                all_files_in_dir = [f for f in search_path_obj.rglob("*.lsx") if f.is_file()]
             else:
                 self.progress_update.emit(f"Scanning directory (non-recursively): {search_path_obj}")
-                all_files_in_dir = [f for f in search_path_obj.glob("*.lsx") if f.is_file()]
-            
-            files_to_scan = [
-                f for f in all_files_in_dir
-                if ".git" not in f.parts and "Tools" not in f.parts
-            ]
+            # .git, Tools and the cache folder are pruned during the walk
+            with metrics.stage("scan"):
+                files_to_scan = list(scan_files(search_path_obj, {".lsx"}, self.recursive,
+                                                include=self.include_globs, exclude=self.exclude_globs))
 
             total_files = len(files_to_scan)
             self.progress_update.emit(f"Found {total_files} .lsx files to potentially convert.")
 
             if total_files == 0:
                 self.progress_percent.emit(100)
-                self.finished_signal.emit({"converted_files": 0, "skipped_files": 0, "error_files": [], "total_scanned": 0})
+                self.finished_signal.emit(self.finish_metrics(
+                    {"converted_files": 0, "skipped_files": 0, "cached_files": 0, "error_files": [], "cancelled_files": 0,
+                     "total_scanned": 0},
+                    "lsx-to-lsf"))
                 return
 
             converted_files = 0
             skipped_files = 0
             error_files = []
+            cached_files = 0
+            cancelled_files = 0
+            source_infos = {}
+            cache = None
+            if self.use_cache:
+                cache = ConversionCache(self.search_dir, get_converter_version(self.divine_exe_path, self.native))
+                with metrics.stage("cache_lookup"):
+                    files_to_scan, source_infos, cached_files = cache.partition(
+                        files_to_scan, ".lsf", True, self.progress_update.emit, lambda: not self.running)
+                self.progress_update.emit(f"{cached_files} files already up to date in the conversion cache.")
             
+            # Largest first, so big files do not straggle at the end and batches come out even
+            files_to_scan = order_by_size(files_to_scan)
             # True for delete_original, matching original behavior
-            tasks = [(self.divine_exe_path, str(f_obj), True) for f_obj in files_to_scan]
+            tasks = [(self.divine_exe_path, str(f_obj), True, self.native) for f_obj in files_to_scan]
 
-            # Determine number of processes: min of files, cpu_count, or a sensible max like 8 if cpu_count is very high
-            # This prevents creating too many processes for few files or overwhelming system with too many.
-            # A practical limit like 16 or 32 could also be considered if cpu_count() is excessively large.
-            max_processes = multiprocessing.cpu_count()
-            num_processes = min(total_files, max_processes)
-            if num_processes == 0 and total_files > 0 : # Ensure at least one process if there are files
-                num_processes = 1
+            # Built-in conversions are CPU-bound in the pool processes; Divine.exe ones wait on a subprocess
+            num_processes = pool_size(len(files_to_scan), self.processes, subprocess_bound=not self.native)
+            chunksize = plan_chunksize(len(tasks), num_processes)
 
             self.progress_update.emit(f"Using {num_processes} worker processes.")
+            if self.batch_mode and not self.native:
+                self.progress_update.emit(f"Batch mode: converting with {num_processes} Divine.exe invocations.")
 
-            processed_count = 0
-            try:
-                with multiprocessing.Pool(processes=num_processes) as pool:
-                    results_iterator = pool.imap_unordered(process_lsx_file_conversion, tasks)
+            processed_count = cached_files
+            convert_start = time.perf_counter()
+            if files_to_scan:
+                try:
+                    with self.open_pool(num_processes, subprocess_bound=not self.native) as pool:
+                        # Batches only pay off for Divine.exe, where they save process launches; built-in
+                        # conversions are dispatched per file in chunks, so the pool stays balanced
+                        if self.batch_mode and not self.native:
+                            batches = [(self.divine_exe_path, [str(f_obj) for f_obj in batch], True, "lsx", "lsf", self.native)
+                                       for batch in split_into_batches(files_to_scan, num_processes)]
+                            batch_iterator = pool.imap_unordered(metrics.task(process_conversion_batch), batches)
+                            results_iterator = (result for batch_results in batch_iterator for result in batch_results)
+                        else:
+                            results_iterator = pool.imap_unordered(metrics.task(process_lsx_file_conversion), tasks,
+                                                                   chunksize=chunksize)
                     
-                    for i, result_dict in enumerate(results_iterator):
-                        processed_count = i + 1
-                        if not self.running:
-                            self.progress_update.emit("LSX Conversion Canceled by user.")
-                            break
-                        
-                        for log_message in result_dict.get("logs", []):
-                            self.progress_update.emit(log_message)
-
-                        status = result_dict["status"]
-                        if status == "converted":
-                            converted_files += 1
-                        elif status == "skipped":
-                            skipped_files += 1
-                        elif status == "error":
-                            error_files.append(result_dict["path"])
+                        # After a cancel the loop keeps going: files not started yet come back at
+                        # once as cancelled and a running Divine.exe is killed, so the pool is idle
+                        # by the time the loop ends
+                        for result_dict in results_iterator:
+                            for log_message in result_dict.get("logs", []):
+                                self.progress_update.emit(log_message)
+                            if result_dict["status"] == "cancelled":
+                                cancelled_files += 1
+                                continue
+                            processed_count += 1
+                            self.file_result.emit(result_dict)
+                            metrics.add_file(result_dict["path"], result_dict.get("timings"))
+
+                            status = result_dict["status"]
+                            if status == "converted":
+                                converted_files += 1
+                                if cache is not None:
+                                    try:
+                                        cache.record(source_infos[result_dict["path"]],
+                                                     Path(result_dict["path"]).with_suffix(".lsf"))
+                                    except (OSError, KeyError) as e:
+                                        self.progress_update.emit(f"Could not cache conversion of {result_dict['path']}: {e}")
+                            elif status == "skipped":
+                                skipped_files += 1
+                            elif status == "error":
+                                error_files.append(result_dict["path"])
                         
-                        self.progress_percent.emit(int(((processed_count) / total_files) * 100))
-            except Exception as e: # Catch exceptions during pool operations
-                self.error_signal.emit(f"Error during multiprocessing pool execution: {str(e)}")
-                # Fall through to emit finished_signal with current counts
+                            self.progress_percent.emit(int(((processed_count) / total_files) * 100))
+                except Exception as e: # Catch exceptions during pool operations
+                    self.error_signal.emit(f"Error during multiprocessing pool execution: {str(e)}")
+                    # Fall through to emit finished_signal with current counts
 
             # Ensure progress bar reaches 100% if not cancelled early and all files processed
             if self.running and processed_count == total_files:
                  self.progress_percent.emit(100)
             elif not self.running : # If cancelled, emit current progress
+                 self.progress_update.emit(f"LSX Conversion Canceled by user; {cancelled_files} files left unconverted.")
                  self.progress_percent.emit(int(((processed_count) / total_files) * 100))
 
+            metrics.add_stage("convert", time.perf_counter() - convert_start)
+
+            if cache is not None:
+                with metrics.stage("cache_save"):
+                    cache.save()
 
             final_result = {
                 "converted_files": converted_files,
                 "skipped_files": skipped_files,
+                "cached_files": cached_files,
                 "error_files": error_files,
+                "cancelled_files": cancelled_files,
                 "total_scanned": processed_count # Use processed_count in case of cancellation
             }
-            self.finished_signal.emit(final_result)
+            self.finished_signal.emit(self.finish_metrics(final_result, "lsx-to-lsf"))
 
         except Exception as e:
+            self.metrics.stop_profile()
             self.error_signal.emit(f"Error in LsxConverterWorker: {str(e)}")
             # Emit finished with whatever data is available if an unexpected error occurs early
             # This might be redundant if the inner try-except for the pool handles it.
             # Consider if a default/empty result should be emitted here.
             # For now, relying on error_signal and the pool's own final_result emission.
 
-    def stop(self):
-        """Stop the worker thread."""
-        self.running = False
+
+def _build_trie_pattern(words):
+    """Build a regex alternation for a set of literal strings, factored as a prefix trie."""
+    if not words:
+        return "(?!)"
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def walk(node):
+        is_end = "" in node
+        branches = [re.escape(char) + walk(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if is_end else body
+
+    return walk(trie)
+
+
+# The TranslatedString attributes whose handle and version are rewritten in LSX/LSF; others
+# (e.g. a dialog node's OldText) keep theirs
+TRANSLATED_TEXT_IDS = ("TagText",)
+
+
+class PatternRegistry:
+    """Compiled handle patterns for one run, shared by every file the run touches.
+
+    The pattern sources are built once in the parent process. Each process
+    compiles a family the first time a file of that type needs it and serves
+    every later file from its own cache.
+    """
+
+    def __init__(self, uids):
+        uid = _build_trie_pattern(list(uids))
+        common = [
+            fr'contentuid="(?P<p1>{uid})"(?:(?P<p1_sep>\s*)version="[^"]*")?',
+            fr'id="(?P<p3>{uid})"',
+        ]
+        text_ids = "|".join(re.escape(text_id) for text_id in TRANSLATED_TEXT_IDS)
+        lsx = [fr'(?P<p5_head>id="(?:{text_ids})" type="TranslatedString" handle=")(?P<p5>{uid})'
+               fr'(?P<p5_mid>" version=")[^"]*"']
+        lsj = [fr'"handle" : "(?P<p7>{uid})"(?:(?P<p7_sep1>,\s*)"type" : "TranslatedString"'
+               fr'(?P<p7_sep2>,\s*)"version" : \d+)?']
+        other = [fr'"(?P<p4>{uid})"']
+        self.sources = {
+            "lsx": "|".join(common + lsx),
+            "lsj": "|".join(common + lsj),
+            "other": "|".join(common + other),
+            # Patterns 1-3 on LSX bytes, next to the TranslatedString splice (HandleReplacer.apply_lsx)
+            "lsx_common": "|".join(common).encode("utf-8"),
+            # Bare handles as bytes, for the presence check on undecoded file data
+            "presence": uid.encode("utf-8"),
+        }
+        self._compiled = {}
+        self.compilations = 0
+        self.cache_hits = 0
+
+    def __getstate__(self):
+        # Only the pattern sources travel to worker processes; each one compiles its own copy
+        return {"sources": self.sources}
+
+    def __setstate__(self, state):
+        self.sources = state["sources"]
+        self._compiled = {}
+        self.compilations = 0
+        self.cache_hits = 0
+
+    def get(self, kind):
+        """Return the compiled pattern for a file kind, compiling it on first use."""
+        pattern = self._compiled.get(kind)
+        if pattern is None:
+            pattern = self._compiled[kind] = re.compile(self.sources[kind])
+            self.compilations += 1
+        else:
+            self.cache_hits += 1
+        return pattern
+
+    def stats(self):
+        return {"compilations": self.compilations, "cache_hits": self.cache_hits}
+
+
+class HandleReplacer:
+    """Rewrites every known handle in a file with one regex pass.
+
+    All handles are compiled into a single trie-shaped alternation, and the
+    pattern families that used to run as separate re.sub calls per UID are
+    branches of one combined pattern per file type (see PatternRegistry):
+
+      Pattern 1/2: contentuid="ID" (with optional version="VER")
+      Pattern 3:   id="ID"
+      Pattern 4:   "ID" (files that are neither LSX nor LSJ)
+      Pattern 5:   LSX TagText TranslatedString attribute handle/version
+
+    The workers hand LSX files over as bytes to apply_lsx, which patches the
+    TagText TranslatedString attributes (TRANSLATED_TEXT_IDS) in place via
+    expat (lsx_rewriter) whatever their attribute order or layout, then runs
+    Patterns 1-3 over the bytes; Pattern 5 is the fallback for LSX that is
+    not well-formed XML. LSJ files are rewritten structurally by lsj_rewriter
+    instead, whatever their whitespace or key order (Pattern 7:
+    TranslatedString handle and version, Pattern 8: any other object's
+    "handle"); the regex family is only used for LSJ text that is not
+    well-formed JSON. LSF binaries are not text; apply_lsf patches their
+    TagText TranslatedString attributes directly (Pattern 9).
+    """
+
+    def __init__(self, replacements, versions, registry=None):
+        self.replacements = replacements  # old_uid -> new_uid
+        self.versions = versions  # new_uid -> version from the original XML
+        self.registry = registry if registry is not None else PatternRegistry(replacements)
+
+    @staticmethod
+    def file_kind(file_extension):
+        """Map a file extension to the pattern family used for it."""
+        return {".lsx": "lsx", ".lsj": "lsj"}.get(file_extension, "other")
+
+    def apply(self, content, kind, matches=None):
+        """Return (new_content, matching_ids, changes) for one file's text.
+
+        If matches is a list, (old_uid, new_uid, pattern label) is appended to
+        it for every distinct handle and pattern that changes the text.
+        """
+        if kind == "lsj":
+            try:
+                return self.apply_lsj(content, matches)
+            except (lsj_rewriter.LSJError, ValueError):
+                pass  # Not JSON we can follow; fall back to the text patterns
+        matching_ids = []
+        changes = []
+
+        def substitute(match):
+            old_uid, new_uid, label, text = self._rewrite(match.groupdict())
+            self._record(old_uid, new_uid, label, text != match.group(0), matching_ids, changes, matches)
+            return text
+
+        return self.registry.get(kind).sub(substitute, content), matching_ids, changes
+
+    def _rewrite(self, groups):
+        """Return (old_uid, new_uid, pattern label, replacement text) for one match of a combined pattern."""
+        if groups["p1"] is not None:
+            old_uid = groups["p1"]
+            new_uid = self.replacements[old_uid]
+            if groups["p1_sep"] is not None:
+                label = "Pattern 1"
+                text = f'contentuid="{new_uid}"{groups["p1_sep"]}version="{self.versions[new_uid]}"'
+            else:
+                label = "Pattern 2"
+                text = f'contentuid="{new_uid}"'
+        elif groups["p3"] is not None:
+            old_uid = groups["p3"]
+            new_uid = self.replacements[old_uid]
+            label = "Pattern 3"
+            text = f'id="{new_uid}"'
+        elif groups.get("p5") is not None:
+            old_uid = groups["p5"]
+            new_uid = self.replacements[old_uid]
+            label = "Pattern 5 - LSX TranslatedString handle"
+            text = f'{groups["p5_head"]}{new_uid}{groups["p5_mid"]}{self.versions[new_uid]}"'
+        elif groups.get("p7") is not None:
+            old_uid = groups["p7"]
+            new_uid = self.replacements[old_uid]
+            if groups["p7_sep1"] is not None:
+                label = "Pattern 7 - LSJ TranslatedString handle"
+                text = (f'"handle" : "{new_uid}"{groups["p7_sep1"]}"type" : "TranslatedString"'
+                        f'{groups["p7_sep2"]}"version" : {self.versions[new_uid]}')
+            else:
+                label = "Pattern 8 - LSJ handle only"
+                text = f'"handle" : "{new_uid}"'
+        else:
+            old_uid = groups["p4"]
+            new_uid = self.replacements[old_uid]
+            label = "Pattern 4 - quoted ID in other file type"
+            text = f'"{new_uid}"'
+        return old_uid, new_uid, label, text
+
+    @staticmethod
+    def _record(old_uid, new_uid, label, changed, matching_ids, changes, matches):
+        """Note one matched handle in matching_ids/changes (and matches, if a list) as apply() reports them."""
+        if old_uid not in matching_ids:
+            matching_ids.append(old_uid)
+        change = f"{label} matched for {old_uid}"
+        if changed and change not in changes:
+            changes.append(change)
+            if matches is not None:
+                matches.append((old_uid, new_uid, label))
+
+    def apply_lsj(self, content, matches=None):
+        """Return (new_content, matching_ids, changes) for LSJ text, rewritten structurally."""
+        new_content, found = lsj_rewriter.patch_translated_strings(content, self._lookup)
+        matching_ids = []
+        changes = []
+        for old_uid, new_uid, version, changed in found:
+            if old_uid not in matching_ids:
+                matching_ids.append(old_uid)
+            label = "Pattern 7 - LSJ TranslatedString handle" if version is not None else "Pattern 8 - LSJ handle only"
+            change = f"{label} matched for {old_uid}"
+            if changed and change not in changes:
+                changes.append(change)
+                if matches is not None:
+                    matches.append((old_uid, new_uid, label))
+        return new_content, matching_ids, changes
+
+    def apply_lsx(self, data, matches=None):
+        """Return (new_data, matching_ids, changes) for one LSX file's bytes; matches as in apply()."""
+        try:
+            new_data, found = lsx_rewriter.patch_translated_strings(data, self._lookup, TRANSLATED_TEXT_IDS)
+        except lsx_rewriter.LSXError:
+            # Not well-formed XML; fall back to the text patterns
+            try:
+                text, encoding = data.decode("utf-8"), "utf-8"
+            except UnicodeDecodeError:
+                text, encoding = data.decode("latin-1"), "latin-1"
+            new_text, matching_ids, changes = self.apply(text, "lsx", matches)
+            return new_text.encode(encoding), matching_ids, changes
+        matching_ids = []
+        changes = []
+        for old_uid, new_uid, _, changed in found:
+            self._record(old_uid, new_uid, "Pattern 5 - LSX TranslatedString handle", changed,
+                         matching_ids, changes, matches)
+
+        def substitute(match):
+            groups = {name: value.decode("utf-8") if value is not None else None
+                      for name, value in match.groupdict().items()}
+            old_uid, new_uid, label, text = self._rewrite(groups)
+            text = text.encode("utf-8")
+            self._record(old_uid, new_uid, label, text != match.group(0), matching_ids, changes, matches)
+            return text
+
+        # contentuid="..." and id="..." outside TranslatedString attributes
+        patched, count = self.registry.get("lsx_common").subn(substitute, new_data)
+        return (patched if count else new_data), matching_ids, changes
+
+    def _lookup(self, handle):
+        """(new_uid, version) for a handle being replaced, else None."""
+        new_uid = self.replacements.get(handle)
+        if new_uid is None:
+            return None
+        return new_uid, self.versions[new_uid]
+
+    def apply_lsf(self, data, matches=None):
+        """Return (new_data, matching_ids, changes) for one LSF file's bytes; matches as in apply()."""
+        new_data, patched = lsf_codec.patch_translated_strings(data, self._lookup, TRANSLATED_TEXT_IDS)
+        matching_ids = []
+        for old_uid, _, _ in patched:
+            if old_uid not in matching_ids:
+                matching_ids.append(old_uid)
+        changes = []
+        if new_data is not data:
+            label = "Pattern 9 - LSF TranslatedString handle"
+            changes = [f"{label} matched for {old_uid}" for old_uid in matching_ids]
+            if matches is not None:
+                matches.extend((old_uid, self.replacements[old_uid], label) for old_uid in matching_ids)
+        return new_data, matching_ids, changes
+
+
+# Per-process state installed by init_replacement_worker
+_worker_state = {}
+
+
+def build_handle_table(replacements, original_contents):
+    """Reduce a run to the compact {old_uid: (new_uid, version)} table the workers need."""
+    return {old_uid: (new_uid, original_contents[new_uid][0]) for old_uid, new_uid in replacements.items()}
+
+
+def init_replacement_worker(registry, handle_table, backup_dir, loglevel, dry_run=False, divine_exe_path=None):
+    """Pool initializer: load the run's handle table and settings once per worker process.
+
+    backup_dir is the BackupStore staging directory, or None without backups.
+    With dry_run, files are never written; each result carries its planned
+    changes instead. With divine_exe_path (a pipeline run), LSF files the
+    built-in patcher cannot handle go through patch_lsf_through_lsx.
+    """
+    replacements = {old_uid: new_uid for old_uid, (new_uid, _) in handle_table.items()}
+    versions = {new_uid: version for new_uid, version in handle_table.values()}
+    _worker_state.pop("state_path", None)
+    _worker_state["replacer"] = HandleReplacer(replacements, versions, registry)
+    _worker_state["backup_dir"] = backup_dir
+    _worker_state["loglevel"] = loglevel
+    _worker_state["dry_run"] = dry_run
+    _worker_state["divine_exe_path"] = divine_exe_path
+
+
+def save_task_state(state):
+    """Pickle a run's worker state to a temporary file and return its path.
+
+    A pool that outlives the run (the GUI's WarmPool) cannot be handed the
+    state through its initializer, so each task carries this path instead
+    and the worker loads the file once (process_replacement_task). The
+    caller removes the file when the run is over.
+    """
+    fd, path = tempfile.mkstemp(prefix="fix_translations_run_", suffix=".pickle")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def process_replacement_task(task):
+    """Pool task (state_path, file_path): load the run's state if this process has not yet, then process the file."""
+    state_path, file_path = task
+    if cancel_requested():
+        return {"file_path": file_path, "backup": None, "cancelled": True}
+    if _worker_state.get("state_path") != state_path:
+        with open(state_path, "rb") as f:
+            init_replacement_worker(*pickle.load(f))
+        _worker_state["state_path"] = state_path
+    return process_single_file_for_xml_replacement(file_path)
+
+
+# Suffix of the temporary files atomic_write_bytes creates next to their targets
+ATOMIC_TEMP_SUFFIX = ".fix_translations.tmp"
+# Suffix of the per-file backups older versions wrote; they are never processed
+LEGACY_BACKUP_SUFFIX = ".backup"
+# Linux ioctl that makes a file share another file's extents (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+
+def atomic_write_bytes(path, data):
+    """Replace path with data via a temporary file in the same directory and os.replace.
+
+    A crash or cancel mid-write leaves either the old file or the new one,
+    never a truncated mix. The file keeps its permission bits.
+    """
+    directory, name = os.path.split(os.fspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=ATOMIC_TEMP_SUFFIX, dir=directory or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        try:
+            shutil.copymode(path, temp_path)
+        except OSError:
+            pass
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def link_backup(path, backup_path):
+    """Make backup_path hold path's current content without copying bytes where possible.
+
+    A hardlink is enough because modified files are only ever swapped in by
+    atomic_write_bytes, which gives path a new inode and leaves the linked
+    one holding the old content. Falls back to a reflink, then to a plain
+    copy. Returns the method used.
+    """
+    if os.path.lexists(backup_path):
+        os.remove(backup_path)
+    try:
+        os.link(path, backup_path)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        import fcntl
+        with open(path, "rb") as source, open(backup_path, "wb") as destination:
+            fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+        shutil.copystat(path, backup_path)
+        return "reflink"
+    except (ImportError, OSError):
+        pass
+    shutil.copy2(path, backup_path)
+    return "copy"
+
+
+def patch_lsf_through_lsx(divine_exe_path, file_path, replacer, matches=None, encode=True):
+    """Patch an LSF file the built-in codec cannot handle by converting it through LSX with Divine.exe.
+
+    The file is decoded to LSX in a temporary directory and patched in memory
+    (HandleReplacer.apply_lsx); only when a handle changed is the LSX encoded
+    back to LSF. Returns (new_data, matching_ids, changes) like apply_lsf,
+    with new_data None when nothing changed and, without encode (dry runs),
+    the patched LSX instead of LSF. Returns None if the run is cancelled
+    meanwhile; raises LSFError when Divine.exe fails.
+    """
+    file_path = Path(file_path)
+    with tempfile.TemporaryDirectory(prefix="divine_pipeline_") as temp_dir:
+        lsx_path = Path(temp_dir) / file_path.with_suffix(".lsx").name
+        lsf_path = Path(temp_dir) / file_path.name
+
+        def convert(source_path, destination_path):
+            command = [
+                divine_exe_path,
+                "--action", "convert-resource",
+                "--game", "bg3",
+                "--source", str(source_path),
+                "--destination", str(destination_path),
+                "--loglevel", "error"
+            ]
+            process = run_divine(command)
+            if process is None:
+                return False
+            if process.returncode != 0 or not destination_path.is_file():
+                details = process.stderr.strip() if process.stderr else f"return code {process.returncode}"
+                raise lsf_codec.LSFError(f"Divine.exe could not convert {source_path.name}: {details}")
+            return True
+
+        if not convert(file_path, lsx_path):
+            return None
+        lsx_data = lsx_path.read_bytes()
+        new_lsx, matching_ids, changes = replacer.apply_lsx(lsx_data, matches)
+        if new_lsx == lsx_data:
+            return None, matching_ids, changes
+        if not encode:
+            return new_lsx, matching_ids, changes
+        lsx_path.write_bytes(new_lsx)
+        if not convert(lsx_path, lsf_path):
+            return None
+        return lsf_path.read_bytes(), matching_ids, changes
+
 
 # Helper function for multiprocessing file content replacement
-def process_single_file_for_xml_replacement(args):
-    """Process a single file for XML content replacement (used with multiprocessing)"""
-    file_path, replacements, original_contents, backup, loglevel = args
+def process_single_file_for_xml_replacement(file_path):
+    """Process a single file for XML content replacement (used with multiprocessing)
+
+    The handle table and run settings come from init_replacement_worker, so a
+    task only carries the file path. The result's "timings" holds the seconds
+    spent reading, matching and writing the file, and in total.
+    """
+    start = time.perf_counter()
+    timings = {}
+    result = _replace_handles_in_file(Path(file_path), timings)
+    timings["total"] = time.perf_counter() - start
+    result["timings"] = timings
+    return result
+
+
+def _replace_handles_in_file(file_path, timings):
+    """Body of process_single_file_for_xml_replacement; stage times are added to timings."""
+    replacer = _worker_state["replacer"]
+    replacements = replacer.replacements
+    backup_dir = _worker_state["backup_dir"]
+    loglevel = _worker_state["loglevel"]
+    dry_run = _worker_state["dry_run"]
     result = {
         "file_path": str(file_path),
         "modified": False,
+        "backup": None,
         "error": None,
         "logs": [],
-        "debug_info": {"file": str(file_path), "matching_ids": [], "changes": []}
+        "debug_info": {"file": str(file_path), "matching_ids": [], "changes": []},
+        "pattern_stats": {"compilations": 0, "cache_hits": 0},
+        "plan": None  # Dry run: [(old_uid, new_uid, pattern label)] the file would get
     }
     
     def log(message, level=0, prefix=""):
@@ -209,174 +1271,134 @@ def process_single_file_for_xml_replacement(args):
     if ".git" in str_path:
         return result
         
-    file_extension = file_path.suffix.lower() if isinstance(file_path, Path) else Path(file_path).suffix.lower()
+    file_extension = file_path.suffix.lower()
     # Fast binary check - skip common binary extensions
-    if file_extension in ['.pak', '.lsf', '.bin', '.exe', '.dll', '.so', '.dylib', '.jpg', '.png', '.ttf', '.dat', '.db']:
+    if file_extension in BINARY_EXTENSIONS:
         return result
         
-    # Check if this is an LSX or LSJ file for special handling
+    # Check if this is an LSX, LSJ or LSF file for special handling
     is_lsx_file = file_extension == '.lsx'
     is_lsj_file = file_extension == '.lsj'
+    is_lsf_file = file_extension == '.lsf'
     
     # Add debug info about file type
     if is_lsx_file:
         log(f"Processing LSX file: {file_path}", 2)
     elif is_lsj_file:
         log(f"Processing LSJ file: {file_path}", 2)
+    elif is_lsf_file:
+        log(f"Processing LSF file: {file_path}", 2)
         
+    stats_before = replacer.registry.stats()
+
+    def record_pattern_stats():
+        for key, value in replacer.registry.stats().items():
+            result["pattern_stats"][key] = value - stats_before[key]
+
     try:
-        # Try to read file as text
-        content = None
+        # Map the file and look for the handles in the raw bytes first. Handles are ASCII,
+        # so a file without a hit is never decoded or copied into memory.
+        stage_start = time.perf_counter()
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return result
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                has_hit = replacer.registry.get("presence").search(mapped) is not None
+                # Compressed LSF sections hide their strings from a raw search
+                if not has_hit and not (is_lsf_file and lsf_codec.is_compressed(mapped)):
+                    record_pattern_stats()
+                    timings["read"] = time.perf_counter() - stage_start
+                    return result
+                raw = mapped[:]
+        timings["read"] = time.perf_counter() - stage_start
+        
+        stage_start = time.perf_counter()
         encoding_used = None
-        for encoding in ['utf-8', 'latin-1']:
+        planned = [] if dry_run else None
+        if is_lsf_file:
+            content = raw
             try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    content = f.read()
-                encoding_used = encoding
-                break
-            except UnicodeDecodeError:
-                continue
+                # Patch TranslatedString handles in the binary; no LSX round trip
+                modified_content, matching_ids, changes = replacer.apply_lsf(content, planned)
             except Exception as e:
-                log(f"Error reading {file_path} with {encoding}: {str(e)}", 1)
-                continue
-        
-        if content is None:
-            # Couldn't read file with any encoding
-            return result
-        
-        # Check if any replacement is needed
-        needs_update = False
-        matching_ids = []
-        for old_uid in replacements.keys():
-            if old_uid in content:
-                needs_update = True
-                matching_ids.append(old_uid)
-        
-        if not needs_update:
-            return result
-            
-        # Create backup if needed
-        if backup:
-            backup_path = f"{file_path}.backup"
+                divine_exe_path = _worker_state["divine_exe_path"]
+                if divine_exe_path is None:
+                    raise
+                # Pipeline run: take this file through LSX and back within the same task
+                log(f"Built-in patcher cannot handle {file_path} ({e}); converting it through LSX", 2)
+                divine_start = time.perf_counter()
+                patched = patch_lsf_through_lsx(divine_exe_path, file_path, replacer, planned, encode=not dry_run)
+                timings["divine"] = time.perf_counter() - divine_start
+                if patched is None:
+                    result["cancelled"] = True
+                    return result
+                modified_content, matching_ids, changes = patched
+                if modified_content is None:
+                    modified_content = content
+        elif is_lsx_file:
+            content = raw
+            # Splice the new values into the raw bytes at the offsets expat reports
+            modified_content, matching_ids, changes = replacer.apply_lsx(content, planned)
+        else:
+            # Decode the bytes already read; latin-1 accepts anything utf-8 rejects
             try:
-                import shutil
-                shutil.copy2(file_path, backup_path)
-                log(f"Created backup: {backup_path}", 1)
-            except Exception as e:
-                log(f"Error creating backup for {file_path}: {str(e)}", 0, "Error: ")
-                # Continue execution even if backup fails
+                content = raw.decode('utf-8')
+                encoding_used = 'utf-8'
+            except UnicodeDecodeError:
+                content = raw.decode('latin-1')
+                encoding_used = 'latin-1'
+            # Rewrite all known handles in a single pass over the content
+            modified_content, matching_ids, changes = replacer.apply(content, replacer.file_kind(file_extension),
+                                                                     planned)
+        record_pattern_stats()
+        timings["match"] = time.perf_counter() - stage_start - timings.get("divine", 0.0)
+        
+        if not matching_ids:
+            return result
         
         # Add matching IDs to debug info
         result["debug_info"]["matching_ids"] = matching_ids
-        
-        # Make replacements
-        modified_content = content
-        for old_uid, new_uid in replacements.items():
-            if old_uid in content:
-                # For specific file types, log additional debug info
-                if is_lsx_file:
-                    log(f"Found ID '{old_uid}' in LSX file, will replace with '{new_uid}'", 2)
-                elif is_lsj_file:
-                    log(f"Found ID '{old_uid}' in LSJ file, will replace with '{new_uid}'", 2)
-                # Store original version from original XML
-                original_version = original_contents[new_uid]["version"]
-                
-                # Apply common patterns for all file types
-                # Pattern 1: contentuid="ID" version="VER"
-                pattern1 = fr'contentuid="{re.escape(old_uid)}"\s*version="[^"]*"'
-                replacement1 = f'contentuid="{new_uid}" version="{original_version}"'
-                modified_content_1 = re.sub(pattern1, replacement1, modified_content)
-                if modified_content_1 != modified_content:
-                    result["debug_info"]["changes"].append(f"Pattern 1 matched for {old_uid}")
-                modified_content = modified_content_1
-                
-                # Pattern 2: contentuid="ID"
-                pattern2 = fr'contentuid="{re.escape(old_uid)}"'
-                replacement2 = f'contentuid="{new_uid}"'
-                modified_content_2 = re.sub(pattern2, replacement2, modified_content)
-                if modified_content_2 != modified_content:
-                    result["debug_info"]["changes"].append(f"Pattern 2 matched for {old_uid}")
-                modified_content = modified_content_2
-                
-                # Pattern 3: ID LSX style
-                pattern3 = fr'id="{re.escape(old_uid)}"'
-                replacement3 = f'id="{new_uid}"'
-                modified_content_3 = re.sub(pattern3, replacement3, modified_content)
-                if modified_content_3 != modified_content:
-                    result["debug_info"]["changes"].append(f"Pattern 3 matched for {old_uid}")
-                modified_content = modified_content_3
-                
-                # Apply file-specific patterns
-                if is_lsx_file:
-                    # LSX-specific patterns
-                    # Pattern 5: LSX TagText TranslatedString handle format
-                    pattern5 = fr'<attribute id="TagText" type="TranslatedString" handle="{re.escape(old_uid)}" version="[^"]*" />'
-                    replacement5 = f'<attribute id="TagText" type="TranslatedString" handle="{new_uid}" version="{original_version}" />'
-                    modified_content_5 = re.sub(pattern5, replacement5, modified_content)
-                    if modified_content_5 != modified_content:
-                        result["debug_info"]["changes"].append(f"Pattern 5 matched for {old_uid} - LSX TranslatedString handle")
-                    modified_content = modified_content_5
-                    
-                    # Pattern 6: LSX TranslatedString handle format - alternate
-                    pattern6 = fr'<attribute id="TagText" type="TranslatedString" handle="{re.escape(old_uid)}" version="(\d+)"'
-                    replacement6 = f'<attribute id="TagText" type="TranslatedString" handle="{new_uid}" version="{original_version}"'
-                    modified_content_6 = re.sub(pattern6, replacement6, modified_content)
-                    if modified_content_6 != modified_content:
-                        result["debug_info"]["changes"].append(f"Pattern 6 matched for {old_uid} - LSX TranslatedString handle alternate")
-                    modified_content = modified_content_6
-                    
-                    # Pattern 9: Specific format from the example (.lsx)
-                    pattern9 = fr'<node id="TagText">\s+<attribute id="TagText" type="TranslatedString" handle="{re.escape(old_uid)}" version="[^"]*" />'
-                    replacement9 = f'<node id="TagText">\n\t\t\t\t\t\t\t\t\t\t\t<attribute id="TagText" type="TranslatedString" handle="{new_uid}" version="{original_version}" />'
-                    modified_content_9 = re.sub(pattern9, replacement9, modified_content)
-                    if modified_content_9 != modified_content:
-                        result["debug_info"]["changes"].append(f"Pattern 9 matched for {old_uid} - Specific LSX example format")
-                    modified_content = modified_content_9
-                
-                elif is_lsj_file:
-                    # LSJ-specific patterns
-                    # Pattern 7: LSJ TranslatedString handle format in JSON
-                    pattern7 = fr'"handle" : "{re.escape(old_uid)}",\s*"type" : "TranslatedString",\s*"version" : \d+'
-                    replacement7 = f'"handle" : "{new_uid}", "type" : "TranslatedString", "version" : {original_version}'
-                    modified_content_7 = re.sub(pattern7, replacement7, modified_content)
-                    if modified_content_7 != modified_content:
-                        result["debug_info"]["changes"].append(f"Pattern 7 matched for {old_uid} - LSJ TranslatedString handle")
-                    modified_content = modified_content_7
-                    
-                    # Pattern 8: LSJ TranslatedString handle format - alternate
-                    pattern8 = fr'"handle" : "{re.escape(old_uid)}"'
-                    replacement8 = f'"handle" : "{new_uid}"'
-                    modified_content_8 = re.sub(pattern8, replacement8, modified_content)
-                    if modified_content_8 != modified_content:
-                        result["debug_info"]["changes"].append(f"Pattern 8 matched for {old_uid} - LSJ handle only")
-                    modified_content = modified_content_8
-                    
-                    # Pattern 10: Specific format from the example (.lsj)
-                    pattern10 = fr'"TagText" : {{\s+"handle" : "{re.escape(old_uid)}",\s+"type" : "TranslatedString",\s+"version" : \d+\s+}}'
-                    replacement10 = f'"TagText" : {{\n                                                   "handle" : "{new_uid}",\n                                                   "type" : "TranslatedString",\n                                                   "version" : {original_version}\n                                                }}'
-                    modified_content_10 = re.sub(pattern10, replacement10, modified_content)
-                    if modified_content_10 != modified_content:
-                        result["debug_info"]["changes"].append(f"Pattern 10 matched for {old_uid} - Specific LSJ example format")
-                    modified_content = modified_content_10
-                
-                else:
-                    # For other file types, just check for quoted IDs
-                    pattern4 = fr'"{re.escape(old_uid)}"'
-                    replacement4 = f'"{new_uid}"'
-                    modified_content_4 = re.sub(pattern4, replacement4, modified_content)
-                    if modified_content_4 != modified_content:
-                        result["debug_info"]["changes"].append(f"Pattern 4 matched for {old_uid} - quoted ID in other file type")
-                    modified_content = modified_content_4
+        result["debug_info"]["changes"] = changes
+        for old_uid in matching_ids:
+            # For specific file types, log additional debug info
+            if is_lsx_file:
+                log(f"Found ID '{old_uid}' in LSX file, will replace with '{replacements[old_uid]}'", 2)
+            elif is_lsj_file:
+                log(f"Found ID '{old_uid}' in LSJ file, will replace with '{replacements[old_uid]}'", 2)
+            elif is_lsf_file:
+                log(f"Found ID '{old_uid}' in LSF file, will replace with '{replacements[old_uid]}'", 2)
         
         # Only write if content changed
-        if modified_content != content:
+        if modified_content != content and dry_run:
+            result["plan"] = planned
+            log(f"Would update file: {file_path}", 1)
+            return result
+        elif modified_content != content:
+            stage_start = time.perf_counter()
+            # Stage a backup if needed; only files that are rewritten get one. The parent
+            # moves it into the snapshot store once the pool has finished
+            staged_path = None
+            if backup_dir:
+                try:
+                    staged_path = BackupStore.stage(backup_dir, file_path)
+                    log(f"Staged backup of {file_path}", 2)
+                except Exception as e:
+                    log(f"Error creating backup for {file_path}: {str(e)}", 0, "Error: ")
+                    # Continue execution even if backup fails
             try:
-                with open(file_path, 'w', encoding=encoding_used) as f:
-                    f.write(modified_content)
+                # Written as bytes, so line endings stay exactly as they were; the temp file +
+                # rename means a cancelled run never leaves a half-written file behind
+                atomic_write_bytes(file_path, modified_content if encoding_used is None
+                                   else modified_content.encode(encoding_used))
+                timings["write"] = time.perf_counter() - stage_start
                 result["modified"] = True
+                # Only a file that was actually rewritten needs its original in the snapshot
+                result["backup"] = staged_path
                 log(f"Updated file: {file_path}", 1)
                 return result
             except Exception as e:
+                if staged_path:
+                    remove_file(staged_path)
                 error_msg = f"Error writing to {file_path}: {str(e)}"
                 log(error_msg, 0, "Error: ")
                 result["error"] = error_msg
@@ -392,37 +1414,50 @@ def process_single_file_for_xml_replacement(args):
 
 # Helper function for multiprocessing LSF conversion
 def process_lsf_file_conversion(args):
-    divine_exe_path, file_path_str, delete_original = args
+    divine_exe_path, file_path_str, delete_original, use_native = args
+    start = time.perf_counter()
     file_path_obj = Path(file_path_str)
     source_path = str(file_path_obj)
     filename = file_path_obj.name
     logs = []
+    if cancel_requested():
+        return cancelled_conversion(source_path)
 
     if filename.lower() == "meta.lsf": # Note: .lsf check
         logs.append(f"Skipping: {source_path} (meta.lsf)")
         return {"status": "skipped", "path": source_path, "logs": logs}
 
     destination_path = file_path_obj.with_suffix(".lsx") # Note: .lsx destination
+    if use_native:
+        native_result = convert_with_codec(source_path, destination_path, delete_original)
+        if native_result["status"] != "unsupported":
+            return native_result
+        logs.extend(native_result["logs"])
+
+    # Divine writes next to the destination and the output is only moved into place once it
+    # has finished, so a failed or cancelled conversion never leaves a partial file behind
+    temp_path = divine_temp_path(destination_path)
     command = [
         divine_exe_path,
         "--action", "convert-resource",
         "--game", "bg3",
         "--source", source_path,
-        "--destination", str(destination_path),
+        "--destination", str(temp_path),
         "--loglevel", "error"
     ]
 
     try:
         logs.append(f"Converting: {source_path} -> {destination_path}")
-        process_run_args = {"capture_output": True, "text": True, "check": False}
-        if sys.platform != "win32":
-            process_run_args["shell"] = False
-        else:
-            process_run_args["shell"] = False # Keep shell=False for Divine.exe
-
-        process = subprocess.run(command, **process_run_args)
+        divine_start = time.perf_counter()
+        process = run_divine(command)
+        timings = {"divine": time.perf_counter() - divine_start, "total": time.perf_counter() - start}
+        if process is None:
+            remove_file(temp_path)
+            logs.append(f"Cancelled: {source_path}")
+            return dict(cancelled_conversion(source_path), logs=logs, timings=timings)
 
         if process.returncode == 0:
+            os.replace(temp_path, destination_path)
             logs.append(f"Successfully converted: {destination_path}")
             if delete_original:
                 try:
@@ -430,7 +1465,7 @@ def process_lsf_file_conversion(args):
                     logs.append(f"Successfully deleted original file: {source_path}")
                 except OSError as e:
                     logs.append(f"Error deleting original file {source_path}: {e}")
-            return {"status": "converted", "path": source_path, "logs": logs}
+            return {"status": "converted", "path": source_path, "logs": logs, "timings": timings}
         else:
             log_msg = f"Error converting {source_path}:\n"
             log_msg += f"  Return code: {process.returncode}\n"
@@ -439,297 +1474,1290 @@ def process_lsf_file_conversion(args):
             if process.stderr:
                 log_msg += f"  Stderr: {process.stderr.strip()}\n"
             logs.append(log_msg)
-            return {"status": "error", "path": source_path, "details": log_msg, "logs": logs}
+            remove_file(temp_path)
+            return {"status": "error", "path": source_path, "details": log_msg, "logs": logs, "timings": timings}
     except Exception as e:
+        remove_file(temp_path)
         error_msg = f"Exception during conversion of {source_path}: {e}"
         logs.append(error_msg)
         return {"status": "error", "path": source_path, "details": error_msg, "logs": logs}
 
-class LsfConverterWorker(QThread):
+# Divine.exe instances are heavy (.NET start-up, several threads each), so running more than a
+# few at once only thrashes; CPU-bound work in the pool processes gets one process per CPU
+SUBPROCESS_PROCESS_CAP = 4
+# Largest number of files handed to a pool process per round trip; bounds how long progress
+# updates and cancellation wait behind one chunk
+MAX_CHUNKSIZE = 32
+# Chunk size when the file count is not known up front (paths streamed from a running scan)
+STREAMING_CHUNKSIZE = 4
+
+
+def pool_size(task_count, requested=None, subprocess_bound=False):
+    """Number of pool processes for task_count tasks (None: not known yet).
+
+    requested (--processes, or the GUI's Processes box) wins when given.
+    Otherwise CPU-bound work gets one process per CPU and work that waits on
+    Divine.exe at most SUBPROCESS_PROCESS_CAP. Never more processes than
+    tasks, and at least one.
+    """
+    if requested:
+        processes = requested
+    elif subprocess_bound:
+        processes = min(multiprocessing.cpu_count(), SUBPROCESS_PROCESS_CAP)
+    else:
+        processes = multiprocessing.cpu_count()
+    if task_count is not None:
+        processes = min(processes, task_count)
+    return max(1, processes)
+
+
+def plan_chunksize(task_count, processes):
+    """Files per pool round trip: about eight chunks per process, between 1 and MAX_CHUNKSIZE."""
+    if task_count is None:
+        return STREAMING_CHUNKSIZE
+    return max(1, min(MAX_CHUNKSIZE, task_count // (processes * 8)))
+
+
+def order_by_size(paths):
+    """Return paths largest file first, so big files start early instead of straggling at the end."""
+    def size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    return sorted(paths, key=size, reverse=True)
+
+
+def split_into_batches(items, batch_count):
+    """Split items round-robin into at most batch_count non-empty batches.
+
+    With items ordered by size (order_by_size) the batches come out about equally heavy.
+    """
+    batch_count = max(1, min(batch_count, len(items)))
+    return [items[i::batch_count] for i in range(batch_count)]
+
+
+# Helper function for multiprocessing batched conversion (one Divine.exe launch per batch)
+def process_conversion_batch(args):
+    """Convert a batch of files with a single Divine.exe convert-resources call.
+
+    The sources are staged (hard-linked where possible) into a temporary
+    directory, converted in one process launch, and the outputs moved next to
+    their sources. Any file Divine did not produce an output for is retried
+    through the per-file conversion helper. With use_native, files the built-in
+    codec can handle never reach Divine.exe at all.
+
+    Once the run is cancelled, the remaining files come back as "cancelled";
+    a running Divine.exe is killed and its outputs are discarded with the
+    temporary directory.
+    """
+    divine_exe_path, file_path_strs, delete_original, input_format, output_format, use_native = args
+    single_file_helper = process_lsx_file_conversion if input_format == "lsx" else process_lsf_file_conversion
+    results = []
+    pending = []
+    native_logs = {}
+
+    for file_path_str in file_path_strs:
+        if cancel_requested():
+            results.append(cancelled_conversion(file_path_str))
+            continue
+        if Path(file_path_str).name.lower() == f"meta.{input_format}":
+            results.append(single_file_helper((divine_exe_path, file_path_str, delete_original, False)))
+            continue
+        if use_native:
+            native_result = convert_with_codec(
+                file_path_str, Path(file_path_str).with_suffix(f".{output_format}"), delete_original)
+            if native_result["status"] != "unsupported":
+                results.append(native_result)
+                continue
+            native_logs[file_path_str] = native_result["logs"]
+        pending.append(file_path_str)
+
+    if not pending:
+        return results
+
+    with tempfile.TemporaryDirectory(prefix="divine_batch_") as staging_dir:
+        source_dir = Path(staging_dir) / "source"
+        destination_dir = Path(staging_dir) / "destination"
+        # One subdirectory per file keeps identically named files from colliding
+        staged = []
+        for index, file_path_str in enumerate(pending):
+            staged_source = source_dir / str(index) / Path(file_path_str).name
+            staged_source.parent.mkdir(parents=True)
+            try:
+                os.link(file_path_str, staged_source)
+            except OSError:
+                shutil.copy2(file_path_str, staged_source)
+            staged_output = destination_dir / str(index) / Path(file_path_str).with_suffix(f".{output_format}").name
+            staged.append((file_path_str, staged_output))
+
+        command = [
+            divine_exe_path,
+            "--action", "convert-resources",
+            "--game", "bg3",
+            "--source", str(source_dir),
+            "--destination", str(destination_dir),
+            "--input-format", input_format,
+            "--output-format", output_format,
+            "--loglevel", "error"
+        ]
+        batch_error = None
+        divine_start = time.perf_counter()
+        try:
+            process = run_divine(command)
+            if process is None:
+                return results + [cancelled_conversion(file_path_str) for file_path_str in pending]
+            if process.returncode != 0:
+                batch_error = f"Return code: {process.returncode}"
+                if process.stderr:
+                    batch_error += f", Stderr: {process.stderr.strip()}"
+        except Exception as e:
+            batch_error = str(e)
+        # One launch converts the whole batch, so each file is charged an even share of it
+        divine_share = (time.perf_counter() - divine_start) / len(staged)
+
+        for file_path_str, staged_output in staged:
+            destination_path = Path(file_path_str).with_suffix(f".{output_format}")
+            logs = [f"Converting: {file_path_str} -> {destination_path}"]
+            if not staged_output.is_file():
+                # Divine skipped or failed this file; retry it on its own
+                if batch_error:
+                    logs.append(f"Batch conversion failed ({batch_error}), retrying individually: {file_path_str}")
+                fallback = single_file_helper((divine_exe_path, file_path_str, delete_original, False))
+                fallback["logs"] = native_logs.get(file_path_str, []) + logs[1:] + fallback.get("logs", [])
+                timings = fallback.setdefault("timings", {"divine": 0.0, "total": 0.0})
+                timings["divine"] += divine_share
+                timings["total"] += divine_share
+                results.append(fallback)
+                continue
+            logs = native_logs.get(file_path_str, []) + logs
+            try:
+                shutil.move(str(staged_output), str(destination_path))
+                logs.append(f"Successfully converted: {destination_path}")
+                if delete_original:
+                    try:
+                        os.remove(file_path_str)
+                        logs.append(f"Successfully deleted original file: {file_path_str}")
+                    except OSError as e:
+                        logs.append(f"Error deleting original file {file_path_str}: {e}")
+                results.append({"status": "converted", "path": file_path_str, "logs": logs,
+                                "timings": {"divine": divine_share, "total": divine_share}})
+            except Exception as e:
+                error_msg = f"Exception during conversion of {file_path_str}: {e}"
+                logs.append(error_msg)
+                results.append({"status": "error", "path": file_path_str, "details": error_msg, "logs": logs})
+
+    return results
+
+
+def file_sha1(path):
+    """Return the SHA-1 hex digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_divine_version(divine_exe_path):
+    """Fingerprint the Divine/LSLib build so cached conversions are invalidated when it changes."""
+    tools_dir = Path(divine_exe_path).parent
+    digest = hashlib.sha1()
+    for name in (Path(divine_exe_path).name, "Divine.dll", "LSLib.dll"):
+        try:
+            stat = (tools_dir / name).stat()
+        except OSError:
+            continue
+        digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+def get_converter_version(divine_exe_path, native):
+    """Cache fingerprint for the converter in use; built-in outputs are keyed by the codec version."""
+    divine_version = get_divine_version(divine_exe_path)
+    if native:
+        return f"lsf_codec-{lsf_codec.CODEC_VERSION}+{divine_version}"
+    return divine_version
+
+
+class ConversionCache:
+    """Manifest of previous Divine conversions, keyed by output path.
+
+    Each entry records the source path, hash, size and mtime, the Divine
+    version and the output hash. Output bytes are kept in a content-addressed
+    object store, because the converters delete their sources. When an LSF is
+    converted to LSX, the reverse entry (LSX -> original LSF bytes) is recorded
+    as well, so an unedited LSX is restored to its original LSF without
+    running Divine again.
+    """
+
+    MANIFEST_VERSION = 1
+
+    def __init__(self, search_dir, divine_version):
+        self.root = Path(search_dir) / CACHE_DIR_NAME / "conversion_cache"
+        self.objects_dir = self.root / "objects"
+        # Sources linked here before conversion deletes them; record() hashes them into objects/
+        self.pending_dir = self.root / "pending"
+        self.manifest_path = self.root / "manifest.json"
+        self.divine_version = divine_version
+        self.outputs = {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == self.MANIFEST_VERSION:
+                self.outputs = manifest.get("outputs", {})
+        except (OSError, ValueError):
+            pass
+
+    def _source_sha1(self, source_path, stat, entry):
+        """Hash a source file, skipping the read when size and mtime match its entry."""
+        if (entry is not None and entry["source_path"] == source_path
+                and entry["source_size"] == stat.st_size and entry["source_mtime"] == stat.st_mtime_ns):
+            return entry["source_sha1"]
+        return file_sha1(source_path)
+
+    def _store_object(self, path, sha1, move=False):
+        """Put path's content into the object store as sha1; move takes path itself."""
+        object_path = self.objects_dir / sha1
+        if object_path.exists():
+            if move:
+                os.remove(path)
+            return
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        if move:
+            os.replace(path, object_path)
+            return
+        # Outputs stay in place and may be edited, so they are copied rather than linked
+        temp_path = object_path.with_suffix(".tmp")
+        shutil.copyfile(path, temp_path)
+        os.replace(temp_path, object_path)
+
+    def lookup(self, source_path, destination_path):
+        """Return the cached output object for an up-to-date conversion, or None."""
+        source_path = str(source_path)
+        entry = self.outputs.get(str(destination_path))
+        if entry is None or entry["divine_version"] != self.divine_version:
+            return None
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            return None
+        if entry["source_sha1"] != self._source_sha1(source_path, stat, entry):
+            return None
+        object_path = self.objects_dir / entry["output_sha1"]
+        return object_path if object_path.is_file() else None
+
+    def restore(self, object_path, destination_path):
+        """Write a cached output to its destination, leaving identical files untouched."""
+        destination_path = Path(destination_path)
+        if destination_path.is_file() and file_sha1(destination_path) == object_path.name:
+            return
+        temp_path = destination_path.with_name(destination_path.name + ".tmp")
+        shutil.copyfile(object_path, temp_path)
+        os.replace(temp_path, destination_path)
+
+    def stash_source(self, source_path):
+        """Keep a source for the reverse entry before the conversion deletes it.
+
+        Only a hardlink is made here; the source is hashed by record() once it
+        has been converted, while the pool works on the other files.
+        """
+        source_path = str(source_path)
+        stat = os.stat(source_path)
+        self.pending_dir.mkdir(parents=True, exist_ok=True)
+        pending_path = self.pending_dir / hashlib.sha1(source_path.encode("utf-8")).hexdigest()
+        link_backup(source_path, pending_path)
+        return {"source_path": source_path, "pending_path": str(pending_path),
+                "source_size": stat.st_size, "source_mtime": stat.st_mtime_ns}
+
+    def record(self, source_info, destination_path):
+        """Record a finished conversion and its reverse mapping."""
+        source_info = dict(source_info)
+        pending_path = source_info.pop("pending_path")
+        source_info["source_sha1"] = file_sha1(pending_path)
+        self._store_object(pending_path, source_info["source_sha1"], move=True)
+        destination_path = str(destination_path)
+        output_sha1 = file_sha1(destination_path)
+        self._store_object(destination_path, output_sha1)
+        self.outputs[destination_path] = dict(source_info, divine_version=self.divine_version,
+                                              output_sha1=output_sha1)
+        output_stat = os.stat(destination_path)
+        self.outputs[source_info["source_path"]] = {
+            "source_path": destination_path,
+            "source_sha1": output_sha1,
+            "source_size": output_stat.st_size,
+            "source_mtime": output_stat.st_mtime_ns,
+            "divine_version": self.divine_version,
+            "output_sha1": source_info["source_sha1"],
+        }
+
+    def partition(self, files, output_suffix, delete_original, log, cancelled=None):
+        """Restore every up-to-date file from the cache and return the ones that still need Divine.
+
+        Returns (files_to_convert, source_infos, cached_count); source_infos
+        holds what record() needs once a file has been converted. Once
+        cancelled() is true the remaining files are returned unchecked, for
+        the pool to skip as cancelled.
+        """
+        files = list(files)
+        files_to_convert = []
+        source_infos = {}
+        cached_count = 0
+        for index, file_path in enumerate(files):
+            if cancelled is not None and cancelled():
+                files_to_convert.extend(files[index:])
+                break
+            if Path(file_path).stem.lower() == "meta":
+                # meta files are skipped by the converters and never cached
+                files_to_convert.append(file_path)
+                continue
+            destination_path = Path(file_path).with_suffix(output_suffix)
+            object_path = self.lookup(file_path, destination_path)
+            if object_path is None:
+                source_infos[str(file_path)] = self.stash_source(file_path)
+                files_to_convert.append(file_path)
+                continue
+            self.restore(object_path, destination_path)
+            log(f"Up to date, restored from cache: {destination_path}")
+            if delete_original:
+                try:
+                    os.remove(file_path)
+                except OSError as e:
+                    log(f"Error deleting original file {file_path}: {e}")
+            cached_count += 1
+        return files_to_convert, source_infos, cached_count
+
+    def save(self):
+        """Write the manifest and drop the objects and pending sources it no longer refers to."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        temp_path = self.manifest_path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.MANIFEST_VERSION, "outputs": self.outputs}, f, indent=1)
+        os.replace(temp_path, self.manifest_path)
+        # Every object is some entry's output: forward entries point at converted
+        # outputs, reverse entries at the original sources
+        referenced = {entry["output_sha1"] for entry in self.outputs.values()}
+        for directory, keep in ((self.objects_dir, referenced), (self.pending_dir, ())):
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                if name not in keep:
+                    remove_file(directory / name)
+
+
+class LsfConverterWorker(Worker):
     """Worker thread for converting LSF to LSX files."""
-    progress_update = pyqtSignal(str)
-    progress_percent = pyqtSignal(int)
-    finished_signal = pyqtSignal(dict)
-    error_signal = pyqtSignal(str)
 
-    def __init__(self, search_dir, recursive=True):
+    def __init__(self, search_dir, recursive=True, batch_mode=True, use_cache=True, native=True, processes=None):
         super().__init__()
         self.search_dir = search_dir
         self.recursive = recursive
-        self.running = True
+        # Batch mode converts each worker's share of files with one Divine.exe launch (without native)
+        self.batch_mode = batch_mode
+        # Skip files whose converted output is already in the conversion cache
+        self.use_cache = use_cache
+        # Convert in-process with lsf_codec, keeping Divine.exe only as a fallback
+        self.native = native
+        # Pool size; None sizes it from the CPU count and the kind of conversion (see pool_size)
+        self.processes = processes
         self.divine_exe_path = os.path.join(os.getcwd(), "Tools", "Divine.exe")
 
     def run(self):
         try:
+            metrics = self.begin_metrics()
             if not os.path.exists(self.divine_exe_path):
-                self.error_signal.emit(f"Error: Divine.exe not found at {self.divine_exe_path}")
-                return
-
-            self.progress_update.emit(f"Starting LSF to LSX conversion using Divine.exe from: {self.divine_exe_path}")
+                if not self.native:
+                    self.error_signal.emit(f"Error: Divine.exe not found at {self.divine_exe_path}")
+                    return
+                self.progress_update.emit(f"Divine.exe not found at {self.divine_exe_path}; "
+                                          "files the built-in converter cannot handle will fail.")
+
+            if self.native:
+                self.progress_update.emit(f"Starting LSF to LSX conversion with the built-in converter "
+                                          f"(Divine.exe fallback: {self.divine_exe_path})")
+            else:
+                self.progress_update.emit(f"Starting LSF to LSX conversion using Divine.exe from: {self.divine_exe_path}")
             self.progress_update.emit(f"Scanning directory: {self.search_dir}")
 
             search_path_obj = Path(self.search_dir)
             if self.recursive:
                 self.progress_update.emit(f"Scanning directory recursively: {search_path_obj}")
-                all_files_in_dir = [f for f in search_path_obj.rglob("*.lsf") if f.is_file()] # Note: .lsf
             else:
                 self.progress_update.emit(f"Scanning directory (non-recursively): {search_path_obj}")
-                all_files_in_dir = [f for f in search_path_obj.glob("*.lsf") if f.is_file()] # Note: .lsf
-            
-            files_to_scan = [
-                f for f in all_files_in_dir
-                if ".git" not in f.parts and "Tools" not in f.parts
-            ]
+            # .git, Tools and the cache folder are pruned during the walk
+            with metrics.stage("scan"):
+                files_to_scan = list(scan_files(search_path_obj, {".lsf"}, self.recursive,
+                                                include=self.include_globs, exclude=self.exclude_globs))
 
             total_files = len(files_to_scan)
             self.progress_update.emit(f"Found {total_files} .lsf files to potentially convert.")
 
             if total_files == 0:
                 self.progress_percent.emit(100)
-                self.finished_signal.emit({"converted_files": 0, "skipped_files": 0, "error_files": [], "total_scanned": 0})
+                self.finished_signal.emit(self.finish_metrics(
+                    {"converted_files": 0, "skipped_files": 0, "cached_files": 0, "error_files": [], "cancelled_files": 0,
+                     "total_scanned": 0},
+                    "lsf-to-lsx"))
                 return
 
             converted_files = 0
             skipped_files = 0
             error_files = []
+            cached_files = 0
+            cancelled_files = 0
+            source_infos = {}
+            cache = None
+            if self.use_cache:
+                cache = ConversionCache(self.search_dir, get_converter_version(self.divine_exe_path, self.native))
+                with metrics.stage("cache_lookup"):
+                    files_to_scan, source_infos, cached_files = cache.partition(
+                        files_to_scan, ".lsx", True, self.progress_update.emit, lambda: not self.running)
+                self.progress_update.emit(f"{cached_files} files already up to date in the conversion cache.")
             
-            tasks = [(self.divine_exe_path, str(f_obj), True) for f_obj in files_to_scan]
+            # Largest first, so big files do not straggle at the end and batches come out even
+            files_to_scan = order_by_size(files_to_scan)
+            tasks = [(self.divine_exe_path, str(f_obj), True, self.native) for f_obj in files_to_scan]
 
-            max_processes = multiprocessing.cpu_count()
-            num_processes = min(total_files, max_processes)
-            if num_processes == 0 and total_files > 0 :
-                num_processes = 1
+            # Built-in conversions are CPU-bound in the pool processes; Divine.exe ones wait on a subprocess
+            num_processes = pool_size(len(files_to_scan), self.processes, subprocess_bound=not self.native)
+            chunksize = plan_chunksize(len(tasks), num_processes)
             
             self.progress_update.emit(f"Using {num_processes} worker processes.")
+            if self.batch_mode and not self.native:
+                self.progress_update.emit(f"Batch mode: converting with {num_processes} Divine.exe invocations.")
 
-            processed_count = 0
-            try:
-                with multiprocessing.Pool(processes=num_processes) as pool:
-                    results_iterator = pool.imap_unordered(process_lsf_file_conversion, tasks) # Use new helper
+            processed_count = cached_files
+            convert_start = time.perf_counter()
+            if files_to_scan:
+                try:
+                    with self.open_pool(num_processes, subprocess_bound=not self.native) as pool:
+                        # Batches only pay off for Divine.exe, where they save process launches; built-in
+                        # conversions are dispatched per file in chunks, so the pool stays balanced
+                        if self.batch_mode and not self.native:
+                            batches = [(self.divine_exe_path, [str(f_obj) for f_obj in batch], True, "lsf", "lsx", self.native)
+                                       for batch in split_into_batches(files_to_scan, num_processes)]
+                            batch_iterator = pool.imap_unordered(metrics.task(process_conversion_batch), batches)
+                            results_iterator = (result for batch_results in batch_iterator for result in batch_results)
+                        else:
+                            results_iterator = pool.imap_unordered(metrics.task(process_lsf_file_conversion), tasks,
+                                                                   chunksize=chunksize)
                     
-                    for i, result_dict in enumerate(results_iterator):
-                        processed_count = i + 1
-                        if not self.running:
-                            self.progress_update.emit("LSF Conversion Canceled by user.")
-                            break
+                        # After a cancel the loop keeps going: files not started yet come back at
+                        # once as cancelled and a running Divine.exe is killed, so the pool is idle
+                        # by the time the loop ends
+                        for result_dict in results_iterator:
+                            for log_message in result_dict.get("logs", []):
+                                self.progress_update.emit(log_message)
+                            if result_dict["status"] == "cancelled":
+                                cancelled_files += 1
+                                continue
+                            processed_count += 1
+                            self.file_result.emit(result_dict)
+                            metrics.add_file(result_dict["path"], result_dict.get("timings"))
+
+                            status = result_dict["status"]
+                            if status == "converted":
+                                converted_files += 1
+                                if cache is not None:
+                                    try:
+                                        cache.record(source_infos[result_dict["path"]],
+                                                     Path(result_dict["path"]).with_suffix(".lsx"))
+                                    except (OSError, KeyError) as e:
+                                        self.progress_update.emit(f"Could not cache conversion of {result_dict['path']}: {e}")
+                            elif status == "skipped":
+                                skipped_files += 1
+                            elif status == "error":
+                                error_files.append(result_dict["path"])
                         
-                        for log_message in result_dict.get("logs", []):
-                            self.progress_update.emit(log_message)
-
-                        status = result_dict["status"]
-                        if status == "converted":
-                            converted_files += 1
-                        elif status == "skipped":
-                            skipped_files += 1
-                        elif status == "error":
-                            error_files.append(result_dict["path"])
-                        
-                        self.progress_percent.emit(int(((processed_count) / total_files) * 100))
-            except Exception as e:
-                self.error_signal.emit(f"Error during multiprocessing pool execution: {str(e)}")
+                            self.progress_percent.emit(int(((processed_count) / total_files) * 100))
+                except Exception as e:
+                    self.error_signal.emit(f"Error during multiprocessing pool execution: {str(e)}")
 
 
             if self.running and processed_count == total_files:
                  self.progress_percent.emit(100)
             elif not self.running :
+                 self.progress_update.emit(f"LSF Conversion Canceled by user; {cancelled_files} files left unconverted.")
                  self.progress_percent.emit(int(((processed_count) / total_files) * 100))
 
+            metrics.add_stage("convert", time.perf_counter() - convert_start)
+
+            if cache is not None:
+                with metrics.stage("cache_save"):
+                    cache.save()
+
             final_result = {
                 "converted_files": converted_files,
                 "skipped_files": skipped_files,
+                "cached_files": cached_files,
                 "error_files": error_files,
+                "cancelled_files": cancelled_files,
                 "total_scanned": processed_count
             }
-            self.finished_signal.emit(final_result)
+            self.finished_signal.emit(self.finish_metrics(final_result, "lsf-to-lsx"))
 
         except Exception as e:
+            self.metrics.stop_profile()
             self.error_signal.emit(f"Error in LsfConverterWorker: {str(e)}")
 
-    def stop(self):
-        """Stop the worker thread."""
-        self.running = False
+
+def iter_content_entries(xml_path):
+    """Stream (contentuid, version, text) for every <content> node of a localization file.
+
+    Elements are cleared as soon as they have been read, so memory use stays
+    flat regardless of the size of the file.
+    """
+    context = ET.iterparse(xml_path, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event == "end" and elem.tag == "content":
+            if "contentuid" in elem.attrib:
+                yield elem.attrib["contentuid"], elem.attrib.get("version", ""), elem.text
+            elem.clear()
+            root.clear()
+
+
+def hash_content_text(text):
+    """Compact digest of a content node's text, used for the version-revert comparison."""
+    if text is None:
+        return None
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+# Localization handles as they appear in english.xml, LSX/LSJ text and LSF value data
+HANDLE_PATTERN = re.compile(rb"h[0-9a-f]{8}g[0-9a-f]{4}g[0-9a-f]{4}g[0-9a-f]{4}g[0-9a-f]{12}")
+
+
+def extract_file_handles(file_path):
+    """Return (file_path, handles) for one file, or (file_path, None) if it cannot be read.
+
+    Module-level so the handle index can fan it out to a process pool. LSF
+    files are searched in their decoded value section, so compressed
+    binaries are indexed too.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return file_path, None
+    if file_path.lower().endswith(".lsf"):
+        try:
+            data = lsf_codec.read_lsf_tables(data)["values"]
+        except Exception:
+            if lsf_codec.is_compressed(data):
+                return file_path, None  # The raw bytes hide its strings; process it on every run
+            # Not a readable LSF; index the raw bytes
+    return file_path, sorted({match.decode("ascii") for match in HANDLE_PATTERN.findall(data)})
+
+
+def extract_file_handles_task(file_path):
+    """Pool task for HandleIndex.update: extract_file_handles, or None once the run is cancelled."""
+    if cancel_requested():
+        return None
+    return extract_file_handles(file_path)
+
+
+class HandleIndex:
+    """Persistent map of which files reference which handles.
+
+    Stored per search directory as {relative path: [size, mtime_ns, handles]}.
+    update() re-reads only files whose size or mtime changed, so after the
+    first run a replacement only has to stat the tree and then open the
+    files that actually contain the affected handles.
+    """
+
+    INDEX_VERSION = 1
+
+    def __init__(self, search_dir):
+        self.search_dir = Path(search_dir)
+        self.index_path = self.search_dir / CACHE_DIR_NAME / "handle_index.json"
+        self.files = {}
+        self.unreadable = set()
+        self.by_handle = None
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.INDEX_VERSION:
+                self.files = data.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+    def _key(self, path):
+        return Path(path).relative_to(self.search_dir).as_posix()
+
+    def update(self, files, processes=1, open_pool=None):
+        """Bring the entries for files up to date; returns (reindexed, unchanged, removed) counts.
+
+        When it is worth it, the files are read on a pool of up to processes
+        processes, opened with open_pool(processes) (e.g. Worker.open_pool,
+        which may hand out a shared pool) or else a plain multiprocessing.Pool.
+        Files skipped because the run was cancelled keep their old entries.
+        """
+        todo = []
+        stats = {}
+        seen = set()
+        unchanged = 0
+        for path in files:
+            key = self._key(path)
+            seen.add(key)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = self.files.get(key)
+            if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                unchanged += 1
+                continue
+            stats[str(path)] = (stat.st_size, stat.st_mtime_ns)
+            todo.append(str(path))
+
+        removed = [key for key in self.files if key not in seen and not (self.search_dir / key).exists()]
+        for key in removed:
+            del self.files[key]
+
+        if todo:
+            if processes > 1 and len(todo) > 1:
+                processes = min(processes, len(todo))
+                with (open_pool or multiprocessing.Pool)(processes) as pool:
+                    results = list(pool.imap_unordered(extract_file_handles_task, order_by_size(todo),
+                                                       chunksize=plan_chunksize(len(todo), processes)))
+            else:
+                results = [extract_file_handles(path) for path in todo]
+            for result in results:
+                if result is None:
+                    continue
+                path, handles = result
+                if handles is None:
+                    self.unreadable.add(path)
+                    self.files.pop(self._key(path), None)
+                else:
+                    size, mtime_ns = stats[path]
+                    self.files[self._key(path)] = [size, mtime_ns, handles]
+        self.by_handle = None
+        return len(todo), unchanged, len(removed)
+
+    def files_for(self, handles, candidates):
+        """Return the candidate paths that reference any of handles.
+
+        Returns None when some handle is not in handle form (the index cannot
+        answer for it), so the caller falls back to processing every file.
+        """
+        if not all(HANDLE_PATTERN.fullmatch(handle.encode("ascii", "replace")) for handle in handles):
+            return None
+        if self.by_handle is None:
+            self.by_handle = {}
+            for key, (_, _, file_handles) in self.files.items():
+                for handle in file_handles:
+                    self.by_handle.setdefault(handle, []).append(key)
+        keys = set()
+        for handle in handles:
+            keys.update(self.by_handle.get(handle, ()))
+        return [path for path in candidates if self._key(path) in keys or str(path) in self.unreadable]
+
+    def save(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.index_path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.INDEX_VERSION, "files": self.files}, f)
+        os.replace(temp_path, self.index_path)
+
+
+class BackupStore:
+    """Content-addressed snapshots of the files a replacement run rewrites.
+
+    Lives in the cache folder, so the scanner never sees it:
+    objects/<sha1> holds each distinct original once, however many runs
+    back it up, and snapshots/<id>.json maps every file of one run to its
+    object. During the run the workers only hardlink the originals into
+    staging/<id>/ (see stage()); hashing, deduplication and the manifest
+    are done in bulk by commit() once the pool has finished.
+    """
+
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self, search_dir):
+        self.search_dir = Path(search_dir)
+        self.root = self.search_dir / CACHE_DIR_NAME / "backups"
+        self.objects_dir = self.root / "objects"
+        self.snapshots_dir = self.root / "snapshots"
+        self.snapshot_id = None
+        self.staging_dir = None
+
+    def begin(self):
+        """Start a snapshot and return the staging directory the workers link into."""
+        self.snapshot_id = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        self.staging_dir = self.root / "staging" / self.snapshot_id
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        return str(self.staging_dir)
+
+    @staticmethod
+    def stage(staging_dir, path):
+        """Link path's current content into staging_dir and return the staged path.
+
+        Called right before path is rewritten; the staged name is derived from
+        the path, so a file is staged at most once per run.
+        """
+        name = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+        staged_path = os.path.join(staging_dir, name)
+        link_backup(path, staged_path)
+        return staged_path
+
+    def _key(self, path):
+        path = Path(path).resolve()
+        try:
+            return path.relative_to(self.search_dir.resolve()).as_posix()
+        except ValueError:
+            return str(path)  # e.g. an english.xml outside the search directory
+
+    def _path(self, key):
+        path = Path(key)
+        return path if path.is_absolute() else self.search_dir / path
+
+    def commit(self, staged):
+        """Move the staged originals into the object store and write the manifest.
+
+        staged maps each rewritten path to its staged copy. Returns
+        (snapshot_id, new_objects); objects already in the store are reused.
+        """
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        files = {}
+        new_objects = 0
+        for path, staged_path in staged.items():
+            sha1 = file_sha1(staged_path)
+            object_path = self.objects_dir / sha1
+            if object_path.exists():
+                os.remove(staged_path)
+            else:
+                os.replace(staged_path, object_path)
+                new_objects += 1
+            files[self._key(path)] = sha1
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {"version": self.SNAPSHOT_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "files": files}
+        atomic_write_bytes(self.snapshots_dir / f"{self.snapshot_id}.json",
+                           json.dumps(manifest, indent=1).encode("utf-8"))
+        self.discard()
+        return self.snapshot_id, new_objects
+
+    def discard(self):
+        """Remove the staging directory, unless a cancelled run left unclaimed links in it."""
+        if self.staging_dir is not None:
+            try:
+                self.staging_dir.rmdir()
+                self.staging_dir.parent.rmdir()
+            except OSError:
+                pass
+
+    def snapshots(self):
+        """Return the snapshot ids, oldest first."""
+        try:
+            return sorted(path.stem for path in self.snapshots_dir.glob("*.json"))
+        except OSError:
+            return []
+
+    def load(self, snapshot_id=None):
+        """Return (snapshot_id, manifest) for snapshot_id or the latest snapshot.
+
+        Raises OSError if the manifest cannot be read and ValueError if it is
+        not a snapshot manifest.
+        """
+        if snapshot_id is None:
+            snapshot_ids = self.snapshots()
+            if not snapshot_ids:
+                raise FileNotFoundError(f"No backup snapshots in {self.snapshots_dir}")
+            snapshot_id = snapshot_ids[-1]
+        with open(self.snapshots_dir / f"{snapshot_id}.json", "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), dict):
+            raise ValueError(f"Snapshot {snapshot_id} has no file list")
+        return snapshot_id, manifest
+
+    def restore(self, snapshot_id=None):
+        """Put every file of a snapshot back and yield (path, status) per file.
+
+        status is "restored", "unchanged" when the file already holds the
+        backed-up content, or an error message.
+        """
+        snapshot_id, manifest = self.load(snapshot_id)
+        for key, sha1 in manifest["files"].items():
+            path = self._path(key)
+            try:
+                if path.is_file() and file_sha1(path) == sha1:
+                    yield str(path), "unchanged"
+                    continue
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.objects_dir / sha1, "rb") as f:
+                    atomic_write_bytes(path, f.read())
+                yield str(path), "restored"
+            except OSError as e:
+                yield str(path), f"Error restoring {path}: {e}"
+
+
+class RestoreWorker(Worker):
+    """Puts back the files of one backup snapshot (the GUI's Restore Backup)."""
+
+    def __init__(self, search_dir, snapshot_id=None):
+        super().__init__()
+        self.search_dir = search_dir
+        self.snapshot_id = snapshot_id
+
+    def run(self):
+        try:
+            store = BackupStore(self.search_dir)
+            snapshot_id, manifest = store.load(self.snapshot_id)
+            total = len(manifest["files"])
+            counts = {"restored": 0, "unchanged": 0, "errors": 0}
+            for done, (path, status) in enumerate(store.restore(snapshot_id), 1):
+                if status == "restored":
+                    counts["restored"] += 1
+                    self.progress_update.emit(f"Restored: {path}")
+                elif status == "unchanged":
+                    counts["unchanged"] += 1
+                else:
+                    counts["errors"] += 1
+                    self.progress_update.emit(f"ERROR: {status}")
+                self.file_result.emit({"file_path": path, "status": status})
+                self.progress_percent.emit(int(done / total * 100))
+                if not self.running:
+                    break
+            self.finished_signal.emit({"snapshot": snapshot_id, "total": total, "cancelled": not self.running,
+                                       **counts})
+        except Exception as e:
+            self.error_signal.emit(f"Error: {str(e)}")
+
+
+PLAN_VERSION = 1
 
 
-class XMLWorker(QThread):
+def default_plan_path(search_dir):
+    """Where a dry run saves its replacement plan unless told otherwise."""
+    return Path(search_dir) / CACHE_DIR_NAME / "replacement_plan.json"
+
+
+def save_replacement_plan(plan_path, worker, new_file_sha1, handle_table, delete_uids, files):
+    """Write a dry run's plan: the XML diff, the handle table and every file with its changes.
+
+    new_file_sha1 lets the apply run refuse a plan whose new XML has changed
+    since, because the nodes to delete are recorded by position.
+    """
+    plan = {
+        "version": PLAN_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "original_file": os.path.abspath(worker.original_file),
+        "new_file": os.path.abspath(worker.new_file),
+        "new_file_sha1": new_file_sha1,
+        "search_dir": os.path.abspath(worker.search_dir),
+        "recursive": worker.recursive,
+        "divine_exe_path": worker.divine_exe_path,
+        "delete": sorted(delete_uids.items()),
+        "handles": handle_table,
+        "files": sorted(files, key=lambda entry: entry["path"]),
+    }
+    Path(plan_path).parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_bytes(plan_path, json.dumps(plan, indent=1).encode("utf-8"))
+
+
+def load_replacement_plan(plan_path):
+    with open(plan_path, "r", encoding="utf-8") as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"{plan_path} is not a replacement plan this version can apply")
+    return plan
+
+
+class XMLWorker(Worker):
     """Worker thread for processing XML files."""
-    progress_update = pyqtSignal(str)
-    progress_percent = pyqtSignal(int)
-    finished_signal = pyqtSignal(dict)
-    error_signal = pyqtSignal(str)
     
-    def __init__(self, original_file, new_file, search_dir, recursive=True, backup=True, processes=None):
+    def __init__(self, original_file, new_file, search_dir, recursive=True, backup=True, processes=None,
+                 use_index=True, dry_run=False, plan_path=None, pipeline=False):
         super().__init__()
         self.original_file = original_file
         self.new_file = new_file
         self.search_dir = search_dir
         self.recursive = recursive
         self.backup = backup
-        self.running = True
-        # Set the number of processes for multiprocessing
-        self.processes = processes if processes is not None else multiprocessing.cpu_count()
+        # Pool size; None means one process per CPU (see pool_size)
+        self.processes = processes
+        # Only open files the persistent handle index lists for the affected handles
+        self.use_index = use_index
+        # A dry run writes nothing and saves the replacement plan to plan_path instead
+        self.dry_run = dry_run
+        self.plan_path = plan_path or default_plan_path(search_dir)
+        self.plan = None  # Set by from_plan(); run() then applies it without scanning
+        # Pipeline run: LSF files the built-in patcher cannot handle are converted to LSX, patched
+        # and converted back by the task that reads them (patch_lsf_through_lsx); None disables it
+        self.divine_exe_path = os.path.join(os.getcwd(), "Tools", "Divine.exe") if pipeline else None
         self.loglevel = 1  # Default log level for worker
+
+    @classmethod
+    def from_plan(cls, plan_path, backup=True, processes=None):
+        """Return a worker that applies a plan saved by a dry run."""
+        plan = load_replacement_plan(plan_path)
+        worker = cls(plan["original_file"], plan["new_file"], plan["search_dir"], plan["recursive"],
+                     backup, processes, plan_path=plan_path)
+        worker.plan = plan
+        worker.divine_exe_path = plan.get("divine_exe_path")
+        return worker
         
     def run(self):
+        # Originals of rewritten files are staged here and snapshotted once the run ends
+        self.backup_store = BackupStore(self.search_dir) if self.backup and not self.dry_run else None
+        self.staged_backups = {}
+        self.planned_files = []
+        metrics = self.begin_metrics()
         try:
-            # Read XML files
-            self.progress_update.emit("Reading original XML file...")
-            original_tree = ET.parse(self.original_file)
-            original_root = original_tree.getroot()
-            
-            self.progress_update.emit("Reading new XML file...")
-            new_tree = ET.parse(self.new_file)
-            new_root = new_tree.getroot()
-            
-            # Extract content nodes
-            self.progress_update.emit("Extracting content nodes from original XML...")
-            original_contents = {}
-            for elem in original_root.findall(".//content"):
-                if "contentuid" in elem.attrib:
-                    contentuid = elem.attrib["contentuid"]
-                    version = elem.attrib.get("version", "")
-                    original_contents[contentuid] = {
-                        "element": elem,
-                        "version": version,
-                        "text": elem.text
-                    }
-            
-            self.progress_update.emit(f"Found {len(original_contents)} content nodes in original XML.")
-            
-            self.progress_update.emit("Extracting content nodes from new XML...")
-            new_contents = {}
-            nodes_to_delete = []
-            replacements = {}
-            
-            for elem in new_root.findall(".//content"):
-                if "contentuid" in elem.attrib:
-                    contentuid = elem.attrib["contentuid"]
-                    version = elem.attrib.get("version", "")
-                    new_contents[contentuid] = {
-                        "element": elem,
-                        "version": version,
-                        "text": elem.text
-                    }
-                    
-                    # Check if this contentuid exists in original with different version
-                    if contentuid in original_contents:
-                        orig_version = original_contents[contentuid]["version"]
-                        orig_text = original_contents[contentuid]["text"]
-                        curr_text = elem.text
-                        # Only revert the version if the contents are the same
-                        if version != orig_version and orig_text == curr_text:
-                            self.progress_update.emit(f"Found match with different version but same content: {contentuid}")
-                            self.progress_update.emit(f"  Original version: {orig_version}, New version: {version}")
-                            nodes_to_delete.append(elem)
-                            replacements[contentuid] = contentuid  # Store original ID for replacement
-                        elif version != orig_version:
-                            self.progress_update.emit(f"Found match with different version and different content: {contentuid}")
-                            self.progress_update.emit(f"  Not reverting version as content is different")
-            
-            self.progress_update.emit(f"Found {len(new_contents)} content nodes in new XML.")
-            self.progress_update.emit(f"Identified {len(nodes_to_delete)} nodes to delete.")
-            self.progress_update.emit(f"IDs to replace: {list(replacements.keys())[:5]}..." if replacements else "No replacements needed.")
+            if self.divine_exe_path is not None:
+                if os.path.exists(self.divine_exe_path):
+                    self.progress_update.emit(f"Pipeline run: LSF files the built-in patcher cannot handle are "
+                                              f"converted through LSX with {self.divine_exe_path}")
+                else:
+                    self.progress_update.emit(f"Divine.exe not found at {self.divine_exe_path}; "
+                                              "LSF files the built-in patcher cannot handle will fail.")
+            if self.backup_store is not None:
+                self.backup_store.begin()
+
+            plan_files = None
+            if self.plan is not None:
+                with metrics.stage("plan_read"):
+                    handle_table, delete_uids, plan_files = self._read_plan()
+            else:
+                handle_table, delete_uids = self._diff_xml_files()
             
-            # Delete nodes from new XML
-            if nodes_to_delete:
-                self.progress_update.emit("Deleting nodes from new XML...")
-                for elem in nodes_to_delete:
-                    parent = elem.getparent() if hasattr(elem, 'getparent') else self._find_parent(new_root, elem)
-                    if parent is not None:
-                        parent.remove(elem)
-                
-                # Save modified new XML
-                if self.backup:
-                    backup_path = f"{self.new_file}.backup"
-                    self.progress_update.emit(f"Creating backup of new XML at {backup_path}")
-                    shutil.copy2(self.new_file, backup_path)
-                
-                self.progress_update.emit(f"Saving modified new XML to {self.new_file}")
-                new_tree.write(self.new_file, encoding="utf-8", xml_declaration=True)
+            # Delete nodes from new XML; after a cancel, nothing further is changed
+            deletion_time = 0.0
+            nodes_deleted = 0
+            if delete_uids and not self.dry_run and self.running:
+                deletion_time = self._rewrite_new_xml(delete_uids)
+                nodes_deleted = len(delete_uids)
             
             # Replace contentuid in all files
-            if replacements:
-                self.progress_update.emit("Replacing contentuid in files...")
-                self._replace_in_files(replacements, original_contents)
+            replaced = False
+            if handle_table and self.running:
+                self.progress_update.emit("Planning replacements..." if self.dry_run
+                                          else "Replacing contentuid in files...")
+                self._replace_in_files(handle_table, plan_files)
+                replaced = True
+
+            if self.dry_run and not self.running:
+                self.progress_update.emit("Analysis canceled; no plan saved.")
+            elif not self.running and not replaced:
+                # A cancel during the replacement is already reported with its file count
+                self.progress_update.emit("Operation canceled.")
+            elif self.dry_run:
+                with metrics.stage("plan_save"):
+                    new_file_sha1 = file_sha1(self.new_file)
+                    save_replacement_plan(self.plan_path, self, new_file_sha1, handle_table, delete_uids,
+                                          self.planned_files)
+                self.progress_update.emit(f"Plan for {len(self.planned_files)} files saved to {self.plan_path}")
             
+            with metrics.stage("backup_commit"):
+                snapshot_id = self._commit_backups()
             result = {
-                "nodes_deleted": len(nodes_to_delete),
-                "replacements": len(replacements),
-                "files_modified": self.files_modified if hasattr(self, "files_modified") else 0
+                "nodes_deleted": nodes_deleted,
+                "node_deletion_time": deletion_time,
+                "replacements": len(handle_table),
+                "files_modified": self.files_modified if hasattr(self, "files_modified") else 0,
+                "pattern_stats": getattr(self, "pattern_stats", {"compilations": 0, "cache_hits": 0}),
+                "backup_snapshot": snapshot_id,
+                "cancelled": not self.running
             }
-            self.finished_signal.emit(result)
+            if self.dry_run:
+                result.update(dry_run=True, nodes_to_delete=len(delete_uids),
+                              files_planned=len(self.planned_files), plan_path=str(self.plan_path))
+            operation = "analyze" if self.dry_run else ("apply" if self.plan is not None else "replace")
+            self.finished_signal.emit(self.finish_metrics(result, operation))
             
         except Exception as e:
+            # Whatever was rewritten before the failure still gets its snapshot
+            try:
+                self._commit_backups()
+            except Exception as backup_error:
+                self.progress_update.emit(f"Error saving backup snapshot: {backup_error}")
+            metrics.stop_profile()
             self.error_signal.emit(f"Error: {str(e)}")
+        except BaseException:
+            # Interrupted outright (e.g. a second Ctrl+C); still snapshot what was rewritten
+            try:
+                self._commit_backups()
+            except Exception as backup_error:
+                self.progress_update.emit(f"Error saving backup snapshot: {backup_error}")
+            metrics.stop_profile()
+            raise
+
+    def _diff_xml_files(self):
+        """Compare the two XML files.
+
+        Returns (handle_table, delete_uids): the {old_uid: (new_uid, version)}
+        replacements and {ordinal: contentuid} of the new XML's content nodes
+        to drop, by position in document order.
+        """
+        # Stream content nodes from the original XML, keeping only version and text hash
+        self.progress_update.emit("Reading original XML file...")
+        original_contents = {}
+        with self.metrics.stage("xml_parse"):
+            for contentuid, version, text in iter_content_entries(self.original_file):
+                original_contents[contentuid] = (version, hash_content_text(text))
+        
+        self.progress_update.emit(f"Found {len(original_contents)} content nodes in original XML.")
+        
+        self.progress_update.emit("Reading new XML file...")
+        new_content_count = 0
+        delete_uids = {}
+        replacements = {}
+        diff_start = time.perf_counter()
+        
+        for ordinal, (contentuid, version, text) in enumerate(iter_content_entries(self.new_file)):
+            new_content_count += 1
+            
+            # Check if this contentuid exists in original with different version
+            if contentuid in original_contents:
+                orig_version, orig_text_hash = original_contents[contentuid]
+                # Only revert the version if the contents are the same
+                if version != orig_version and orig_text_hash == hash_content_text(text):
+                    try:
+                        int(orig_version)
+                    except ValueError:
+                        # The handles would be rewritten with a version the resources cannot hold
+                        self.progress_update.emit(f"Skipping {contentuid}: original version {orig_version!r} "
+                                                  f"is not a number")
+                        continue
+                    self.progress_update.emit(f"Found match with different version but same content: {contentuid}")
+                    self.progress_update.emit(f"  Original version: {orig_version}, New version: {version}")
+                    delete_uids[ordinal] = contentuid
+                    replacements[contentuid] = contentuid  # Store original ID for replacement
+                elif version != orig_version:
+                    self.progress_update.emit(f"Found match with different version and different content: {contentuid}")
+                    self.progress_update.emit(f"  Not reverting version as content is different")
+        # Streaming the new file and comparing happen together, so both count as the diff
+        self.metrics.add_stage("diff", time.perf_counter() - diff_start)
+        
+        self.progress_update.emit(f"Found {new_content_count} content nodes in new XML.")
+        self.progress_update.emit(f"Identified {len(delete_uids)} nodes to delete.")
+        self.progress_update.emit(f"IDs to replace: {list(replacements.keys())[:5]}..." if replacements else "No replacements needed.")
+        return build_handle_table(replacements, original_contents), delete_uids
+
+    def _read_plan(self):
+        """Return (handle_table, delete_uids, files) from the loaded plan, checking it still applies."""
+        plan = self.plan
+        self.progress_update.emit(f"Applying plan {self.plan_path} from {plan['created']}")
+        if file_sha1(self.new_file) != plan["new_file_sha1"]:
+            raise ValueError(f"{self.new_file} has changed since the plan was made; analyze again")
+        files = []
+        for entry in plan["files"]:
+            path = Path(self.search_dir) / entry["path"]
+            try:
+                stat = path.stat()
+            except OSError:
+                self.progress_update.emit(f"Planned file is gone, skipping: {path}")
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (entry["size"], entry["mtime_ns"]):
+                self.progress_update.emit(f"Planned file changed since the analysis: {path}")
+            files.append(path)
+        self.progress_update.emit(f"Plan: {len(plan['delete'])} nodes to delete, "
+                                  f"{len(files)} files to update.")
+        handle_table = {old_uid: tuple(entry) for old_uid, entry in plan["handles"].items()}
+        return handle_table, {ordinal: uid for ordinal, uid in plan["delete"]}, files
+
+    def _rewrite_new_xml(self, delete_uids):
+        """Drop the content nodes at the given ordinals from the new XML; returns the time taken."""
+        self.progress_update.emit("Deleting nodes from new XML...")
+        deletion_start = time.perf_counter()
+        # The full tree is only loaded when there is something to delete and write back
+        with self.metrics.stage("xml_parse"):
+            new_tree = ET.parse(self.new_file)
+        with self.metrics.stage("node_deletion"):
+            new_root = new_tree.getroot()
+            content_nodes = (elem for elem in new_root.iter("content") if "contentuid" in elem.attrib)
+            self._delete_nodes(new_root, [elem for ordinal, elem in enumerate(content_nodes)
+                                          if ordinal in delete_uids])
+        deletion_time = time.perf_counter() - deletion_start
+        self.progress_update.emit(f"Deleted {len(delete_uids)} nodes in {deletion_time:.3f}s.")
+        
+        # Save modified new XML
+        if self.backup_store is not None:
+            self.progress_update.emit(f"Backing up new XML {self.new_file}")
+            self.staged_backups[self.new_file] = BackupStore.stage(self.backup_store.staging_dir,
+                                                                   self.new_file)
+        
+        self.progress_update.emit(f"Saving modified new XML to {self.new_file}")
+        with self.metrics.stage("tree_write"):
+            output = io.BytesIO()
+            new_tree.write(output, encoding="utf-8", xml_declaration=True)
+            atomic_write_bytes(self.new_file, output.getvalue())
+        return deletion_time
+
+    def _add_planned_file(self, result):
+        """Record a dry-run result in the plan, with the stat the apply run checks."""
+        path = Path(result["file_path"])
+        stat = path.stat()
+        self.planned_files.append({
+            "path": Path(os.path.relpath(path, self.search_dir)).as_posix(),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "changes": [{"handle": old_uid, "new_handle": new_uid, "pattern": label, "version": self.handle_table[old_uid][1]}
+                        for old_uid, new_uid, label in result["plan"]],
+        })
+
+    def _commit_backups(self):
+        """Move the staged originals into the backup store; returns the snapshot id or None."""
+        store = self.backup_store
+        if store is None or store.staging_dir is None:
+            return None
+        staged, self.staged_backups = self.staged_backups, {}
+        if not staged:
+            store.discard()
+            return None
+        snapshot_id, new_objects = store.commit(staged)
+        store.staging_dir = None
+        self.progress_update.emit(f"Backup snapshot {snapshot_id}: {len(staged)} files, "
+                                  f"{new_objects} new in the store ({store.root}).")
+        return snapshot_id
     
-    def _find_parent(self, root, elem):
-        """Find parent of an element in ElementTree."""
-        for parent in root.iter():
-            for child in list(parent):
-                if child == elem:
-                    return parent
-        return None
+    def _delete_nodes(self, root, nodes):
+        """Remove nodes from the tree using a parent map built in one pass.
+
+        Each affected parent is rewritten once with its surviving children, so
+        the cost is linear in the size of the tree rather than one tree walk
+        (and one list scan) per deleted node.
+        """
+        parent_map = {child: parent for parent in root.iter() for child in parent}
+        doomed = {}
+        for elem in nodes:
+            parent = parent_map.get(elem)
+            if parent is not None:
+                doomed.setdefault(parent, set()).add(elem)
+        for parent, children in doomed.items():
+            parent[:] = [child for child in parent if child not in children]
     
-    def _replace_in_files(self, replacements, original_contents):
-        """Replace contentuid in all files in search directory using multiprocessing (except english.xml)."""
+    def _replace_in_files(self, handle_table, plan_files=None):
+        """Replace contentuid in all files in search directory using multiprocessing (except english.xml).
+
+        plan_files, when given, are the files of an applied plan; the tree is then not scanned.
+        """
+        # Initialize counters
+        self.files_modified = 0
+        self.debug_info = []  # Store debug info for each file
+        self.pattern_stats = {"compilations": 0, "cache_hits": 0}
+        
+        # Build the pattern sources once; each worker loads them and the handle table in its
+        # initializer, so every task only needs to carry a file path
+        registry = PatternRegistry(handle_table)
+        self.handle_table = handle_table
+
+        if plan_files is not None:
+            if not plan_files:
+                self.progress_update.emit("No files to process.")
+                return True
+            return self._run_replacement_pool(registry, handle_table, plan_files, len(plan_files))
+
         search_path = Path(self.search_dir)
-        files_to_process = []
         
-        # Get list of files
+        # Walk the tree, pruning .git and the cache folder
         if self.recursive:
             self.progress_update.emit(f"Scanning directory recursively: {search_path}")
-            all_files = [f for f in search_path.rglob("*") if f.is_file()]
         else:
             self.progress_update.emit(f"Scanning directory: {search_path}")
-            all_files = [f for f in search_path.glob("*") if f.is_file()]
-        
-        # Filter out english.xml files and .git directory files
-        filtered_files = [f for f in all_files if f.name.lower() != "english.xml" and ".git" not in str(f)]
+        scanned_files = scan_files(search_path, recursive=self.recursive, exclude_dirs={".git", CACHE_DIR_NAME},
+                                   include=self.include_globs, exclude=self.exclude_globs)
         
+        # Filter out english.xml files and binaries the replacement never reads
+        candidate_files = (f for f in scanned_files
+                           if f.name.lower() != "english.xml" and f.suffix.lower() not in BINARY_EXTENSIONS
+                           and not f.name.endswith((ATOMIC_TEMP_SUFFIX, LEGACY_BACKUP_SUFFIX)))
+
+        if not self.use_index:
+            # Without the index, paths stream into the pool while the walk is still running
+            return self._run_replacement_pool(registry, handle_table,
+                                              timed_iter(candidate_files, self.metrics, "scan"), None)
+
+        with self.metrics.stage("scan"):
+            filtered_files = list(candidate_files)
         self.progress_update.emit(f"Found {len(filtered_files)} files to process (excluding english.xml files).")
+
+        if filtered_files:
+            with self.metrics.stage("index"):
+                index = HandleIndex(self.search_dir)
+                reindexed, unchanged, removed = index.update(filtered_files, pool_size(None, self.processes),
+                                                             self.open_pool)
+                index.save()
+            self.progress_update.emit(f"Handle index: {reindexed} files indexed, {unchanged} unchanged, "
+                                      f"{removed} removed.")
+            targets = index.files_for(handle_table, filtered_files)
+            if targets is None:
+                self.progress_update.emit("Some IDs are not in handle form; processing every file.")
+            else:
+                self.progress_update.emit(f"{len(targets)} of {len(filtered_files)} files reference the affected handles.")
+                filtered_files = targets
         
         if not filtered_files:
             self.progress_update.emit("No files to process.")
             return True
 
-        # Initialize counters
-        self.files_modified = 0
-        self.debug_info = []  # Store debug info for each file
-        
-        # Create a list of arguments for multiprocessing
-        args_list = [(file_path, replacements, original_contents, self.backup, self.loglevel) 
-                     for file_path in filtered_files]
-        
-        # Calculate optimal number of processes
-        total_files = len(filtered_files)
-        # Adjust process count to avoid creating too many processes for few files
-        num_processes = min(total_files, self.processes)
-        if num_processes <= 0 and total_files > 0:
-            num_processes = 1
+        return self._run_replacement_pool(registry, handle_table, filtered_files, len(filtered_files))
+
+    def _run_replacement_pool(self, registry, handle_table, files, total_files):
+        """Run the replacement over files in a process pool and aggregate the results.
+
+        total_files is None when files is a lazy scan; progress is then measured
+        against the files discovered so far.
+        """
+        discovered = [0]
+
+        def task_paths():
+            for file_path in files:
+                if not self.running:
+                    return  # Cancelled; also stops a scan that is still feeding the pool
+                discovered[0] += 1
+                yield str(file_path)
+
+        num_processes = pool_size(total_files, self.processes)
+        chunksize = plan_chunksize(total_files, num_processes)
+        if total_files is not None:
+            # Largest first: a big dialog picked up last would keep one process busy after the rest finish
+            files = order_by_size(files)
             
-        self.progress_update.emit(f"Starting file processing with {num_processes} worker processes.")
+        self.progress_update.emit(f"Starting file processing with {num_processes} worker processes "
+                                  f"({chunksize} files per dispatch).")
         
         processed_count = 0
+        backup_dir = str(self.backup_store.staging_dir) if self.backup_store is not None else None
+        pool_start = time.perf_counter()
+        # The handle table and settings travel in a state file each task names, so the pool
+        # does not have to be started for this run (see save_task_state)
+        state_path = save_task_state((registry, handle_table, backup_dir, self.loglevel, self.dry_run,
+                                      self.divine_exe_path))
         try:
-            with multiprocessing.Pool(processes=num_processes) as pool:
+            with self.open_pool(num_processes) as pool:
                 # Use imap_unordered for better performance with incremental results
-                results_iterator = pool.imap_unordered(process_single_file_for_xml_replacement, args_list)
+                tasks = ((state_path, file_path) for file_path in task_paths())
+                results_iterator = pool.imap_unordered(self.metrics.task(process_replacement_task),
+                                                       tasks, chunksize=chunksize)
                 
-                for i, result in enumerate(results_iterator):
-                    if not self.running:
-                        self.progress_update.emit("Operation canceled.")
-                        # This will not immediately stop running workers, but no new tasks will be started
-                        pool.terminate()
-                        break
+                # After a cancel the loop keeps going: the tasks not started yet come back
+                # at once as cancelled, and files in progress finish and are accounted for
+                for result in results_iterator:
+                    # Claim the staged backup first, even if the run is being cancelled; a
+                    # file whose rewrite failed is unchanged and has nothing to snapshot
+                    if result["backup"] and not result.get("error"):
+                        self.staged_backups[result["file_path"]] = result["backup"]
+                    if result.get("cancelled"):
+                        continue
                     
-                    processed_count = i + 1
-                    progress = int((processed_count / total_files) * 100)
+                    processed_count += 1
+                    progress = int((processed_count / (total_files or max(discovered[0], processed_count))) * 100)
                     self.progress_percent.emit(progress)
                     
                     # Process logs
                     for log_entry in result.get("logs", []):
                         self.progress_update.emit(log_entry)
+                    self.file_result.emit(result)
+                    self.metrics.add_file(result["file_path"], result.get("timings"))
                     
                     # Update stats
+                    if result["plan"]:
+                        self._add_planned_file(result)
                     if result["modified"]:
                         self.files_modified += 1
                         if self.files_modified <= 5:  # Show only first 5 for brevity
@@ -737,6 +2765,9 @@ class XMLWorker(QThread):
                         elif self.files_modified == 6:
                             self.progress_update.emit("More files modified...")
                     
+                    for key, value in result.get("pattern_stats", {}).items():
+                        self.pattern_stats[key] += value
+                    
                     # Store debug info if there are changes
                     if result["debug_info"]["changes"]:
                         self.debug_info.append(result["debug_info"])
@@ -748,15 +2779,30 @@ class XMLWorker(QThread):
             self.progress_update.emit(f"Error during multiprocessing: {str(e)}")
             self.error_signal.emit(f"Error during multiprocessing: {str(e)}")
             return False
+        finally:
+            os.remove(state_path)
+        self.metrics.add_stage("replace", time.perf_counter() - pool_start)
+        
+        if total_files is None:
+            total_files = discovered[0]
+            self.progress_update.emit(f"Processed {total_files} files (excluding english.xml files).")
         
         # Ensure progress bar reaches 100% if not cancelled
         if self.running and processed_count == total_files:
             self.progress_percent.emit(100)
         elif not self.running:
             # If cancelled, emit current progress
-            self.progress_percent.emit(int((processed_count / total_files) * 100))
+            self.progress_update.emit(f"Operation canceled after {processed_count} files.")
+            self.progress_percent.emit(int((processed_count / max(total_files, 1)) * 100))
         
-        self.progress_update.emit(f"Replacement complete. Modified {self.files_modified} files.")
+        if self.dry_run:
+            self.progress_update.emit(f"Analysis complete. {len(self.planned_files)} files would be modified.")
+        else:
+            self.progress_update.emit(f"Replacement complete. Modified {self.files_modified} files.")
+        self.progress_update.emit(
+            f"Pattern registry: {self.pattern_stats['compilations']} compilations, "
+            f"{self.pattern_stats['cache_hits']} cache hits."
+        )
         
         # Display debug info for the first few modified files
         if self.debug_info:
@@ -764,738 +2810,250 @@ class XMLWorker(QThread):
                 self.progress_update.emit(f"Debug info: {info}")
                 
         return True
-    
-    def _process_file(self, file_path, replacements, original_contents):
-        """Process a single file and return True if it was modified."""
-        # Skip .git directories and common binary files
-        str_path = str(file_path)
-        if ".git" in str_path:
-            return False
-            
-        file_extension = file_path.suffix.lower()
-        # Fast binary check - skip common binary extensions
-        if file_extension in ['.pak', '.lsf', '.bin', '.exe', '.dll', '.so', '.dylib', '.jpg', '.png', '.ttf', '.dat', '.db']:
-            return False
-            
-        # Check if this is an LSX or LSJ file for special handling
-        is_lsx_file = file_extension == '.lsx'
-        is_lsj_file = file_extension == '.lsj'
-        
-        # Add debug info about file type
-        if is_lsx_file:
-            self.progress_update.emit(f"Processing LSX file: {file_path}")
-        elif is_lsj_file:
-            self.progress_update.emit(f"Processing LSJ file: {file_path}")
-        else:
-            # Normal file processing without additional debug info
-            pass
-            
-        try:
-            # Try to read file as text
-            content = None
-            encoding_used = None
-            for encoding in ['utf-8', 'latin-1']:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        content = f.read()
-                    encoding_used = encoding
-                    break
-                except UnicodeDecodeError:
-                    continue
-                except Exception as e:
-                    self.progress_update.emit(f"Error reading {file_path} with {encoding}: {str(e)}")
-                    continue
-            
-            if content is None:
-                # Couldn't read file with any encoding
-                return False
-            
-            # Check if any replacement is needed
-            needs_update = False
-            matching_ids = []
-            for old_uid in replacements.keys():
-                if old_uid in content:
-                    needs_update = True
-                    matching_ids.append(old_uid)
-            
-            if not needs_update:
-                return False
-                
-            # Create backup if needed
-            if self.backup:
-                backup_path = f"{file_path}.backup"
-                shutil.copy2(file_path, backup_path)
-            
-            # Prepare debug info
-            debug_info = {"file": str(file_path), "matching_ids": matching_ids, "changes": []}
-            
-            # Make replacements
-            modified_content = content
-            for old_uid, new_uid in replacements.items():
-                if old_uid in content:
-                    # For specific file types, log additional debug info
-                    if is_lsx_file:
-                        self.progress_update.emit(f"Found ID '{old_uid}' in LSX file, will replace with '{new_uid}'")
-                    elif is_lsj_file:
-                        self.progress_update.emit(f"Found ID '{old_uid}' in LSJ file, will replace with '{new_uid}'")
-                    # Store original version from original XML
-                    original_version = original_contents[new_uid]["version"]
-                    
-                    # Apply common patterns for all file types
-                    # Pattern 1: contentuid="ID" version="VER"
-                    pattern1 = fr'contentuid="{re.escape(old_uid)}"\s*version="[^"]*"'
-                    replacement1 = f'contentuid="{new_uid}" version="{original_version}"'
-                    modified_content_1 = re.sub(pattern1, replacement1, modified_content)
-                    if modified_content_1 != modified_content:
-                        debug_info["changes"].append(f"Pattern 1 matched for {old_uid}")
-                    modified_content = modified_content_1
-                    
-                    # Pattern 2: contentuid="ID"
-                    pattern2 = fr'contentuid="{re.escape(old_uid)}"'
-                    replacement2 = f'contentuid="{new_uid}"'
-                    modified_content_2 = re.sub(pattern2, replacement2, modified_content)
-                    if modified_content_2 != modified_content:
-                        debug_info["changes"].append(f"Pattern 2 matched for {old_uid}")
-                    modified_content = modified_content_2
-                    
-                    # Pattern 3: ID LSX style
-                    pattern3 = fr'id="{re.escape(old_uid)}"'
-                    replacement3 = f'id="{new_uid}"'
-                    modified_content_3 = re.sub(pattern3, replacement3, modified_content)
-                    if modified_content_3 != modified_content:
-                        debug_info["changes"].append(f"Pattern 3 matched for {old_uid}")
-                    modified_content = modified_content_3
-                    
-                    # Apply file-specific patterns
-                    if is_lsx_file:
-                        # LSX-specific patterns
-                        # Pattern 5: LSX TagText TranslatedString handle format
-                        pattern5 = fr'<attribute id="TagText" type="TranslatedString" handle="{re.escape(old_uid)}" version="[^"]*" />'
-                        replacement5 = f'<attribute id="TagText" type="TranslatedString" handle="{new_uid}" version="{original_version}" />'
-                        modified_content_5 = re.sub(pattern5, replacement5, modified_content)
-                        if modified_content_5 != modified_content:
-                            debug_info["changes"].append(f"Pattern 5 matched for {old_uid} - LSX TranslatedString handle")
-                        modified_content = modified_content_5
-                        
-                        # Pattern 6: LSX TranslatedString handle format - alternate
-                        pattern6 = fr'<attribute id="TagText" type="TranslatedString" handle="{re.escape(old_uid)}" version="(\d+)"'
-                        replacement6 = f'<attribute id="TagText" type="TranslatedString" handle="{new_uid}" version="{original_version}"'
-                        modified_content_6 = re.sub(pattern6, replacement6, modified_content)
-                        if modified_content_6 != modified_content:
-                            debug_info["changes"].append(f"Pattern 6 matched for {old_uid} - LSX TranslatedString handle alternate")
-                        modified_content = modified_content_6
-                        
-                        # Pattern 9: Specific format from the example (.lsx)
-                        pattern9 = fr'<node id="TagText">\s+<attribute id="TagText" type="TranslatedString" handle="{re.escape(old_uid)}" version="[^"]*" />'
-                        replacement9 = f'<node id="TagText">\n\t\t\t\t\t\t\t\t\t\t\t<attribute id="TagText" type="TranslatedString" handle="{new_uid}" version="{original_version}" />'
-                        modified_content_9 = re.sub(pattern9, replacement9, modified_content)
-                        if modified_content_9 != modified_content:
-                            debug_info["changes"].append(f"Pattern 9 matched for {old_uid} - Specific LSX example format")
-                        modified_content = modified_content_9
-                    
-                    elif is_lsj_file:
-                        # LSJ-specific patterns
-                        # Pattern 7: LSJ TranslatedString handle format in JSON
-                        pattern7 = fr'"handle" : "{re.escape(old_uid)}",\s*"type" : "TranslatedString",\s*"version" : \d+'
-                        replacement7 = f'"handle" : "{new_uid}", "type" : "TranslatedString", "version" : {original_version}'
-                        modified_content_7 = re.sub(pattern7, replacement7, modified_content)
-                        if modified_content_7 != modified_content:
-                            debug_info["changes"].append(f"Pattern 7 matched for {old_uid} - LSJ TranslatedString handle")
-                        modified_content = modified_content_7
-                        
-                        # Pattern 8: LSJ TranslatedString handle format - alternate
-                        pattern8 = fr'"handle" : "{re.escape(old_uid)}"'
-                        replacement8 = f'"handle" : "{new_uid}"'
-                        modified_content_8 = re.sub(pattern8, replacement8, modified_content)
-                        if modified_content_8 != modified_content:
-                            debug_info["changes"].append(f"Pattern 8 matched for {old_uid} - LSJ handle only")
-                        modified_content = modified_content_8
-                        
-                        # Pattern 10: Specific format from the example (.lsj)
-                        pattern10 = fr'"TagText" : {{\s+"handle" : "{re.escape(old_uid)}",\s+"type" : "TranslatedString",\s+"version" : \d+\s+}}'
-                        replacement10 = f'"TagText" : {{\n                                                   "handle" : "{new_uid}",\n                                                   "type" : "TranslatedString",\n                                                   "version" : {original_version}\n                                                }}'
-                        modified_content_10 = re.sub(pattern10, replacement10, modified_content)
-                        if modified_content_10 != modified_content:
-                            debug_info["changes"].append(f"Pattern 10 matched for {old_uid} - Specific LSJ example format")
-                        modified_content = modified_content_10
-                    
-                    else:
-                        # For other file types, just check for quoted IDs
-                        pattern4 = fr'"{re.escape(old_uid)}"'
-                        replacement4 = f'"{new_uid}"'
-                        modified_content_4 = re.sub(pattern4, replacement4, modified_content)
-                        if modified_content_4 != modified_content:
-                            debug_info["changes"].append(f"Pattern 4 matched for {old_uid} - quoted ID in other file type")
-                        modified_content = modified_content_4
-            
-            # Store debug info if changes were made
-            if len(debug_info["changes"]) > 0:
-                self.debug_info.append(debug_info)
-            
-            # Only write if content changed
-            if modified_content != content:
-                with open(file_path, 'w', encoding=encoding_used) as f:
-                    f.write(modified_content)
-                return True
-            else:
-                return False
-            
-        except Exception as e:
-            self.progress_update.emit(f"Error in _process_file for {file_path}: {str(e)}")
-            return False
-    
-    def stop(self):
-        """Stop the worker thread."""
-        self.running = False
-
-
-class XMLContentManager(QMainWindow):
-    """Main application window."""
-    
-    # Keyring service name
-    KEYRING_SERVICE = "XMLContentManager"
-    
-    # Keyring keys
-    KEYRING_KEY = "saved_settings"
-    
-    def __init__(self):
-        super().__init__()
-        self.init_ui()
-        self.xml_worker = None
-        self.lsf_worker = None
-        self.lsx_worker = None # Added for LSX to LSF conversion
-        self.load_saved_settings()
-    
-    def init_ui(self):
-        """Initialize the user interface."""
-        self.setWindowTitle("XML Content Manager - Fixed Version")
-        self.setGeometry(100, 100, 800, 600)
-        
-        # Main widget and layout
-        main_widget = QWidget()
-        self.setCentralWidget(main_widget)
-        main_layout = QVBoxLayout(main_widget)
-        
-        # Input section
-        input_layout = QGridLayout()
-        
-        # Original XML file
-        input_layout.addWidget(QLabel("Original XML File:"), 0, 0)
-        self.original_file_edit = QLineEdit()
-        input_layout.addWidget(self.original_file_edit, 0, 1)
-        browse_original_btn = QPushButton("Browse...")
-        browse_original_btn.clicked.connect(self.browse_original_file)
-        input_layout.addWidget(browse_original_btn, 0, 2)
-        
-        # New XML file
-        input_layout.addWidget(QLabel("New XML File:"), 1, 0)
-        self.new_file_edit = QLineEdit()
-        input_layout.addWidget(self.new_file_edit, 1, 1)
-        browse_new_btn = QPushButton("Browse...")
-        browse_new_btn.clicked.connect(self.browse_new_file)
-        input_layout.addWidget(browse_new_btn, 1, 2)
-        
-        # Search directory
-        input_layout.addWidget(QLabel("Search Directory:"), 2, 0)
-        self.search_dir_edit = QLineEdit()
-        input_layout.addWidget(self.search_dir_edit, 2, 1)
-        browse_dir_btn = QPushButton("Browse...")
-        browse_dir_btn.clicked.connect(self.browse_search_dir)
-        input_layout.addWidget(browse_dir_btn, 2, 2)
-        
-        main_layout.addLayout(input_layout)
-        
-        # Options section
-        options_layout = QHBoxLayout()
-        
-        self.recursive_check = QCheckBox("Search Recursively")
-        self.recursive_check.setChecked(True)
-        self.recursive_check.setToolTip("Search in all subdirectories")
-        options_layout.addWidget(self.recursive_check)
-        
-        self.backup_check = QCheckBox("Create Backups")
-        self.backup_check.setChecked(True)
-        self.backup_check.setToolTip("Create backup files before modifying")
-        options_layout.addWidget(self.backup_check)
-        
-        main_layout.addLayout(options_layout)
-        
-        # Action buttons
-        buttons_layout = QHBoxLayout()
-        
-        # self.analyze_btn = QPushButton("Analyze Files") # Removed
-        # self.analyze_btn.clicked.connect(self.analyze_files) # Removed
-        # buttons_layout.addWidget(self.analyze_btn) # Removed
-        
-        self.process_btn = QPushButton("Process Files")
-        self.process_btn.clicked.connect(self.process_files)
-        buttons_layout.addWidget(self.process_btn)
-        
-        self.cancel_btn = QPushButton("Cancel")
-        self.cancel_btn.clicked.connect(self.cancel_operation)
-        self.cancel_btn.setEnabled(False)
-        buttons_layout.addWidget(self.cancel_btn)
-        
-        clear_log_btn = QPushButton("Clear Log")
-        clear_log_btn.clicked.connect(self.clear_log)
-        buttons_layout.addWidget(clear_log_btn)
-        
-        save_settings_btn = QPushButton("Save Settings")
-        save_settings_btn.clicked.connect(self.save_settings)
-        save_settings_btn.setToolTip("Save current settings to keyring")
-        buttons_layout.addWidget(save_settings_btn)
-
-        self.convert_lsf_btn = QPushButton("Convert LSF to LSX")
-        self.convert_lsf_btn.clicked.connect(self.run_lsf_conversion)
-        self.convert_lsf_btn.setToolTip("Convert all .lsf files to .lsx in the search directory (excluding meta.lsf)")
-        buttons_layout.addWidget(self.convert_lsf_btn)
-
-        self.convert_lsx_btn = QPushButton("Convert LSX to LSF")
-        self.convert_lsx_btn.clicked.connect(self.run_lsx_conversion)
-        self.convert_lsx_btn.setToolTip("Convert all .lsx files to .lsf in the search directory")
-        buttons_layout.addWidget(self.convert_lsx_btn)
-        
-        main_layout.addLayout(buttons_layout)
-        
-        # Progress bar
-        self.progress_bar = QProgressBar()
-        self.progress_bar.setRange(0, 100)
-        self.progress_bar.setValue(0)
-        main_layout.addWidget(self.progress_bar)
-        
-        # Log area
-        self.log_edit = QTextEdit()
-        self.log_edit.setReadOnly(True)
-        main_layout.addWidget(self.log_edit)
-        
-        # Status bar
-        self.status_bar = QStatusBar()
-        self.setStatusBar(self.status_bar)
-        self.status_bar.showMessage("Ready")
-        
-        # Show initial message
-        self.log("XML Content Manager (Fixed Version) started. Please select files to process.")
-        self.log("NOTE: This tool will search ALL files in the selected directory and its subdirectories.")
-        self.log("NOTE: Files named 'english.xml' will be automatically ignored during replacement.")
-        self.log("NOTE: Files in .git directories will be skipped.")
-        self.log("NOTE: This tool will process all file types, including XML, LSX, and any other text-based files.")
-        self.log("NOTE: This version includes better debugging to show what's being changed.")
-    
-    def browse_original_file(self):
-        """Open file dialog to select original XML file."""
-        file_path, _ = QFileDialog.getOpenFileName(
-            self, "Select Original XML File", "", "XML Files (*.xml);;LSX Files (*.lsx);;All Files (*)"
-        )
-        if file_path:
-            self.original_file_edit.setText(file_path)
-            self.save_settings()
-    
-    def browse_new_file(self):
-        """Open file dialog to select new XML file."""
-        file_path, _ = QFileDialog.getOpenFileName(
-            self, "Select New XML File", "", "XML Files (*.xml);;LSX Files (*.lsx);;All Files (*)"
-        )
-        if file_path:
-            self.new_file_edit.setText(file_path)
-            self.save_settings()
-    
-    def browse_search_dir(self):
-        """Open directory dialog to select search directory."""
-        dir_path = QFileDialog.getExistingDirectory(
-            self, "Select Search Directory", ""
-        )
-        if dir_path:
-            self.search_dir_edit.setText(dir_path)
-            self.save_settings()
-    
-    def save_settings(self):
-        """Save current settings to keyring."""
-        settings = {
-            "original_file": self.original_file_edit.text(),
-            "new_file": self.new_file_edit.text(),
-            "search_dir": self.search_dir_edit.text(),
-            "recursive": self.recursive_check.isChecked(),
-            "backup": self.backup_check.isChecked()
-        }
-        
-        try:
-            # Convert settings to JSON string
-            settings_json = json.dumps(settings)
-            # Save to keyring
-            keyring.set_password(self.KEYRING_SERVICE, self.KEYRING_KEY, settings_json)
-            self.log("Settings saved to keyring")
-        except Exception as e:
-            self.log(f"Error saving settings: {str(e)}")
-    
-    def load_saved_settings(self):
-        """Load settings from keyring."""
-        try:
-            # Get settings from keyring
-            settings_json = keyring.get_password(self.KEYRING_SERVICE, self.KEYRING_KEY)
-            
-            if settings_json:
-                # Parse JSON
-                settings = json.loads(settings_json)
-                
-                # Apply settings
-                if "original_file" in settings and os.path.exists(settings["original_file"]):
-                    self.original_file_edit.setText(settings["original_file"])
-                
-                if "new_file" in settings and os.path.exists(settings["new_file"]):
-                    self.new_file_edit.setText(settings["new_file"])
-                
-                if "search_dir" in settings and os.path.exists(settings["search_dir"]):
-                    self.search_dir_edit.setText(settings["search_dir"])
-                
-                if "recursive" in settings:
-                    self.recursive_check.setChecked(settings["recursive"])
-                
-                if "backup" in settings:
-                    self.backup_check.setChecked(settings["backup"])
-                
-                self.log("Settings loaded from keyring")
-            
-        except Exception as e:
-            self.log(f"Note: No saved settings found or error loading settings: {str(e)}")
-            # This is not a critical error, so just log it
-    
-    def log(self, message):
-        """Add message to log area."""
-        self.log_edit.append(message)
-        # Ensure the latest message is visible
-        cursor = self.log_edit.textCursor()
-        cursor.movePosition(cursor.MoveOperation.End)
-        self.log_edit.setTextCursor(cursor)
-    
-    def clear_log(self):
-        """Clear the log area."""
-        self.log_edit.clear()
-    
-    def validate_inputs(self):
-        """Validate user inputs."""
-        original_file = self.original_file_edit.text().strip()
-        new_file = self.new_file_edit.text().strip()
-        search_dir = self.search_dir_edit.text().strip()
-        
-        if not original_file:
-            QMessageBox.warning(self, "Input Error", "Original XML file is required.")
-            return False
-        
-        if not os.path.isfile(original_file):
-            QMessageBox.warning(self, "Input Error", f"Original XML file not found: {original_file}")
-            return False
-        
-        if not new_file:
-            QMessageBox.warning(self, "Input Error", "New XML file is required.")
-            return False
-        
-        if not os.path.isfile(new_file):
-            QMessageBox.warning(self, "Input Error", f"New XML file not found: {new_file}")
-            return False
-        
-        if not search_dir:
-            QMessageBox.warning(self, "Input Error", "Search directory is required.")
-            return False
-        
-        if not os.path.isdir(search_dir):
-            QMessageBox.warning(self, "Input Error", f"Search directory not found: {search_dir}")
-            return False
-        
-        return True
-    
-    # def analyze_files(self): # Removed
-    #     """Analyze files without making changes.""" # Removed
-    #     if not self.validate_inputs(): # Removed
-    #         return # Removed
-    #      # Removed
-    #     # Create worker thread for analysis only # Removed
-    #     self.start_worker(analysis_only=True) # Removed
-    
-    def process_files(self):
-        """Process files and make changes."""
-        if not self.validate_inputs():
-            return
-        
-        # Ask for confirmation
-        reply = QMessageBox.question(
-            self, "Confirm Operation",
-            "This will modify XML files. Do you want to continue?",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-            QMessageBox.StandardButton.No
-        )
-        
-        if reply == QMessageBox.StandardButton.Yes:
-            # Create worker thread for full processing
-            self.start_xml_worker() # Changed from self.start_worker(analysis_only=False)
-    
-    def start_xml_worker(self): # Renamed from start_worker, removed analysis_only
-        """Start the XML processing worker thread."""
-        # Disable UI elements
-        # self.analyze_btn.setEnabled(False) # Removed
-        self.process_btn.setEnabled(False)
-        self.convert_lsf_btn.setEnabled(False)
-        self.convert_lsx_btn.setEnabled(False)
-        self.cancel_btn.setEnabled(True)
-        
-        # Update status
-        self.status_bar.showMessage("Processing XML files...") # Simplified message
-        self.progress_bar.setValue(0)
-        
-        # Create and start worker
-        # Determine number of processes based on CPU count
-        processes = multiprocessing.cpu_count()
-        self.log(f"Using {processes} CPU cores for multiprocessing")
-        
-        self.xml_worker = XMLWorker(
-            self.original_file_edit.text(),
-            self.new_file_edit.text(),
-            self.search_dir_edit.text(),
-            self.recursive_check.isChecked(),
-            self.backup_check.isChecked(),
-            processes
-        )
-        
-        # Connect signals
-        self.xml_worker.progress_update.connect(self.log)
-        self.xml_worker.progress_percent.connect(self.progress_bar.setValue)
-        self.xml_worker.finished_signal.connect(self.process_finished)
-        self.xml_worker.error_signal.connect(self.handle_error)
-        
-        # Start worker
-        self.log("XML Processing started...") # Simplified message
-        self.xml_worker.start()
-
-    def run_lsf_conversion(self):
-        """Start the LSF to LSX conversion worker."""
-        search_dir = self.search_dir_edit.text().strip()
-        if not search_dir:
-            QMessageBox.warning(self, "Input Error", "Search directory is required for LSF conversion.")
-            return
-        if not os.path.isdir(search_dir):
-            QMessageBox.warning(self, "Input Error", f"Search directory not found: {search_dir}")
-            return
 
-        reply = QMessageBox.question(
-            self, "Confirm LSF Conversion",
-            "This will convert .lsf files to .lsx in the specified directory. Do you want to continue?",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-            QMessageBox.StandardButton.No
-        )
-        if reply != QMessageBox.StandardButton.Yes:
-            return
 
-        # self.analyze_btn.setEnabled(False) # Removed
-        self.process_btn.setEnabled(False)
-        self.convert_lsf_btn.setEnabled(False)
-        self.convert_lsx_btn.setEnabled(False)
-        self.cancel_btn.setEnabled(True)
-        self.status_bar.showMessage("Converting LSF to LSX...")
-        self.progress_bar.setValue(0)
-
-        self.lsf_worker = LsfConverterWorker(
-            search_dir,
-            self.recursive_check.isChecked()
-        )
-        self.lsf_worker.progress_update.connect(self.log)
-        self.lsf_worker.progress_percent.connect(self.progress_bar.setValue)
-        self.lsf_worker.finished_signal.connect(self.lsf_conversion_finished)
-        self.lsf_worker.error_signal.connect(self.handle_error) # Can reuse handle_error
-
-        self.log("LSF to LSX conversion started...")
-        self.lsf_worker.start()
-
-    def lsf_conversion_finished(self, result):
-        """Handle LSF conversion finished event."""
-        # self.analyze_btn.setEnabled(True) # Removed
-        self.process_btn.setEnabled(True)
-        self.convert_lsf_btn.setEnabled(True)
-        self.convert_lsx_btn.setEnabled(True)
-        self.cancel_btn.setEnabled(False)
-        self.status_bar.showMessage("Ready")
-        self.progress_bar.setValue(100)
-
-        self.log("\nLSF to LSX Conversion completed.")
-        self.log(f"Files scanned: {result['total_scanned']}")
-        self.log(f"Successfully converted: {result['converted_files']}")
-        self.log(f"Skipped (meta.lsf): {result['skipped_files']}")
-        if result['error_files']:
-            self.log(f"Files with errors ({len(result['error_files'])}):")
-            for f_path in result['error_files']:
-                self.log(f"  - {f_path}")
-        else:
-            self.log("No errors encountered during LSF conversion.")
-        
-        QMessageBox.information(
-            self, "LSF Conversion Completed",
-            f"LSF to LSX conversion finished.\n\n"
-            f"Files scanned: {result['total_scanned']}\n"
-            f"Converted: {result['converted_files']}\n"
-            f"Skipped: {result['skipped_files']}\n"
-            f"Errors: {len(result['error_files'])}"
-        )
 
-    def run_lsx_conversion(self):
-        """Start the LSX to LSF conversion worker."""
-        search_dir = self.search_dir_edit.text().strip()
-        if not search_dir:
-            QMessageBox.warning(self, "Input Error", "Search directory is required for LSX conversion.")
-            return
-        if not os.path.isdir(search_dir):
-            QMessageBox.warning(self, "Input Error", f"Search directory not found: {search_dir}")
-            return
-
-        reply = QMessageBox.question(
-            self, "Confirm LSX Conversion",
-            "This will convert .lsx files to .lsf in the specified directory. Do you want to continue?",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-            QMessageBox.StandardButton.No
-        )
-        if reply != QMessageBox.StandardButton.Yes:
-            return
-
-        # self.analyze_btn.setEnabled(False) # Removed
-        self.process_btn.setEnabled(False)
-        self.convert_lsf_btn.setEnabled(False)
-        self.convert_lsx_btn.setEnabled(False)
-        self.cancel_btn.setEnabled(True)
-        self.status_bar.showMessage("Converting LSX to LSF...")
-        self.progress_bar.setValue(0)
-
-        self.lsx_worker = LsxConverterWorker( # Use LsxConverterWorker
-            search_dir,
-            self.recursive_check.isChecked()
-        )
-        self.lsx_worker.progress_update.connect(self.log)
-        self.lsx_worker.progress_percent.connect(self.progress_bar.setValue)
-        self.lsx_worker.finished_signal.connect(self.lsx_conversion_finished) # New handler
-        self.lsx_worker.error_signal.connect(self.handle_error)
-
-        self.log("LSX to LSF conversion started...")
-        self.lsx_worker.start()
-
-    def lsx_conversion_finished(self, result):
-        """Handle LSX conversion finished event."""
-        # self.analyze_btn.setEnabled(True) # Removed
-        self.process_btn.setEnabled(True)
-        self.convert_lsf_btn.setEnabled(True)
-        self.convert_lsx_btn.setEnabled(True)
-        self.cancel_btn.setEnabled(False)
-        self.status_bar.showMessage("Ready")
-        self.progress_bar.setValue(100)
-
-        self.log("\nLSX to LSF Conversion completed.")
-        self.log(f"Files scanned: {result['total_scanned']}")
-        self.log(f"Successfully converted: {result['converted_files']}")
-        self.log(f"Skipped (meta.lsx): {result['skipped_files']}") # Display skipped meta.lsx
-        if result['error_files']:
-            self.log(f"Files with errors ({len(result['error_files'])}):")
-            for f_path in result['error_files']:
-                self.log(f"  - {f_path}")
-        else:
-            self.log("No errors encountered during LSX conversion.")
-        
-        QMessageBox.information(
-            self, "LSX Conversion Completed",
-            f"LSX to LSF conversion finished.\n\n"
-            f"Files scanned: {result['total_scanned']}\n"
-            f"Converted: {result['converted_files']}\n"
-            f"Skipped (meta.lsx): {result['skipped_files']}\n"
-            f"Errors: {len(result['error_files'])}"
-        )
-    
-    def cancel_operation(self):
-        """Cancel the current operation."""
-        worker_to_cancel = None
-        operation_name = "Unknown operation"
-        if self.xml_worker and self.xml_worker.isRunning():
-            worker_to_cancel = self.xml_worker
-            operation_name = "XML processing"
-        elif self.lsf_worker and self.lsf_worker.isRunning():
-            worker_to_cancel = self.lsf_worker
-            operation_name = "LSF to LSX conversion"
-        elif self.lsx_worker and self.lsx_worker.isRunning(): # Added check for lsx_worker
-            worker_to_cancel = self.lsx_worker
-            operation_name = "LSX to LSF conversion"
-        else:
-            self.log("No operation currently running to cancel.")
-            return
-
-        if worker_to_cancel:
-            reply = QMessageBox.question(
-                self, "Confirm Cancellation",
-                f"Do you want to cancel the current {operation_name} operation?",
-                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-                QMessageBox.StandardButton.No
-            )
-            
-            if reply == QMessageBox.StandardButton.Yes:
-                self.log(f"Cancelling {operation_name}...")
-                worker_to_cancel.stop()
-    
-    def process_finished(self, result):
-        """Handle process finished event."""
-        # Re-enable UI elements
-        # self.analyze_btn.setEnabled(True) # Removed
-        self.process_btn.setEnabled(True)
-        self.convert_lsf_btn.setEnabled(True) # Ensure this is re-enabled
-        self.convert_lsx_btn.setEnabled(True) # Ensure this is re-enabled
-        self.cancel_btn.setEnabled(False)
-        
-        # Update status
-        self.status_bar.showMessage("Ready")
-        
-        # Log results
-        self.log("\nOperation completed successfully.")
-        self.log(f"Nodes deleted: {result['nodes_deleted']}")
-        self.log(f"ContentUID replacements: {result['replacements']}")
-        self.log(f"Files modified: {result['files_modified']}")
-        
-        # Save settings after successful operation
-        self.save_settings()
-        
-        # Show result dialog
-        QMessageBox.information(
-            self, "Operation Completed",
-            f"Operation completed successfully.\n\n"
-            f"Nodes deleted: {result['nodes_deleted']}\n"
-            f"ContentUID replacements: {result['replacements']}\n"
-            f"Files modified: {result['files_modified']}"
-        )
-    
-    def handle_error(self, error_message):
-        """Handle error from worker thread."""
-        # Re-enable UI elements
-        # self.analyze_btn.setEnabled(True) # Removed
-        self.process_btn.setEnabled(True)
-        self.convert_lsf_btn.setEnabled(True) # Ensure this is re-enabled
-        self.convert_lsx_btn.setEnabled(True) # Ensure this is re-enabled
-        self.cancel_btn.setEnabled(False)
-        
-        # Update status
-        self.status_bar.showMessage("Error")
-        
-        # Log error
-        self.log(f"ERROR: {error_message}")
-        
-        # Show error dialog
-        QMessageBox.critical(self, "Error", error_message)
-
-
-def main():
+# Exit codes for the command-line interface
+EXIT_OK = 0
+EXIT_FILE_ERRORS = 1  # The run finished, but some files failed
+EXIT_USAGE = 2  # Bad arguments (argparse uses 2 as well)
+EXIT_FAILED = 3  # The run aborted with an error
+EXIT_CANCELLED = 130  # Interrupted (Ctrl+C)
+
+
+def write_ndjson(record, stream=None):
+    """Write one JSON record per line and flush, so consumers see results as they happen."""
+    stream = stream if stream is not None else sys.stdout
+    stream.write(json.dumps(record, default=str) + "\n")
+    stream.flush()
+
+
+def cli_file_record(result):
+    """Turn a worker's per-file result dict into a flat NDJSON record."""
+    if "file_path" in result:  # Replacement result
+        status = "error" if result["error"] else ("modified" if result["modified"] else "unchanged")
+        if result.get("plan"):
+            status = "planned"
+        record = {"event": "file", "path": result["file_path"], "status": status,
+                  "matching_ids": result["debug_info"]["matching_ids"],
+                  "changes": result["debug_info"]["changes"]}
+        if result["error"]:
+            record["error"] = result["error"]
+    else:  # Conversion result
+        record = {"event": "file", "path": result["path"], "status": result["status"]}
+        if "details" in result:
+            record["error"] = result["details"]
+    return record
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="fix_translations",
+        description="Revert needless localization version bumps and convert LSF/LSX resources. "
+                    "Run without arguments to open the GUI. Per-file results are written to "
+                    "stdout as NDJSON, followed by a summary record.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--no-recursive", dest="recursive", action="store_false",
+                        help="Only look at the top level of the search directory")
+    common.add_argument("--include", action="append", metavar="GLOB",
+                        help="Only process files whose name or relative path matches GLOB (repeatable)")
+    common.add_argument("--exclude", action="append", metavar="GLOB",
+                        help="Skip files and directories whose name or relative path matches GLOB (repeatable)")
+    common.add_argument("-v", "--verbose", action="store_true", help="Write log messages to stderr")
+
+    timing = argparse.ArgumentParser(add_help=False)
+    timing.add_argument("--report", metavar="PATH",
+                        help="Where to write the JSON timing report (default: .fix_translations/reports/ "
+                             "in the search directory)")
+    timing.add_argument("--profile", action="store_true",
+                        help="Profile the run and its worker processes with cProfile; the merged stats "
+                             "are saved next to the report")
+
+    for command, help_text in (
+            ("replace", "Diff two english.xml files, drop unchanged re-versioned entries and fix their handles"),
+            ("pipeline", "Like replace, but LSF files the built-in patcher cannot handle are converted to LSX, "
+                         "patched and converted back with Divine.exe in the same pass")):
+        replace = subparsers.add_parser(command, parents=[common, timing], help=help_text)
+        replace.add_argument("original_file", help="Original localization XML")
+        replace.add_argument("new_file", help="New localization XML (modified in place)")
+        replace.add_argument("search_dir", help="Directory whose files reference the handles")
+        replace.add_argument("--no-backup", dest="backup", action="store_false",
+                             help="Do not snapshot the modified files into the backup store")
+        replace.add_argument("--processes", type=int, default=None, help="Worker processes (default: one per CPU)")
+        replace.add_argument("--no-index", dest="use_index", action="store_false",
+                             help="Scan every file instead of using the handle index")
+        replace.add_argument("--dry-run", action="store_true",
+                             help="Change nothing; save the replacement plan for a later 'apply'")
+        replace.add_argument("--plan", metavar="PATH",
+                             help="Where --dry-run saves the plan (default: .fix_translations/replacement_plan.json "
+                                  "in the search directory)")
+        if command == "pipeline":
+            replace.add_argument("--divine",
+                                 help="Path to Divine.exe (default: Tools/Divine.exe in the working directory)")
+
+    apply = subparsers.add_parser("apply", parents=[timing],
+                                  help="Carry out a plan saved by 'replace --dry-run' without rescanning")
+    apply.add_argument("plan", help="Plan file written by 'replace --dry-run'")
+    apply.add_argument("--no-backup", dest="backup", action="store_false",
+                       help="Do not snapshot the modified files into the backup store")
+    apply.add_argument("--processes", type=int, default=None, help="Worker processes (default: one per CPU)")
+    apply.add_argument("-v", "--verbose", action="store_true", help="Write log messages to stderr")
+
+    for command, help_text in (("lsf-to-lsx", "Convert .lsf files to .lsx"),
+                               ("lsx-to-lsf", "Convert .lsx files to .lsf")):
+        convert = subparsers.add_parser(command, parents=[common, timing], help=help_text)
+        convert.add_argument("search_dir", help="Directory to convert")
+        convert.add_argument("--divine", help="Path to Divine.exe (default: Tools/Divine.exe in the working directory)")
+        convert.add_argument("--no-batch", dest="batch_mode", action="store_false",
+                             help="Launch Divine.exe once per file instead of once per worker")
+        convert.add_argument("--no-cache", dest="use_cache", action="store_false",
+                             help="Ignore the conversion cache")
+        convert.add_argument("--no-native", dest="native", action="store_false",
+                             help="Always use Divine.exe instead of the built-in converter")
+        convert.add_argument("--processes", type=int, default=None,
+                             help=f"Worker processes (default: one per CPU; with --no-native at most "
+                                  f"{SUBPROCESS_PROCESS_CAP})")
+
+    restore = subparsers.add_parser("restore", help="Put back the files saved by a replacement's backup snapshot")
+    restore.add_argument("search_dir", help="Directory the replacement ran on")
+    restore.add_argument("--snapshot", metavar="ID", help="Snapshot to restore (default: the latest)")
+    restore.add_argument("--list", action="store_true", help="List the snapshots instead of restoring one")
+    return parser
+
+
+def run_restore(args):
+    """Restore (or list) backup snapshots and return the exit code."""
+    store = BackupStore(args.search_dir)
+    if args.list:
+        failed = False
+        for snapshot_id in store.snapshots():
+            try:
+                _, manifest = store.load(snapshot_id)
+            except (OSError, ValueError) as e:
+                # One unreadable manifest should not hide the other snapshots
+                write_ndjson({"event": "error", "id": snapshot_id, "message": str(e)})
+                failed = True
+                continue
+            write_ndjson({"event": "snapshot", "id": snapshot_id, "created": manifest.get("created"),
+                          "files": len(manifest["files"])})
+        return EXIT_FILE_ERRORS if failed else EXIT_OK
+    try:
+        snapshot_id, _ = store.load(args.snapshot)
+    except (OSError, ValueError) as e:
+        write_ndjson({"event": "error", "message": str(e)})
+        return EXIT_FAILED
+    counts = {"restored": 0, "unchanged": 0, "error": 0}
+    for path, status in store.restore(snapshot_id):
+        record = {"event": "file", "path": path, "status": status}
+        if status not in counts:
+            record.update(status="error", error=status)
+        counts[record["status"]] += 1
+        write_ndjson(record)
+    write_ndjson({"event": "summary", "command": "restore", "snapshot": snapshot_id, **counts})
+    return EXIT_FILE_ERRORS if counts["error"] else EXIT_OK
+
+
+def run_cli(argv):
+    """Run one subcommand headlessly and return the process exit code."""
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.command == "apply":
+        try:
+            worker = XMLWorker.from_plan(args.plan, args.backup, args.processes)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot read plan {args.plan}: {e}")
+        return run_worker_cli(args, worker)
+    if not os.path.isdir(args.search_dir):
+        parser.error(f"search directory not found: {args.search_dir}")
+    if args.command == "restore":
+        return run_restore(args)
+
+    if args.command in ("replace", "pipeline"):
+        for path in (args.original_file, args.new_file):
+            if not os.path.isfile(path):
+                parser.error(f"file not found: {path}")
+        worker = XMLWorker(args.original_file, args.new_file, args.search_dir,
+                           args.recursive, args.backup, args.processes, args.use_index,
+                           args.dry_run, args.plan, pipeline=args.command == "pipeline")
+        if args.command == "pipeline" and args.divine:
+            worker.divine_exe_path = os.path.abspath(args.divine)
+    else:
+        worker_class = LsfConverterWorker if args.command == "lsf-to-lsx" else LsxConverterWorker
+        worker = worker_class(args.search_dir, args.recursive, args.batch_mode, args.use_cache, args.native,
+                              args.processes)
+        if args.divine:
+            worker.divine_exe_path = os.path.abspath(args.divine)
+
+    worker.include_globs = args.include
+    worker.exclude_globs = args.exclude
+    return run_worker_cli(args, worker)
+
+
+def run_worker_cli(args, worker):
+    """Run a worker, streaming its per-file results as NDJSON; returns the exit code."""
+    outcome = {"summary": None, "error": None, "file_errors": 0}
+    worker.profile = args.profile
+    worker.report_path = args.report
+
+    def on_file_result(result):
+        record = cli_file_record(result)
+        if record["status"] == "error":
+            outcome["file_errors"] += 1
+        write_ndjson(record)
+
+    def on_error(message):
+        outcome["error"] = message
+        write_ndjson({"event": "error", "message": message})
+
+    worker.file_result.connect(on_file_result)
+    worker.error_signal.connect(on_error)
+    worker.finished_signal.connect(lambda result: outcome.__setitem__("summary", result))
+    if args.verbose:
+        worker.progress_update.connect(lambda message: print(message, file=sys.stderr, flush=True))
+
+    # Ctrl+C cancels cooperatively, so the run winds down and reports (and a replacement
+    # snapshots) what it did; a second Ctrl+C interrupts at once
+    interrupted = []
+
+    def on_interrupt(signum, frame):
+        interrupted.append(signum)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        worker.stop()
+
+    previous_handler = signal.signal(signal.SIGINT, on_interrupt)
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        write_ndjson({"event": "cancelled"})
+        return EXIT_CANCELLED
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+
+    if outcome["summary"] is not None:
+        write_ndjson({"event": "summary", "command": args.command, **outcome["summary"]})
+    if interrupted:
+        write_ndjson({"event": "cancelled"})
+        return EXIT_CANCELLED
+    if outcome["error"] is not None:
+        return EXIT_FAILED
+    return EXIT_FILE_ERRORS if outcome["file_errors"] else EXIT_OK
+
+
+def main(argv=None):
     # On Windows, protect the entry point to avoid recursive spawning with multiprocessing
     if sys.platform == 'win32':
         multiprocessing.freeze_support()
-        
-    app = QApplication(sys.argv)
-    
-    # Set the application name (used by keyring)
-    app.setApplicationName("XMLContentManager")
-    app.setOrganizationName("XMLTools")
-    
-    window = XMLContentManager()
-    window.show()
-    sys.exit(app.exec())
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        sys.exit(run_cli(argv))
+
+    # PyQt6 and keyring are only imported when the GUI is actually wanted
+    from fix_translations_gui import run_gui
+    sys.exit(run_gui())
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
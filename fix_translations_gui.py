@@ -0,0 +1,853 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""PyQt6 front end for fix_translations; started by fix_translations.main() when run without arguments."""
+
+import sys
+import os
+import json
+import time
+import multiprocessing
+import keyring
+from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+                           QLabel, QLineEdit, QPushButton, QPlainTextEdit, QFileDialog,
+                           QProgressBar, QMessageBox, QCheckBox, QGridLayout, QStatusBar, QSpinBox)
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
+
+from fix_translations import (XMLWorker, LsfConverterWorker, LsxConverterWorker, RestoreWorker, BackupStore,
+                              LogSink, CACHE_DIR_NAME, default_plan_path)
+from worker_pool import WarmPool
+
+
+class WorkerThread(QThread):
+    """Runs a fix_translations worker in a QThread and re-emits its signals as Qt signals."""
+    progress_update = pyqtSignal(str)
+    progress_percent = pyqtSignal(int)
+    finished_signal = pyqtSignal(dict)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, worker, log_sink=None):
+        super().__init__()
+        self.worker = worker
+        # Emitted from the worker thread; Qt queues them to the GUI thread. Log lines go
+        # to log_sink instead when given, so the GUI picks them up in batches
+        if log_sink is not None:
+            worker.progress_update.connect(log_sink.write)
+        else:
+            worker.progress_update.connect(self.progress_update.emit)
+        worker.progress_percent.connect(self.progress_percent.emit)
+        worker.finished_signal.connect(self.finished_signal.emit)
+        worker.error_signal.connect(self.error_signal.emit)
+
+    def run(self):
+        self.worker.run()
+
+    def stop(self):
+        """Stop the worker thread."""
+        self.worker.stop()
+
+
+class XMLContentManager(QMainWindow):
+    """Main application window."""
+    
+    # Keyring service name
+    KEYRING_SERVICE = "XMLContentManager"
+    
+    # Keyring keys
+    KEYRING_KEY = "saved_settings"
+
+    # Lines kept in the log view; the log file under the search directory has everything
+    LOG_MAX_BLOCKS = 5000
+    LOG_FLUSH_INTERVAL_MS = 100
+    
+    def __init__(self):
+        super().__init__()
+        self.log_sink = LogSink(self.LOG_MAX_BLOCKS)
+        # Processes shared by every operation; started by the first one that needs them
+        self.worker_pool = WarmPool()
+        self.init_ui()
+        self.xml_worker = None
+        self.lsf_worker = None
+        self.lsx_worker = None # Added for LSX to LSF conversion
+        self.restore_worker = None
+        self.load_saved_settings()
+    
+    def init_ui(self):
+        """Initialize the user interface."""
+        self.setWindowTitle("XML Content Manager - Fixed Version")
+        self.setGeometry(100, 100, 800, 600)
+        
+        # Main widget and layout
+        main_widget = QWidget()
+        self.setCentralWidget(main_widget)
+        main_layout = QVBoxLayout(main_widget)
+        
+        # Input section
+        input_layout = QGridLayout()
+        
+        # Original XML file
+        input_layout.addWidget(QLabel("Original XML File:"), 0, 0)
+        self.original_file_edit = QLineEdit()
+        input_layout.addWidget(self.original_file_edit, 0, 1)
+        browse_original_btn = QPushButton("Browse...")
+        browse_original_btn.clicked.connect(self.browse_original_file)
+        input_layout.addWidget(browse_original_btn, 0, 2)
+        
+        # New XML file
+        input_layout.addWidget(QLabel("New XML File:"), 1, 0)
+        self.new_file_edit = QLineEdit()
+        input_layout.addWidget(self.new_file_edit, 1, 1)
+        browse_new_btn = QPushButton("Browse...")
+        browse_new_btn.clicked.connect(self.browse_new_file)
+        input_layout.addWidget(browse_new_btn, 1, 2)
+        
+        # Search directory
+        input_layout.addWidget(QLabel("Search Directory:"), 2, 0)
+        self.search_dir_edit = QLineEdit()
+        input_layout.addWidget(self.search_dir_edit, 2, 1)
+        browse_dir_btn = QPushButton("Browse...")
+        browse_dir_btn.clicked.connect(self.browse_search_dir)
+        input_layout.addWidget(browse_dir_btn, 2, 2)
+        
+        main_layout.addLayout(input_layout)
+        
+        # Options section
+        options_layout = QHBoxLayout()
+        
+        self.recursive_check = QCheckBox("Search Recursively")
+        self.recursive_check.setChecked(True)
+        self.recursive_check.setToolTip("Search in all subdirectories")
+        options_layout.addWidget(self.recursive_check)
+        
+        self.backup_check = QCheckBox("Create Backups")
+        self.backup_check.setChecked(True)
+        self.backup_check.setToolTip("Snapshot modified files into the backup store (.fix_translations/backups)")
+        options_layout.addWidget(self.backup_check)
+        
+        self.profile_check = QCheckBox("Profile Workers")
+        self.profile_check.setChecked(False)
+        self.profile_check.setToolTip("Capture a cProfile of the run and its worker processes, saved next to "
+                                      "the timing report (.fix_translations/reports)")
+        options_layout.addWidget(self.profile_check)
+        
+        options_layout.addWidget(QLabel("Processes:"))
+        self.processes_spin = QSpinBox()
+        self.processes_spin.setRange(0, 4 * multiprocessing.cpu_count())
+        self.processes_spin.setSpecialValueText("Auto")  # 0: one per CPU, fewer for Divine.exe conversions
+        self.processes_spin.setValue(0)
+        self.processes_spin.setToolTip("Worker processes to run in parallel; Auto uses one per CPU "
+                                       "(and at most a few when converting with Divine.exe)")
+        options_layout.addWidget(self.processes_spin)
+        
+        main_layout.addLayout(options_layout)
+        
+        # Action buttons
+        buttons_layout = QHBoxLayout()
+        
+        self.analyze_btn = QPushButton("Analyze Files")
+        self.analyze_btn.clicked.connect(self.analyze_files)
+        self.analyze_btn.setToolTip("Work out every change without writing anything and save the plan")
+        buttons_layout.addWidget(self.analyze_btn)
+        
+        self.process_btn = QPushButton("Process Files")
+        self.process_btn.clicked.connect(self.process_files)
+        buttons_layout.addWidget(self.process_btn)
+
+        self.pipeline_btn = QPushButton("Process with LSF Pipeline")
+        self.pipeline_btn.clicked.connect(self.process_files_pipeline)
+        self.pipeline_btn.setToolTip("Process Files in one pass; LSF files the built-in patcher cannot handle are "
+                                     "converted to LSX, fixed and converted back with Divine.exe as they are reached")
+        buttons_layout.addWidget(self.pipeline_btn)
+
+        self.apply_plan_btn = QPushButton("Apply Plan")
+        self.apply_plan_btn.clicked.connect(self.apply_plan)
+        self.apply_plan_btn.setToolTip("Carry out the plan saved by Analyze Files without rescanning")
+        buttons_layout.addWidget(self.apply_plan_btn)
+        
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.cancel_operation)
+        self.cancel_btn.setEnabled(False)
+        buttons_layout.addWidget(self.cancel_btn)
+        
+        clear_log_btn = QPushButton("Clear Log")
+        clear_log_btn.clicked.connect(self.clear_log)
+        buttons_layout.addWidget(clear_log_btn)
+        
+        save_settings_btn = QPushButton("Save Settings")
+        save_settings_btn.clicked.connect(self.save_settings)
+        save_settings_btn.setToolTip("Save current settings to keyring")
+        buttons_layout.addWidget(save_settings_btn)
+
+        self.convert_lsf_btn = QPushButton("Convert LSF to LSX")
+        self.convert_lsf_btn.clicked.connect(self.run_lsf_conversion)
+        self.convert_lsf_btn.setToolTip("Convert all .lsf files to .lsx in the search directory (excluding meta.lsf)")
+        buttons_layout.addWidget(self.convert_lsf_btn)
+
+        self.convert_lsx_btn = QPushButton("Convert LSX to LSF")
+        self.convert_lsx_btn.clicked.connect(self.run_lsx_conversion)
+        self.convert_lsx_btn.setToolTip("Convert all .lsx files to .lsf in the search directory")
+        buttons_layout.addWidget(self.convert_lsx_btn)
+
+        self.restore_btn = QPushButton("Restore Backup")
+        self.restore_btn.clicked.connect(self.restore_backup)
+        self.restore_btn.setToolTip("Put back the files saved by the latest backup snapshot of the search directory")
+        buttons_layout.addWidget(self.restore_btn)
+        
+        main_layout.addLayout(buttons_layout)
+        
+        # Progress bar
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        main_layout.addWidget(self.progress_bar)
+        
+        # Log area; filled in batches by flush_log, never per message
+        self.log_edit = QPlainTextEdit()
+        self.log_edit.setReadOnly(True)
+        self.log_edit.setMaximumBlockCount(self.LOG_MAX_BLOCKS)
+        main_layout.addWidget(self.log_edit)
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start(self.LOG_FLUSH_INTERVAL_MS)
+        
+        # Status bar
+        self.status_bar = QStatusBar()
+        self.setStatusBar(self.status_bar)
+        self.status_bar.showMessage("Ready")
+        
+        # Show initial message
+        self.log("XML Content Manager (Fixed Version) started. Please select files to process.")
+        self.log("NOTE: This tool will search ALL files in the selected directory and its subdirectories.")
+        self.log("NOTE: Files named 'english.xml' will be automatically ignored during replacement.")
+        self.log("NOTE: Files in .git directories will be skipped.")
+        self.log("NOTE: This tool will process all file types, including XML, LSX, and any other text-based files.")
+        self.log("NOTE: This version includes better debugging to show what's being changed.")
+    
+    def browse_original_file(self):
+        """Open file dialog to select original XML file."""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Select Original XML File", "", "XML Files (*.xml);;LSX Files (*.lsx);;All Files (*)"
+        )
+        if file_path:
+            self.original_file_edit.setText(file_path)
+            self.save_settings()
+    
+    def browse_new_file(self):
+        """Open file dialog to select new XML file."""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Select New XML File", "", "XML Files (*.xml);;LSX Files (*.lsx);;All Files (*)"
+        )
+        if file_path:
+            self.new_file_edit.setText(file_path)
+            self.save_settings()
+    
+    def browse_search_dir(self):
+        """Open directory dialog to select search directory."""
+        dir_path = QFileDialog.getExistingDirectory(
+            self, "Select Search Directory", ""
+        )
+        if dir_path:
+            self.search_dir_edit.setText(dir_path)
+            self.save_settings()
+    
+    def save_settings(self):
+        """Save current settings to keyring."""
+        settings = {
+            "original_file": self.original_file_edit.text(),
+            "new_file": self.new_file_edit.text(),
+            "search_dir": self.search_dir_edit.text(),
+            "recursive": self.recursive_check.isChecked(),
+            "backup": self.backup_check.isChecked(),
+            "profile": self.profile_check.isChecked(),
+            "processes": self.processes_spin.value()
+        }
+        
+        try:
+            # Convert settings to JSON string
+            settings_json = json.dumps(settings)
+            # Save to keyring
+            keyring.set_password(self.KEYRING_SERVICE, self.KEYRING_KEY, settings_json)
+            self.log("Settings saved to keyring")
+        except Exception as e:
+            self.log(f"Error saving settings: {str(e)}")
+    
+    def load_saved_settings(self):
+        """Load settings from keyring."""
+        try:
+            # Get settings from keyring
+            settings_json = keyring.get_password(self.KEYRING_SERVICE, self.KEYRING_KEY)
+            
+            if settings_json:
+                # Parse JSON
+                settings = json.loads(settings_json)
+                
+                # Apply settings
+                if "original_file" in settings and os.path.exists(settings["original_file"]):
+                    self.original_file_edit.setText(settings["original_file"])
+                
+                if "new_file" in settings and os.path.exists(settings["new_file"]):
+                    self.new_file_edit.setText(settings["new_file"])
+                
+                if "search_dir" in settings and os.path.exists(settings["search_dir"]):
+                    self.search_dir_edit.setText(settings["search_dir"])
+                
+                if "recursive" in settings:
+                    self.recursive_check.setChecked(settings["recursive"])
+                
+                if "backup" in settings:
+                    self.backup_check.setChecked(settings["backup"])
+                
+                if "profile" in settings:
+                    self.profile_check.setChecked(settings["profile"])
+                
+                if "processes" in settings:
+                    self.processes_spin.setValue(settings["processes"])
+                
+                self.log("Settings loaded from keyring")
+            
+        except Exception as e:
+            self.log(f"Note: No saved settings found or error loading settings: {str(e)}")
+            # This is not a critical error, so just log it
+    
+    def log(self, message):
+        """Add message to log area (shown on the next flush)."""
+        self.log_sink.write(message)
+
+    def flush_log(self):
+        """Append everything logged since the last flush as one block."""
+        lines, dropped = self.log_sink.drain()
+        if dropped:
+            where = f"; see {self.log_sink.log_path}" if self.log_sink.log_path else ""
+            self.log_edit.appendPlainText(f"... {dropped} lines not shown{where}")
+        if lines:
+            self.log_edit.appendPlainText("\n".join(lines))
+
+    def open_run_log(self, search_dir, operation):
+        """Start a log file for one run in the search directory's cache folder."""
+        log_path = os.path.join(search_dir, CACHE_DIR_NAME, "logs",
+                                f"{time.strftime('%Y%m%d-%H%M%S')}-{operation}.log")
+        try:
+            self.log_sink.open_file(log_path)
+            self.log(f"Full log: {log_path}")
+        except OSError as e:
+            self.log(f"Could not open log file {log_path}: {e}")
+    
+    def clear_log(self):
+        """Clear the log area."""
+        self.log_edit.clear()
+    
+    def validate_inputs(self):
+        """Validate user inputs."""
+        original_file = self.original_file_edit.text().strip()
+        new_file = self.new_file_edit.text().strip()
+        search_dir = self.search_dir_edit.text().strip()
+        
+        if not original_file:
+            QMessageBox.warning(self, "Input Error", "Original XML file is required.")
+            return False
+        
+        if not os.path.isfile(original_file):
+            QMessageBox.warning(self, "Input Error", f"Original XML file not found: {original_file}")
+            return False
+        
+        if not new_file:
+            QMessageBox.warning(self, "Input Error", "New XML file is required.")
+            return False
+        
+        if not os.path.isfile(new_file):
+            QMessageBox.warning(self, "Input Error", f"New XML file not found: {new_file}")
+            return False
+        
+        if not search_dir:
+            QMessageBox.warning(self, "Input Error", "Search directory is required.")
+            return False
+        
+        if not os.path.isdir(search_dir):
+            QMessageBox.warning(self, "Input Error", f"Search directory not found: {search_dir}")
+            return False
+        
+        return True
+    
+    def analyze_files(self):
+        """Analyze files without making changes and save the replacement plan."""
+        if not self.validate_inputs():
+            return
+        
+        # Create worker thread for analysis only
+        self.start_xml_worker(dry_run=True)
+
+    def apply_plan(self):
+        """Apply the plan saved by the last analysis of the search directory."""
+        search_dir = self.search_dir_edit.text().strip()
+        plan_path = default_plan_path(search_dir)
+        if not search_dir or not plan_path.is_file():
+            QMessageBox.warning(self, "Input Error", f"No saved plan found at {plan_path}. Run Analyze Files first.")
+            return
+
+        reply = QMessageBox.question(
+            self, "Confirm Operation",
+            f"This will apply the plan {plan_path} and modify files. Do you want to continue?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self.start_xml_worker(plan_path=plan_path)
+    
+    def process_files(self):
+        """Process files and make changes."""
+        if not self.validate_inputs():
+            return
+        
+        # Ask for confirmation
+        reply = QMessageBox.question(
+            self, "Confirm Operation",
+            "This will modify XML files. Do you want to continue?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        
+        if reply == QMessageBox.StandardButton.Yes:
+            # Create worker thread for full processing
+            self.start_xml_worker() # Changed from self.start_worker(analysis_only=False)
+
+    def process_files_pipeline(self):
+        """Process files in one pass, converting LSF files the built-in patcher cannot handle on the way."""
+        if not self.validate_inputs():
+            return
+
+        reply = QMessageBox.question(
+            self, "Confirm Operation",
+            "This will modify XML, LSX and LSF files in one pass, using Divine.exe for LSF files "
+            "the built-in patcher cannot handle. Do you want to continue?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self.start_xml_worker(pipeline=True)
+    
+    def start_xml_worker(self, dry_run=False, plan_path=None, pipeline=False):
+        """Start the XML processing worker thread.
+
+        dry_run only saves a plan; plan_path applies a saved plan instead of scanning;
+        pipeline converts LSF files the built-in patcher cannot handle through LSX.
+        """
+        # Disable UI elements
+        self.analyze_btn.setEnabled(False)
+        self.apply_plan_btn.setEnabled(False)
+        self.process_btn.setEnabled(False)
+        self.pipeline_btn.setEnabled(False)
+        self.convert_lsf_btn.setEnabled(False)
+        self.convert_lsx_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        
+        # Update status
+        self.status_bar.showMessage("Processing XML files...") # Simplified message
+        self.progress_bar.setValue(0)
+        
+        # Create and start worker; None lets the worker size its pool from the CPU count
+        processes = self.processes_spin.value() or None
+        
+        operation = "analyze" if dry_run else ("apply" if plan_path else ("pipeline" if pipeline else "replace"))
+        self.open_run_log(self.search_dir_edit.text(), operation)
+        try:
+            if plan_path:
+                worker = XMLWorker.from_plan(plan_path, self.backup_check.isChecked(), processes)
+            else:
+                worker = XMLWorker(
+                    self.original_file_edit.text(),
+                    self.new_file_edit.text(),
+                    self.search_dir_edit.text(),
+                    self.recursive_check.isChecked(),
+                    self.backup_check.isChecked(),
+                    processes,
+                    dry_run=dry_run,
+                    pipeline=pipeline
+                )
+        except (OSError, ValueError) as e:
+            self.handle_error(f"Cannot read plan {plan_path}: {e}")
+            return
+        worker.profile = self.profile_check.isChecked()
+        worker.pool = self.worker_pool
+        self.xml_worker = WorkerThread(worker, self.log_sink)
+        
+        # Connect signals
+        self.xml_worker.progress_percent.connect(self.progress_bar.setValue)
+        self.xml_worker.finished_signal.connect(self.process_finished)
+        self.xml_worker.error_signal.connect(self.handle_error)
+        
+        # Start worker
+        self.log("XML Processing started...") # Simplified message
+        self.xml_worker.start()
+
+    def run_lsf_conversion(self):
+        """Start the LSF to LSX conversion worker."""
+        search_dir = self.search_dir_edit.text().strip()
+        if not search_dir:
+            QMessageBox.warning(self, "Input Error", "Search directory is required for LSF conversion.")
+            return
+        if not os.path.isdir(search_dir):
+            QMessageBox.warning(self, "Input Error", f"Search directory not found: {search_dir}")
+            return
+
+        reply = QMessageBox.question(
+            self, "Confirm LSF Conversion",
+            "This will convert .lsf files to .lsx in the specified directory. Do you want to continue?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+
+        self.analyze_btn.setEnabled(False)
+        self.apply_plan_btn.setEnabled(False)
+        self.process_btn.setEnabled(False)
+        self.pipeline_btn.setEnabled(False)
+        self.convert_lsf_btn.setEnabled(False)
+        self.convert_lsx_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.status_bar.showMessage("Converting LSF to LSX...")
+        self.progress_bar.setValue(0)
+
+        self.open_run_log(search_dir, "lsf-to-lsx")
+        worker = LsfConverterWorker(
+            search_dir,
+            self.recursive_check.isChecked(),
+            processes=self.processes_spin.value() or None
+        )
+        worker.profile = self.profile_check.isChecked()
+        worker.pool = self.worker_pool
+        self.lsf_worker = WorkerThread(worker, self.log_sink)
+        self.lsf_worker.progress_percent.connect(self.progress_bar.setValue)
+        self.lsf_worker.finished_signal.connect(self.lsf_conversion_finished)
+        self.lsf_worker.error_signal.connect(self.handle_error) # Can reuse handle_error
+
+        self.log("LSF to LSX conversion started...")
+        self.lsf_worker.start()
+
+    def lsf_conversion_finished(self, result):
+        """Handle LSF conversion finished event."""
+        self.analyze_btn.setEnabled(True)
+        self.apply_plan_btn.setEnabled(True)
+        self.process_btn.setEnabled(True)
+        self.pipeline_btn.setEnabled(True)
+        self.convert_lsf_btn.setEnabled(True)
+        self.convert_lsx_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.status_bar.showMessage("Ready")
+        self.progress_bar.setValue(100)
+
+        self.log("\nLSF to LSX Conversion completed.")
+        self.log(f"Files scanned: {result['total_scanned']}")
+        self.log(f"Successfully converted: {result['converted_files']}")
+        self.log(f"Skipped (meta.lsf): {result['skipped_files']}")
+        self.log(f"Up to date (from conversion cache): {result.get('cached_files', 0)}")
+        if result.get("cancelled_files"):
+            self.log(f"Not converted (canceled): {result['cancelled_files']}")
+        if result['error_files']:
+            self.log(f"Files with errors ({len(result['error_files'])}):")
+            for f_path in result['error_files']:
+                self.log(f"  - {f_path}")
+        else:
+            self.log("No errors encountered during LSF conversion.")
+        self.log_sink.close_file()
+        
+        QMessageBox.information(
+            self, "LSF Conversion Completed",
+            f"LSF to LSX conversion finished.\n\n"
+            f"Files scanned: {result['total_scanned']}\n"
+            f"Converted: {result['converted_files']}\n"
+            f"Cached: {result.get('cached_files', 0)}\n"
+            f"Skipped: {result['skipped_files']}\n"
+            f"Errors: {len(result['error_files'])}"
+        )
+
+    def run_lsx_conversion(self):
+        """Start the LSX to LSF conversion worker."""
+        search_dir = self.search_dir_edit.text().strip()
+        if not search_dir:
+            QMessageBox.warning(self, "Input Error", "Search directory is required for LSX conversion.")
+            return
+        if not os.path.isdir(search_dir):
+            QMessageBox.warning(self, "Input Error", f"Search directory not found: {search_dir}")
+            return
+
+        reply = QMessageBox.question(
+            self, "Confirm LSX Conversion",
+            "This will convert .lsx files to .lsf in the specified directory. Do you want to continue?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+
+        self.analyze_btn.setEnabled(False)
+        self.apply_plan_btn.setEnabled(False)
+        self.process_btn.setEnabled(False)
+        self.pipeline_btn.setEnabled(False)
+        self.convert_lsf_btn.setEnabled(False)
+        self.convert_lsx_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.status_bar.showMessage("Converting LSX to LSF...")
+        self.progress_bar.setValue(0)
+
+        self.open_run_log(search_dir, "lsx-to-lsf")
+        worker = LsxConverterWorker( # Use LsxConverterWorker
+            search_dir,
+            self.recursive_check.isChecked(),
+            processes=self.processes_spin.value() or None
+        )
+        worker.profile = self.profile_check.isChecked()
+        worker.pool = self.worker_pool
+        self.lsx_worker = WorkerThread(worker, self.log_sink)
+        self.lsx_worker.progress_percent.connect(self.progress_bar.setValue)
+        self.lsx_worker.finished_signal.connect(self.lsx_conversion_finished) # New handler
+        self.lsx_worker.error_signal.connect(self.handle_error)
+
+        self.log("LSX to LSF conversion started...")
+        self.lsx_worker.start()
+
+    def lsx_conversion_finished(self, result):
+        """Handle LSX conversion finished event."""
+        self.analyze_btn.setEnabled(True)
+        self.apply_plan_btn.setEnabled(True)
+        self.process_btn.setEnabled(True)
+        self.pipeline_btn.setEnabled(True)
+        self.convert_lsf_btn.setEnabled(True)
+        self.convert_lsx_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.status_bar.showMessage("Ready")
+        self.progress_bar.setValue(100)
+
+        self.log("\nLSX to LSF Conversion completed.")
+        self.log(f"Files scanned: {result['total_scanned']}")
+        self.log(f"Successfully converted: {result['converted_files']}")
+        self.log(f"Skipped (meta.lsx): {result['skipped_files']}") # Display skipped meta.lsx
+        self.log(f"Up to date (from conversion cache): {result.get('cached_files', 0)}")
+        if result.get("cancelled_files"):
+            self.log(f"Not converted (canceled): {result['cancelled_files']}")
+        if result['error_files']:
+            self.log(f"Files with errors ({len(result['error_files'])}):")
+            for f_path in result['error_files']:
+                self.log(f"  - {f_path}")
+        else:
+            self.log("No errors encountered during LSX conversion.")
+        self.log_sink.close_file()
+        
+        QMessageBox.information(
+            self, "LSX Conversion Completed",
+            f"LSX to LSF conversion finished.\n\n"
+            f"Files scanned: {result['total_scanned']}\n"
+            f"Converted: {result['converted_files']}\n"
+            f"Cached: {result.get('cached_files', 0)}\n"
+            f"Skipped (meta.lsx): {result['skipped_files']}\n"
+            f"Errors: {len(result['error_files'])}"
+        )
+    
+    def restore_backup(self):
+        """Restore the files of the latest backup snapshot in the search directory."""
+        search_dir = self.search_dir_edit.text().strip()
+        if not search_dir or not os.path.isdir(search_dir):
+            QMessageBox.warning(self, "Input Error", f"Search directory not found: {search_dir}")
+            return
+
+        store = BackupStore(search_dir)
+        snapshot_ids = store.snapshots()
+        if not snapshot_ids:
+            QMessageBox.information(self, "Restore Backup", "No backup snapshots found for this directory.")
+            return
+        try:
+            snapshot_id, manifest = store.load(snapshot_ids[-1])
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Restore Backup", f"Cannot read backup snapshot {snapshot_ids[-1]}: {e}")
+            return
+        reply = QMessageBox.question(
+            self, "Confirm Restore",
+            f"Restore {len(manifest['files'])} files from snapshot {snapshot_id} "
+            f"({manifest.get('created')})? Newer changes to them will be overwritten.",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+
+        self.analyze_btn.setEnabled(False)
+        self.apply_plan_btn.setEnabled(False)
+        self.process_btn.setEnabled(False)
+        self.pipeline_btn.setEnabled(False)
+        self.convert_lsf_btn.setEnabled(False)
+        self.convert_lsx_btn.setEnabled(False)
+        self.restore_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.status_bar.showMessage("Restoring backup...")
+        self.progress_bar.setValue(0)
+
+        self.open_run_log(search_dir, "restore")
+        self.restore_worker = WorkerThread(RestoreWorker(search_dir, snapshot_id), self.log_sink)
+        self.restore_worker.progress_percent.connect(self.progress_bar.setValue)
+        self.restore_worker.finished_signal.connect(self.restore_finished)
+        self.restore_worker.error_signal.connect(self.handle_error)
+
+        self.log(f"Restoring snapshot {snapshot_id}...")
+        self.restore_worker.start()
+
+    def restore_finished(self, result):
+        """Handle restore finished event."""
+        self.analyze_btn.setEnabled(True)
+        self.apply_plan_btn.setEnabled(True)
+        self.process_btn.setEnabled(True)
+        self.pipeline_btn.setEnabled(True)
+        self.convert_lsf_btn.setEnabled(True)
+        self.convert_lsx_btn.setEnabled(True)
+        self.restore_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.status_bar.showMessage("Canceled" if result["cancelled"] else "Ready")
+        self.progress_bar.setValue(100)
+
+        self.log(f"Snapshot {result['snapshot']}: {result['restored']} files restored, "
+                 f"{result['unchanged']} already up to date, {result['errors']} errors.")
+        if result["cancelled"]:
+            self.log("Restore canceled; run it again to put back the remaining files.")
+        self.log_sink.close_file()
+        QMessageBox.information(self, "Restore Backup",
+                                f"Restored {result['restored']} files from snapshot {result['snapshot']}.\n"
+                                f"Errors: {result['errors']}")
+    
+    def closeEvent(self, event):
+        """Stop the shared worker processes along with the window."""
+        self.worker_pool.terminate()
+        super().closeEvent(event)
+    
+    def cancel_operation(self):
+        """Cancel the current operation."""
+        worker_to_cancel = None
+        operation_name = "Unknown operation"
+        if self.xml_worker and self.xml_worker.isRunning():
+            worker_to_cancel = self.xml_worker
+            operation_name = "XML processing"
+        elif self.lsf_worker and self.lsf_worker.isRunning():
+            worker_to_cancel = self.lsf_worker
+            operation_name = "LSF to LSX conversion"
+        elif self.lsx_worker and self.lsx_worker.isRunning(): # Added check for lsx_worker
+            worker_to_cancel = self.lsx_worker
+            operation_name = "LSX to LSF conversion"
+        elif self.restore_worker and self.restore_worker.isRunning():
+            worker_to_cancel = self.restore_worker
+            operation_name = "backup restore"
+        else:
+            self.log("No operation currently running to cancel.")
+            return
+
+        if worker_to_cancel:
+            reply = QMessageBox.question(
+                self, "Confirm Cancellation",
+                f"Do you want to cancel the current {operation_name} operation?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.No
+            )
+            
+            if reply == QMessageBox.StandardButton.Yes:
+                self.log(f"Cancelling {operation_name}...")
+                worker_to_cancel.stop()
+    
+    def process_finished(self, result):
+        """Handle process finished event."""
+        # Re-enable UI elements
+        self.analyze_btn.setEnabled(True)
+        self.apply_plan_btn.setEnabled(True)
+        self.process_btn.setEnabled(True)
+        self.pipeline_btn.setEnabled(True)
+        self.convert_lsf_btn.setEnabled(True) # Ensure this is re-enabled
+        self.convert_lsx_btn.setEnabled(True) # Ensure this is re-enabled
+        self.cancel_btn.setEnabled(False)
+        
+        # Update status
+        self.status_bar.showMessage("Ready")
+        
+        if result.get("cancelled"):
+            self.status_bar.showMessage("Canceled")
+            self.log(f"\nOperation canceled. Files modified before the cancel: {result['files_modified']}")
+            if result.get("backup_snapshot"):
+                self.log(f"Backup snapshot: {result['backup_snapshot']} (Restore Backup undoes the partial run)")
+            self.log_sink.close_file()
+            return
+        
+        if result.get("dry_run"):
+            self.analysis_finished(result)
+            return
+        
+        # Log results
+        self.log("\nOperation completed successfully.")
+        self.log(f"Nodes deleted: {result['nodes_deleted']}")
+        if "node_deletion_time" in result:
+            self.log(f"Node deletion time: {result['node_deletion_time']:.3f}s")
+        self.log(f"ContentUID replacements: {result['replacements']}")
+        self.log(f"Files modified: {result['files_modified']}")
+        if "pattern_stats" in result:
+            self.log(f"Pattern compilations: {result['pattern_stats']['compilations']}, "
+                     f"cache hits: {result['pattern_stats']['cache_hits']}")
+        if result.get("backup_snapshot"):
+            self.log(f"Backup snapshot: {result['backup_snapshot']}")
+        self.log_sink.close_file()
+        
+        # Save settings after successful operation
+        self.save_settings()
+        
+        # Show result dialog
+        QMessageBox.information(
+            self, "Operation Completed",
+            f"Operation completed successfully.\n\n"
+            f"Nodes deleted: {result['nodes_deleted']}\n"
+            f"ContentUID replacements: {result['replacements']}\n"
+            f"Files modified: {result['files_modified']}"
+        )
+    
+    def analysis_finished(self, result):
+        """Report a finished dry run (the UI has already been re-enabled)."""
+        self.log("\nAnalysis completed; no files were changed.")
+        self.log(f"Nodes to delete: {result['nodes_to_delete']}")
+        self.log(f"ContentUID replacements: {result['replacements']}")
+        self.log(f"Files to modify: {result['files_planned']}")
+        self.log(f"Plan saved to {result['plan_path']}; use Apply Plan to carry it out.")
+        self.log_sink.close_file()
+        
+        QMessageBox.information(
+            self, "Analysis Completed",
+            f"Analysis completed. No files were changed.\n\n"
+            f"Nodes to delete: {result['nodes_to_delete']}\n"
+            f"ContentUID replacements: {result['replacements']}\n"
+            f"Files to modify: {result['files_planned']}"
+        )
+    
+    def handle_error(self, error_message):
+        """Handle error from worker thread."""
+        # Re-enable UI elements
+        self.analyze_btn.setEnabled(True)
+        self.apply_plan_btn.setEnabled(True)
+        self.process_btn.setEnabled(True)
+        self.pipeline_btn.setEnabled(True)
+        self.convert_lsf_btn.setEnabled(True) # Ensure this is re-enabled
+        self.convert_lsx_btn.setEnabled(True) # Ensure this is re-enabled
+        self.restore_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        
+        # Update status
+        self.status_bar.showMessage("Error")
+        
+        # Log error
+        self.log(f"ERROR: {error_message}")
+        self.log_sink.close_file()
+        
+        # Show error dialog
+        QMessageBox.critical(self, "Error", error_message)
+
+
+def run_gui():
+    """Start the application and return its exit code."""
+    app = QApplication(sys.argv)
+    
+    # Set the application name (used by keyring)
+    app.setApplicationName("XMLContentManager")
+    app.setOrganizationName("XMLTools")
+    
+    window = XMLContentManager()
+    window.show()
+    return app.exec()
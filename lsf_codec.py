@@ -0,0 +1,1031 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Pure-Python reader/writer for Larian LSF (LSOF) resources and their LSX form.
+
+Covers what this mod ships (Story/DialogsBinary and Public/**/Flags): the
+LSOF header, the name hash table, node/attribute/key tables and the value
+blob, with uncompressed, zlib or LZ4 sections (zstd needs the optional
+``zstandard`` package). Anything outside that raises LSFError so callers can
+fall back to Divine.exe.
+"""
+
+import os
+import bisect
+import struct
+import zlib
+import base64
+import xml.etree.ElementTree as ET
+
+try:
+    import lz4.block as _lz4_block
+    import lz4.frame as _lz4_frame
+except ImportError:  # Optional speed-up; a pure-Python decoder is used otherwise
+    _lz4_block = None
+    _lz4_frame = None
+
+try:
+    import zstandard as _zstandard
+except ImportError:
+    _zstandard = None
+
+
+# Bump when the bytes this module writes change, so cached conversions are redone
+CODEC_VERSION = 1
+
+
+class LSFError(Exception):
+    """Raised for resources this codec cannot read or write."""
+
+
+LSF_MAGIC = b"LSOF"
+LSF_VERSION_BG3 = 4  # TranslatedStrings carry a version instead of a value
+LSF_VERSION_EXTENDED_HEADER = 5  # 64-bit engine version
+LSF_VERSION_ADDITIONAL_BLOB = 6  # Metadata grows the keys section sizes
+LSF_VERSION_NODE_KEYS = 7  # Keys section is present
+LSF_MAX_VERSION = 7
+
+METADATA_FORMAT_NONE = 0
+METADATA_FORMAT_KEYS_AND_ADJACENCY = 1
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZ4 = 2
+COMPRESSION_ZSTD = 3
+
+HASH_TABLE_SIZE = 0x200
+
+# Attribute type ids and their LSX (v4) names
+DT_NONE, DT_BYTE, DT_SHORT, DT_USHORT, DT_INT, DT_UINT, DT_FLOAT, DT_DOUBLE = range(8)
+DT_IVEC2, DT_IVEC3, DT_IVEC4, DT_VEC2, DT_VEC3, DT_VEC4 = range(8, 14)
+DT_MAT2, DT_MAT3, DT_MAT3X4, DT_MAT4X3, DT_MAT4 = range(14, 19)
+DT_BOOL, DT_STRING, DT_PATH, DT_FIXEDSTRING, DT_LSSTRING, DT_ULONGLONG = range(19, 25)
+DT_SCRATCHBUFFER, DT_LONG, DT_INT8, DT_TRANSLATEDSTRING, DT_WSTRING, DT_LSWSTRING = range(25, 31)
+DT_UUID, DT_INT64, DT_TRANSLATEDFSSTRING = range(31, 34)
+
+TYPE_NAMES = [
+    "None", "uint8", "int16", "uint16", "int32", "uint32", "float", "double",
+    "ivec2", "ivec3", "ivec4", "fvec2", "fvec3", "fvec4",
+    "mat2x2", "mat3x3", "mat3x4", "mat4x3", "mat4x4",
+    "bool", "string", "path", "FixedString", "LSString", "uint64",
+    "ScratchBuffer", "old_int64", "int8", "TranslatedString", "WString", "LSWString",
+    "guid", "int64", "TranslatedFSString",
+]
+TYPE_IDS = {name: type_id for type_id, name in enumerate(TYPE_NAMES)}
+
+# Fixed-size scalar and vector types: struct format per component and component count
+_NUMERIC_FORMATS = {
+    DT_BYTE: ("B", 1), DT_SHORT: ("h", 1), DT_USHORT: ("H", 1), DT_INT: ("i", 1),
+    DT_UINT: ("I", 1), DT_FLOAT: ("f", 1), DT_DOUBLE: ("d", 1),
+    DT_IVEC2: ("i", 2), DT_IVEC3: ("i", 3), DT_IVEC4: ("i", 4),
+    DT_VEC2: ("f", 2), DT_VEC3: ("f", 3), DT_VEC4: ("f", 4),
+    DT_MAT2: ("f", 4), DT_MAT3: ("f", 9), DT_MAT3X4: ("f", 12), DT_MAT4X3: ("f", 12), DT_MAT4: ("f", 16),
+    DT_ULONGLONG: ("Q", 1), DT_LONG: ("q", 1), DT_INT8: ("b", 1), DT_INT64: ("q", 1),
+}
+_STRING_TYPES = {DT_STRING, DT_PATH, DT_FIXEDSTRING, DT_LSSTRING, DT_WSTRING, DT_LSWSTRING}
+
+
+class TranslatedString:
+    """A localization reference: a handle plus either a version (BG3) or an inline value."""
+
+    __slots__ = ("handle", "version", "value")
+
+    def __init__(self, handle, version=0, value=None):
+        self.handle = handle
+        self.version = version
+        self.value = value
+
+    def __eq__(self, other):
+        return (isinstance(other, TranslatedString) and
+                (self.handle, self.version, self.value) == (other.handle, other.version, other.value))
+
+    def __repr__(self):
+        return f"TranslatedString({self.handle!r}, version={self.version})"
+
+
+class TranslatedFSString(TranslatedString):
+    """A TranslatedString with (key, TranslatedFSString, value) format arguments."""
+
+    __slots__ = ("arguments",)
+
+    def __init__(self, handle, version=0, value=None, arguments=None):
+        super().__init__(handle, version, value)
+        self.arguments = arguments if arguments is not None else []
+
+
+class Node:
+    """One resource node: ordered attributes {name: (type_id, value)} and child nodes."""
+
+    __slots__ = ("name", "attributes", "children", "key")
+
+    def __init__(self, name, key=None):
+        self.name = name
+        self.attributes = {}
+        self.children = []
+        self.key = key
+
+    def grouped_children(self):
+        """Children grouped by name in order of first appearance, the order LSLib writes them in."""
+        groups = {}
+        for child in self.children:
+            groups.setdefault(child.name, []).append(child)
+        for group in groups.values():
+            yield from group
+
+
+class Resource:
+    """A decoded resource: its regions plus the header fields needed to write it back."""
+
+    def __init__(self, regions=None, version=LSF_MAX_VERSION, engine_version=(4, 0, 9, 331),
+                 metadata_format=METADATA_FORMAT_KEYS_AND_ADJACENCY, byte_swap_guids=True):
+        self.regions = regions if regions is not None else []
+        self.version = version
+        self.engine_version = engine_version  # (major, minor, revision, build)
+        self.metadata_format = metadata_format
+        self.byte_swap_guids = byte_swap_guids
+
+
+def _unpack_engine_version(packed):
+    return ((packed >> 55) & 0x7F, (packed >> 47) & 0xFF, (packed >> 31) & 0xFFFF, packed & 0x7FFFFFFF)
+
+
+def _pack_engine_version(version):
+    major, minor, revision, build = version
+    return ((major & 0x7F) << 55) | ((minor & 0xFF) << 47) | ((revision & 0xFFFF) << 31) | (build & 0x7FFFFFFF)
+
+
+# --- Compression -------------------------------------------------------------------------------
+
+def _lz4_block_decompress(data, uncompressed_size):
+    """Decode one raw LZ4 block (used when the lz4 package is not installed)."""
+    if _lz4_block is not None:
+        return _lz4_block.decompress(data, uncompressed_size=uncompressed_size)
+    out = bytearray()
+    pos = 0
+    end = len(data)
+    while pos < end:
+        token = data[pos]
+        pos += 1
+        literal_length = token >> 4
+        if literal_length == 15:
+            while True:
+                extra = data[pos]
+                pos += 1
+                literal_length += extra
+                if extra != 255:
+                    break
+        out += data[pos:pos + literal_length]
+        pos += literal_length
+        if pos >= end:
+            break
+        offset = data[pos] | (data[pos + 1] << 8)
+        pos += 2
+        if offset == 0:
+            raise LSFError("Corrupt LZ4 block (zero offset)")
+        match_length = token & 0x0F
+        if match_length == 15:
+            while True:
+                extra = data[pos]
+                pos += 1
+                match_length += extra
+                if extra != 255:
+                    break
+        match_length += 4
+        start = len(out) - offset
+        if start < 0:
+            raise LSFError("Corrupt LZ4 block (offset before start)")
+        if offset >= match_length:
+            out += out[start:start + match_length]
+        else:
+            for i in range(match_length):
+                out.append(out[start + i])
+    return bytes(out)
+
+
+def _lz4_frame_decompress(data):
+    """Decode an LZ4 frame (chunked LSF sections)."""
+    if _lz4_frame is not None:
+        return _lz4_frame.decompress(data)
+    if data[:4] != b"\x04\x22\x4d\x18":
+        raise LSFError("Bad LZ4 frame magic")
+    flags = data[4]
+    block_max = {4: 64 << 10, 5: 256 << 10, 6: 1 << 20, 7: 4 << 20}.get((data[5] >> 4) & 7, 4 << 20)
+    pos = 6 + (8 if flags & 0x08 else 0) + (4 if flags & 0x01 else 0) + 1  # header checksum byte
+    block_checksums = bool(flags & 0x10)
+    out = bytearray()
+    while True:
+        (block_size,) = struct.unpack_from("<I", data, pos)
+        pos += 4
+        if block_size == 0:
+            break
+        size = block_size & 0x7FFFFFFF
+        block = data[pos:pos + size]
+        pos += size + (4 if block_checksums else 0)
+        if block_size & 0x80000000:
+            out += block
+        else:
+            # Blocks may reference earlier output (linked blocks), so decode with it as prefix
+            prefix = bytes(out[-65536:])
+            decoded = _lz4_block_decompress_with_prefix(block, prefix, block_max)
+            out += decoded
+    return bytes(out)
+
+
+def _lz4_block_decompress_with_prefix(block, prefix, block_max):
+    if not prefix:
+        return _lz4_block_decompress(block, block_max)
+    if _lz4_block is not None:
+        return _lz4_block.decompress(block, uncompressed_size=block_max, dict=prefix)
+    # Decode against the prefix as a dictionary, then strip it
+    decoded = _lz4_block_decompress_prefixed(block, prefix)
+    return decoded[len(prefix):]
+
+
+def _lz4_block_decompress_prefixed(block, prefix):
+    out = bytearray(prefix)
+    pos = 0
+    end = len(block)
+    while pos < end:
+        token = block[pos]
+        pos += 1
+        literal_length = token >> 4
+        if literal_length == 15:
+            while True:
+                extra = block[pos]
+                pos += 1
+                literal_length += extra
+                if extra != 255:
+                    break
+        out += block[pos:pos + literal_length]
+        pos += literal_length
+        if pos >= end:
+            break
+        offset = block[pos] | (block[pos + 1] << 8)
+        pos += 2
+        match_length = token & 0x0F
+        if match_length == 15:
+            while True:
+                extra = block[pos]
+                pos += 1
+                match_length += extra
+                if extra != 255:
+                    break
+        match_length += 4
+        start = len(out) - offset
+        for i in range(match_length):
+            out.append(out[start + i])
+    return bytes(out)
+
+
+def _decompress_section(data, size_on_disk, uncompressed_size, compression_flags, chunked):
+    """Decode one metadata-described section of an LSF file."""
+    if size_on_disk == 0 and uncompressed_size != 0:
+        return data  # Stored uncompressed
+    if size_on_disk == 0 and uncompressed_size == 0:
+        return b""
+    method = compression_flags & 0x0F
+    if method == COMPRESSION_NONE:
+        return data
+    if method == COMPRESSION_ZLIB:
+        return zlib.decompress(data)
+    if method == COMPRESSION_LZ4:
+        if chunked:
+            return _lz4_frame_decompress(data)
+        return _lz4_block_decompress(data, uncompressed_size)
+    if method == COMPRESSION_ZSTD:
+        if _zstandard is None:
+            raise LSFError("zstd-compressed LSF requires the 'zstandard' package")
+        return _zstandard.ZstdDecompressor().decompress(data, max_output_size=uncompressed_size)
+    raise LSFError(f"Unsupported LSF compression method {method}")
+
+
+# --- Binary reading ----------------------------------------------------------------------------
+
+def _format_guid(raw, byte_swap):
+    """Render 16 stored GUID bytes the way LSLib writes them to LSX."""
+    d1, d2, d3 = struct.unpack_from("<IHH", raw)
+    tail = raw[8:]
+    if byte_swap:
+        tail = bytes((tail[1], tail[0], tail[3], tail[2], tail[5], tail[4], tail[7], tail[6]))
+    return f"{d1:08x}-{d2:04x}-{d3:04x}-{tail[:2].hex()}-{tail[2:].hex()}"
+
+
+def _parse_guid(text, byte_swap):
+    """Inverse of _format_guid."""
+    digits = text.replace("-", "")
+    if len(digits) != 32:
+        raise LSFError(f"Invalid GUID value: {text!r}")
+    raw = struct.pack("<IHH", int(digits[0:8], 16), int(digits[8:12], 16), int(digits[12:16], 16))
+    tail = bytes.fromhex(digits[16:])
+    if byte_swap:
+        tail = bytes((tail[1], tail[0], tail[3], tail[2], tail[5], tail[4], tail[7], tail[6]))
+    return raw + tail
+
+
+def _read_string(data, pos, length):
+    """Read a null-terminated string field of a known byte length."""
+    raw = data[pos:pos + length]
+    if raw.endswith(b"\x00"):
+        raw = raw[:-1]
+    return raw.decode("utf-8")
+
+
+def _read_translated_fs_string(data, pos, version):
+    if version >= LSF_VERSION_BG3:
+        (ts_version,) = struct.unpack_from("<H", data, pos)
+        pos += 2
+        value = None
+    else:
+        ts_version = 0
+        (length,) = struct.unpack_from("<i", data, pos)
+        value = _read_string(data, pos + 4, length)
+        pos += 4 + length
+    (length,) = struct.unpack_from("<i", data, pos)
+    handle = _read_string(data, pos + 4, length)
+    pos += 4 + length
+    (argument_count,) = struct.unpack_from("<i", data, pos)
+    pos += 4
+    arguments = []
+    for _ in range(argument_count):
+        (length,) = struct.unpack_from("<i", data, pos)
+        key = _read_string(data, pos + 4, length)
+        pos += 4 + length
+        string, pos = _read_translated_fs_string(data, pos, version)
+        (length,) = struct.unpack_from("<i", data, pos)
+        argument_value = _read_string(data, pos + 4, length)
+        pos += 4 + length
+        arguments.append((key, string, argument_value))
+    return TranslatedFSString(handle, ts_version, value, arguments), pos
+
+
+def _read_value(data, type_id, pos, length, version, byte_swap_guids):
+    if type_id in _STRING_TYPES:
+        return _read_string(data, pos, length)
+    numeric = _NUMERIC_FORMATS.get(type_id)
+    if numeric is not None:
+        fmt, count = numeric
+        values = struct.unpack_from(f"<{count}{fmt}", data, pos)
+        return values[0] if count == 1 else values
+    if type_id == DT_BOOL:
+        return data[pos] != 0
+    if type_id == DT_UUID:
+        return _format_guid(data[pos:pos + 16], byte_swap_guids)
+    if type_id == DT_TRANSLATEDSTRING:
+        if version >= LSF_VERSION_BG3:
+            (ts_version,) = struct.unpack_from("<H", data, pos)
+            (handle_length,) = struct.unpack_from("<i", data, pos + 2)
+            return TranslatedString(_read_string(data, pos + 6, handle_length), ts_version)
+        (value_length,) = struct.unpack_from("<i", data, pos)
+        value = _read_string(data, pos + 4, value_length)
+        handle_pos = pos + 4 + value_length
+        (handle_length,) = struct.unpack_from("<i", data, handle_pos)
+        return TranslatedString(_read_string(data, handle_pos + 4, handle_length), 0, value)
+    if type_id == DT_TRANSLATEDFSSTRING:
+        return _read_translated_fs_string(data, pos, version)[0]
+    if type_id == DT_SCRATCHBUFFER:
+        return bytes(data[pos:pos + length])
+    if type_id == DT_NONE:
+        return None
+    raise LSFError(f"Unsupported attribute type {type_id}")
+
+
+def _read_names(data):
+    names = []
+    (bucket_count,) = struct.unpack_from("<I", data, 0)
+    pos = 4
+    for _ in range(bucket_count):
+        (string_count,) = struct.unpack_from("<H", data, pos)
+        pos += 2
+        bucket = []
+        for _ in range(string_count):
+            (length,) = struct.unpack_from("<H", data, pos)
+            pos += 2
+            bucket.append(data[pos:pos + length].decode("utf-8"))
+            pos += length
+        names.append(bucket)
+    return names
+
+
+def is_compressed(data):
+    """True if any section of LSF data is stored compressed, i.e. a raw byte search could miss a string.
+
+    Only the header is read, so this is cheap on a memory-mapped file.
+    """
+    if len(data) < 16 or data[:4] != LSF_MAGIC:
+        return False
+    (version,) = struct.unpack_from("<I", data, 4)
+    offset = 16 if version >= LSF_VERSION_EXTENDED_HEADER else 12
+    count = 10 if version >= LSF_VERSION_ADDITIONAL_BLOB else 8
+    if len(data) < offset + count * 4 + 1:
+        return False
+    sizes = struct.unpack_from(f"<{count}I", data, offset)
+    compression_flags = data[offset + count * 4]
+    return (compression_flags & 0x0F) != COMPRESSION_NONE and any(sizes[1::2])
+
+
+def read_lsf_tables(data):
+    """Parse the header and tables of an LSF file without decoding attribute values.
+
+    Returns a dict with the header fields, the name table, node and attribute
+    entries, the keys, the decompressed value blob, the on-disk layout of each
+    section and, for uncompressed files, the file offset of the value section
+    (used for in-place patching).
+    """
+    data = memoryview(data).tobytes() if not isinstance(data, bytes) else data
+    if data[:4] != LSF_MAGIC:
+        raise LSFError("Not an LSF file (bad magic)")
+    (version,) = struct.unpack_from("<I", data, 4)
+    if version < 2 or version > LSF_MAX_VERSION:
+        raise LSFError(f"Unsupported LSF version {version}")
+    pos = 8
+    if version >= LSF_VERSION_EXTENDED_HEADER:
+        (packed_engine_version,) = struct.unpack_from("<Q", data, pos)
+        pos += 8
+    else:
+        (packed_engine_version,) = struct.unpack_from("<I", data, pos)
+        pos += 4
+    metadata_offset = pos
+    if version >= LSF_VERSION_ADDITIONAL_BLOB:
+        (strings_size, strings_disk, keys_size, keys_disk, nodes_size, nodes_disk, attributes_size,
+         attributes_disk, values_size, values_disk, compression_flags, _, _, metadata_format) = \
+            struct.unpack_from("<10IBBHI", data, pos)
+        pos += 48
+    else:
+        (strings_size, strings_disk, nodes_size, nodes_disk, attributes_size, attributes_disk,
+         values_size, values_disk, compression_flags, _, _, metadata_format) = \
+            struct.unpack_from("<8IBBHI", data, pos)
+        keys_size = keys_disk = 0
+        pos += 40
+
+    chunked = version >= 2
+    sections = {}
+
+    def take(section, size_on_disk, uncompressed_size, is_chunked):
+        nonlocal pos
+        stored = size_on_disk if size_on_disk else uncompressed_size
+        sections[section] = (pos, stored, size_on_disk, uncompressed_size)
+        section_start = pos
+        raw = data[pos:pos + stored]
+        pos += stored
+        return _decompress_section(raw, size_on_disk, uncompressed_size, compression_flags, is_chunked), section_start
+
+    names_data, _ = take("strings", strings_disk, strings_size, False)
+    nodes_data, _ = take("nodes", nodes_disk, nodes_size, chunked)
+    attributes_data, _ = take("attributes", attributes_disk, attributes_size, chunked)
+    values_data, values_offset = take("values", values_disk, values_size, chunked)
+    keys_data, _ = take("keys", keys_disk, keys_size, chunked) if keys_size else (b"", None)
+
+    has_adjacency = metadata_format == METADATA_FORMAT_KEYS_AND_ADJACENCY
+    if has_adjacency:
+        nodes = [struct.unpack_from("<Iiii", nodes_data, offset) for offset in range(0, len(nodes_data), 16)]
+        # (name, parent, next_sibling, first_attribute)
+        attributes = [struct.unpack_from("<IIiI", attributes_data, offset)
+                      for offset in range(0, len(attributes_data), 16)]
+        # (name, type_and_length, next_attribute, offset)
+    else:
+        raw_nodes = [struct.unpack_from("<Iii", nodes_data, offset) for offset in range(0, len(nodes_data), 12)]
+        nodes = [(name, parent, -1, first_attribute) for name, first_attribute, parent in raw_nodes]
+        raw_attributes = [struct.unpack_from("<IIi", attributes_data, offset)
+                          for offset in range(0, len(attributes_data), 12)]
+        # V2 attributes are stored per node in order, with implicit offsets
+        attributes = []
+        offset = 0
+        last_by_node = {}
+        for index, (name, type_and_length, node_index) in enumerate(raw_attributes):
+            attributes.append([name, type_and_length, -1, offset])
+            offset += type_and_length >> 6
+            if node_index in last_by_node:
+                attributes[last_by_node[node_index]][2] = index
+            last_by_node[node_index] = index
+        attributes = [tuple(attribute) for attribute in attributes]
+
+    keys = [struct.unpack_from("<II", keys_data, offset) for offset in range(0, len(keys_data), 8)]
+    uncompressed = (compression_flags & 0x0F) == COMPRESSION_NONE or values_disk == 0
+    return {
+        "version": version,
+        "engine_version": _unpack_engine_version(packed_engine_version) if version >= LSF_VERSION_EXTENDED_HEADER
+        else (packed_engine_version >> 28, (packed_engine_version >> 24) & 0xF,
+              (packed_engine_version >> 16) & 0xFF, packed_engine_version & 0xFFFF),
+        "metadata_format": metadata_format,
+        "compression_flags": compression_flags,
+        "names": _read_names(names_data),
+        "nodes": nodes,
+        "attributes": attributes,
+        "attributes_data": attributes_data,
+        "keys": keys,
+        "values": values_data,
+        "values_offset": values_offset if uncompressed else None,
+        "metadata_offset": metadata_offset,
+        "sections": sections,
+    }
+
+
+def read_lsf(data, byte_swap_guids=True):
+    """Decode LSF bytes into a Resource."""
+    tables = read_lsf_tables(data)
+    names = tables["names"]
+    version = tables["version"]
+    values = tables["values"]
+
+    def name_of(index):
+        return names[index >> 16][index & 0xFFFF]
+
+    node_keys = {node_index: name_of(key_name) for node_index, key_name in tables["keys"]}
+    nodes = []
+    regions = []
+    for index, (name_index, parent, _, first_attribute) in enumerate(tables["nodes"]):
+        node = Node(name_of(name_index), node_keys.get(index))
+        attribute_index = first_attribute
+        while attribute_index != -1:
+            attr_name, type_and_length, next_attribute, offset = tables["attributes"][attribute_index]
+            type_id = type_and_length & 0x3F
+            length = type_and_length >> 6
+            node.attributes[name_of(attr_name)] = (
+                type_id, _read_value(values, type_id, offset, length, version, byte_swap_guids))
+            attribute_index = next_attribute
+        nodes.append(node)
+        if parent == -1:
+            regions.append(node)
+        else:
+            nodes[parent].children.append(node)
+    return Resource(regions, version, tables["engine_version"], tables["metadata_format"], byte_swap_guids)
+
+
+# --- Binary writing ----------------------------------------------------------------------------
+
+def _name_bucket(name):
+    """Bucket for the name hash table. Readers only use the stored indices, so any stable hash works."""
+    hash_value = zlib.crc32(name.encode("utf-8"))
+    return (hash_value & 0x1FF) ^ ((hash_value >> 9) & 0x1FF) ^ ((hash_value >> 18) & 0x1FF) ^ ((hash_value >> 27) & 0x1FF)
+
+
+def _encode_string(text):
+    return text.encode("utf-8") + b"\x00"
+
+
+def _encode_translated_fs_string(value, version):
+    out = bytearray()
+    if version >= LSF_VERSION_BG3:
+        out += struct.pack("<H", value.version)
+    else:
+        encoded = _encode_string(value.value or "")
+        out += struct.pack("<i", len(encoded)) + encoded
+    encoded = _encode_string(value.handle)
+    out += struct.pack("<i", len(encoded)) + encoded
+    out += struct.pack("<i", len(value.arguments))
+    for key, string, argument_value in value.arguments:
+        encoded = _encode_string(key)
+        out += struct.pack("<i", len(encoded)) + encoded
+        out += _encode_translated_fs_string(string, version)
+        encoded = _encode_string(argument_value)
+        out += struct.pack("<i", len(encoded)) + encoded
+    return bytes(out)
+
+
+def _encode_value(type_id, value, version, byte_swap_guids):
+    if type_id in _STRING_TYPES:
+        return _encode_string(value)
+    numeric = _NUMERIC_FORMATS.get(type_id)
+    if numeric is not None:
+        fmt, count = numeric
+        return struct.pack(f"<{count}{fmt}", *(value if count > 1 else (value,)))
+    if type_id == DT_BOOL:
+        return b"\x01" if value else b"\x00"
+    if type_id == DT_UUID:
+        return _parse_guid(value, byte_swap_guids)
+    if type_id == DT_TRANSLATEDSTRING:
+        handle = _encode_string(value.handle)
+        if version >= LSF_VERSION_BG3:
+            return struct.pack("<Hi", value.version, len(handle)) + handle
+        inline = _encode_string(value.value or "")
+        return struct.pack("<i", len(inline)) + inline + struct.pack("<i", len(handle)) + handle
+    if type_id == DT_TRANSLATEDFSSTRING:
+        return _encode_translated_fs_string(value, version)
+    if type_id == DT_SCRATCHBUFFER:
+        return bytes(value)
+    if type_id == DT_NONE:
+        return b""
+    raise LSFError(f"Unsupported attribute type {type_id}")
+
+
+def write_lsf(resource):
+    """Encode a Resource as an uncompressed LSF file (version 6 or 7, with sibling data)."""
+    version = resource.version
+    if version < LSF_VERSION_ADDITIONAL_BLOB:
+        raise LSFError(f"Writing LSF version {version} is not supported")
+    if resource.metadata_format != METADATA_FORMAT_KEYS_AND_ADJACENCY:
+        raise LSFError(f"Writing LSF metadata format {resource.metadata_format} is not supported")
+
+    buckets = [[] for _ in range(HASH_TABLE_SIZE)]
+    name_indices = {}
+
+    def add_name(name):
+        index = name_indices.get(name)
+        if index is None:
+            bucket = _name_bucket(name)
+            index = (bucket << 16) | len(buckets[bucket])
+            buckets[bucket].append(name)
+            name_indices[name] = index
+        return index
+
+    # Flatten in LSLib's write order: each node, then its children grouped by name
+    order = []
+
+    def collect(node, parent_index):
+        index = len(order)
+        order.append((node, parent_index))
+        for child in node.grouped_children():
+            collect(child, index)
+
+    for region in resource.regions:
+        collect(region, -1)
+
+    next_sibling = [-1] * len(order)
+    last_child = {}
+    for index, (_, parent_index) in enumerate(order):
+        previous = last_child.get(parent_index)
+        if previous is not None:
+            next_sibling[previous] = index
+        last_child[parent_index] = index
+
+    node_table = bytearray()
+    attribute_table = bytearray()
+    values = bytearray()
+    keys = bytearray()
+    attribute_count = 0
+    for index, (node, parent_index) in enumerate(order):
+        first_attribute = attribute_count if node.attributes else -1
+        node_table += struct.pack("<Iiii", add_name(node.name), parent_index, next_sibling[index], first_attribute)
+        for position, (attr_name, (type_id, value)) in enumerate(node.attributes.items()):
+            encoded = _encode_value(type_id, value, version, resource.byte_swap_guids)
+            next_attribute = attribute_count + 1 if position + 1 < len(node.attributes) else -1
+            attribute_table += struct.pack("<IIiI", add_name(attr_name), type_id | (len(encoded) << 6),
+                                           next_attribute, len(values))
+            values += encoded
+            attribute_count += 1
+        if node.key is not None:
+            keys += struct.pack("<II", index, add_name(node.key))
+
+    names = bytearray(struct.pack("<I", HASH_TABLE_SIZE))
+    for bucket in buckets:
+        names += struct.pack("<H", len(bucket))
+        for name in bucket:
+            encoded = name.encode("utf-8")
+            names += struct.pack("<H", len(encoded)) + encoded
+
+    if version < LSF_VERSION_NODE_KEYS:
+        keys = bytearray()
+    header = LSF_MAGIC + struct.pack("<IQ", version, _pack_engine_version(resource.engine_version))
+    metadata = struct.pack("<10IBBHI", len(names), 0, len(keys), 0, len(node_table), 0, len(attribute_table), 0,
+                           len(values), 0, COMPRESSION_NONE, 0, 0, resource.metadata_format)
+    return bytes(header + metadata + names + node_table + attribute_table + values + keys)
+
+
+# --- In-place patching ------------------------------------------------------------------------
+
+def _compress_section(raw, compression_flags, chunked):
+    """Compress a section the way the file's other sections are; returns (bytes, size_on_disk).
+
+    Falls back to storing the section uncompressed (size on disk 0, which
+    readers accept per section) when the matching compressor is not installed.
+    """
+    method = compression_flags & 0x0F
+    if method == COMPRESSION_ZLIB:
+        compressed = zlib.compress(raw)
+    elif method == COMPRESSION_LZ4 and _lz4_block is not None:
+        compressed = _lz4_frame.compress(raw) if chunked else _lz4_block.compress(raw, store_size=False)
+    elif method == COMPRESSION_ZSTD and _zstandard is not None:
+        compressed = _zstandard.ZstdCompressor().compress(raw)
+    else:
+        return bytes(raw), 0
+    return compressed, len(compressed)
+
+
+def patch_translated_strings(data, lookup, attribute_ids=None):
+    """Rewrite TranslatedString handles/versions in LSF bytes without decoding the resource.
+
+    lookup(handle) returns (new_handle, new_version) or None. attribute_ids,
+    if given, limits the rewrite to attributes with one of those names. Returns
+    (new_data, matches), where matches lists (old_handle, new_handle,
+    new_version) for every TranslatedString lookup knew, and new_data is data
+    itself when nothing needed to change.
+
+    Same-length edits to an uncompressed file are written straight into the
+    value section. Otherwise only the value section (plus the attribute table,
+    if a handle changed length) is re-encoded; every other section is copied
+    byte for byte.
+    """
+    if not isinstance(data, bytes):
+        data = bytes(data)
+    tables = read_lsf_tables(data)
+    if tables["version"] < LSF_VERSION_BG3:
+        raise LSFError(f"Cannot patch TranslatedStrings in LSF version {tables['version']}")
+    values = tables["values"]
+    names = tables["names"]
+    edits = []  # (offset, old_length, encoded, attribute_index)
+    matches = []
+    for index, (name_index, type_and_length, _, offset) in enumerate(tables["attributes"]):
+        if type_and_length & 0x3F != DT_TRANSLATEDSTRING:
+            continue
+        if attribute_ids is not None and names[name_index >> 16][name_index & 0xFFFF] not in attribute_ids:
+            continue
+        version, handle_length = struct.unpack_from("<Hi", values, offset)
+        handle = _read_string(values, offset + 6, handle_length)
+        replacement = lookup(handle)
+        if replacement is None:
+            continue
+        new_handle, new_version = replacement[0], int(replacement[1])
+        matches.append((handle, new_handle, new_version))
+        if (new_handle, new_version) != (handle, version):
+            encoded = _encode_value(DT_TRANSLATEDSTRING, TranslatedString(new_handle, new_version),
+                                    LSF_VERSION_BG3, True)
+            edits.append((offset, type_and_length >> 6, encoded, index))
+    if not edits:
+        return data, matches
+
+    same_length = all(len(encoded) == old_length for _, old_length, encoded, _ in edits)
+    if same_length and tables["values_offset"] is not None:
+        patched = bytearray(data)
+        base = tables["values_offset"]
+        for offset, old_length, encoded, _ in edits:
+            patched[base + offset:base + offset + old_length] = encoded
+        return bytes(patched), matches
+
+    edits.sort()
+    new_values = bytearray()
+    cursor = 0
+    for offset, old_length, encoded, _ in edits:
+        new_values += values[cursor:offset]
+        new_values += encoded
+        cursor = offset + old_length
+    new_values += values[cursor:]
+
+    replaced = {"values": new_values}
+    if not same_length:
+        # Shift every attribute that follows a resized value and fix the edited lengths
+        edit_offsets = [offset for offset, _, _, _ in edits]
+        shifts = [0]
+        for _, old_length, encoded, _ in edits:
+            shifts.append(shifts[-1] + len(encoded) - old_length)
+        has_adjacency = tables["metadata_format"] == METADATA_FORMAT_KEYS_AND_ADJACENCY
+        entry_size = 16 if has_adjacency else 12
+        attributes_data = bytearray(tables["attributes_data"])
+        for offset, _, encoded, index in edits:
+            type_and_length = (tables["attributes"][index][1] & 0x3F) | (len(encoded) << 6)
+            struct.pack_into("<I", attributes_data, index * entry_size + 4, type_and_length)
+        if has_adjacency:
+            for index, (_, _, _, offset) in enumerate(tables["attributes"]):
+                shift = shifts[bisect.bisect_left(edit_offsets, offset)]
+                if shift:
+                    struct.pack_into("<I", attributes_data, index * entry_size + 12, offset + shift)
+        replaced["attributes"] = attributes_data
+
+    version = tables["version"]
+    metadata_offset = tables["metadata_offset"]
+    if version >= LSF_VERSION_ADDITIONAL_BLOB:
+        metadata_format_string = "<10IBBHI"
+        size_fields = {"strings": 0, "keys": 2, "nodes": 4, "attributes": 6, "values": 8}
+    else:
+        metadata_format_string = "<8IBBHI"
+        size_fields = {"strings": 0, "nodes": 2, "attributes": 4, "values": 6}
+    metadata = list(struct.unpack_from(metadata_format_string, data, metadata_offset))
+    body = bytearray()
+    for section in ("strings", "nodes", "attributes", "values", "keys"):
+        if section not in tables["sections"]:
+            continue
+        start, stored, _, _ = tables["sections"][section]
+        if section in replaced:
+            raw = replaced[section]
+            section_bytes, size_on_disk = _compress_section(raw, tables["compression_flags"], True)
+            metadata[size_fields[section]] = len(raw)
+            metadata[size_fields[section] + 1] = size_on_disk
+            body += section_bytes
+        else:
+            body += data[start:start + stored]
+    header = data[:metadata_offset] + struct.pack(metadata_format_string, *metadata)
+    return bytes(header + body), matches
+
+
+# --- LSX ---------------------------------------------------------------------------------------
+
+def _format_float(value):
+    """Shortest round-trip text for a 32-bit float, in .NET's "R" style."""
+    for precision in range(1, 10):
+        text = f"{value:.{precision}G}"
+        if struct.unpack("<f", struct.pack("<f", float(text)))[0] == value:
+            break
+    if "E" in text:
+        mantissa, exponent = text.split("E")
+        sign = exponent[0]
+        digits = exponent[1:].lstrip("0").rjust(2, "0")
+        text = f"{mantissa}E{sign}{digits}"
+    return text
+
+
+def _format_double(value):
+    text = repr(float(value))
+    if text.endswith(".0"):
+        text = text[:-2]
+    if "e" in text:
+        mantissa, exponent = text.split("e")
+        sign = "-" if exponent.startswith("-") else "+"
+        text = f"{mantissa}E{sign}{exponent.lstrip('+-').rjust(2, '0')}"
+    return text
+
+
+def _value_to_text(type_id, value):
+    if type_id in _STRING_TYPES or type_id == DT_UUID:
+        return value
+    if type_id == DT_BOOL:
+        return "True" if value else "False"
+    if type_id == DT_FLOAT:
+        return _format_float(value)
+    if type_id == DT_DOUBLE:
+        return _format_double(value)
+    numeric = _NUMERIC_FORMATS.get(type_id)
+    if numeric is not None:
+        fmt, count = numeric
+        if count == 1:
+            return str(value)
+        return " ".join(_format_float(v) if fmt == "f" else str(v) for v in value)
+    if type_id == DT_SCRATCHBUFFER:
+        return base64.b64encode(value).decode("ascii")
+    raise LSFError(f"Attribute type {type_id} has no plain value form")
+
+
+def _text_to_value(type_id, text):
+    if type_id in _STRING_TYPES or type_id == DT_UUID:
+        return text
+    if type_id == DT_BOOL:
+        return text.strip().lower() in ("true", "1")
+    numeric = _NUMERIC_FORMATS.get(type_id)
+    if numeric is not None:
+        fmt, count = numeric
+        convert = float if fmt in "fd" else int
+        parts = text.split()
+        if count == 1:
+            return convert(parts[0])
+        return tuple(convert(part) for part in parts)
+    if type_id == DT_SCRATCHBUFFER:
+        return base64.b64decode(text)
+    if type_id == DT_NONE:
+        return None
+    raise LSFError(f"Attribute type {type_id} has no plain value form")
+
+
+def _escape_attribute(text):
+    """Escape an attribute value the way .NET's XmlWriter does."""
+    return (text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+            .replace("\r", "&#xD;").replace("\n", "&#xA;").replace("\t", "&#x9;"))
+
+
+def _fs_string_xml(tag, value, indent, newline, lines):
+    head = f'{indent}<{tag} value="{_escape_attribute(value.value or "")}" ' \
+           f'handle="{_escape_attribute(value.handle)}" arguments="{len(value.arguments)}"'
+    if not value.arguments:
+        lines.append(head + " />")
+        return
+    lines.append(head + ">")
+    lines.append(f"{indent}\t<arguments>")
+    for key, string, argument_value in value.arguments:
+        lines.append(f'{indent}\t\t<argument key="{_escape_attribute(key)}" value="{_escape_attribute(argument_value)}">')
+        _fs_string_xml("string", string, indent + "\t\t\t", newline, lines)
+        lines.append(f"{indent}\t\t</argument>")
+    lines.append(f"{indent}\t</arguments>")
+    lines.append(f"{indent}</{tag}>")
+
+
+def write_lsx(resource, newline=os.linesep):
+    """Render a Resource as LSX text (bytes, UTF-8 with BOM), matching Divine's layout."""
+    lines = ['<?xml version="1.0" encoding="utf-8"?>', "<save>"]
+    major, minor, revision, build = resource.engine_version
+    meta = "v1"
+    if resource.byte_swap_guids:
+        meta += ",bswap_guids"
+    if resource.metadata_format == METADATA_FORMAT_KEYS_AND_ADJACENCY:
+        meta += ",lsf_keys_adjacency"
+    lines.append(f'\t<version major="{major}" minor="{minor}" revision="{revision}" build="{build}" '
+                 f'lslib_meta="{meta}" />')
+
+    def write_node(node, indent):
+        head = f'{indent}<node id="{_escape_attribute(node.name)}"'
+        if node.key is not None:
+            head += f' key="{_escape_attribute(node.key)}"'
+        if not node.attributes and not node.children:
+            lines.append(head + " />")
+            return
+        lines.append(head + ">")
+        for attr_name, (type_id, value) in node.attributes.items():
+            attr_head = f'{indent}\t<attribute id="{_escape_attribute(attr_name)}" type="{TYPE_NAMES[type_id]}"'
+            if type_id == DT_TRANSLATEDSTRING:
+                attr_head += f' handle="{_escape_attribute(value.handle)}"'
+                if value.value is not None:
+                    attr_head += f' value="{_escape_attribute(value.value)}"'
+                else:
+                    attr_head += f' version="{value.version}"'
+                lines.append(attr_head + " />")
+            elif type_id == DT_TRANSLATEDFSSTRING:
+                fs_lines = []
+                _fs_string_xml("attribute", value, indent + "\t", newline, fs_lines)
+                fs_lines[0] = attr_head + fs_lines[0][len(indent) + len("\t<attribute"):]
+                lines.extend(fs_lines)
+            else:
+                lines.append(f'{attr_head} value="{_escape_attribute(_value_to_text(type_id, value))}" />')
+        if node.children:
+            lines.append(f"{indent}\t<children>")
+            for child in node.grouped_children():
+                write_node(child, indent + "\t\t")
+            lines.append(f"{indent}\t</children>")
+        lines.append(f"{indent}</node>")
+
+    for region in resource.regions:
+        lines.append(f'\t<region id="{_escape_attribute(region.name)}">')
+        write_node(region, "\t\t")
+        lines.append("\t</region>")
+    lines.append("</save>")
+    return b"\xef\xbb\xbf" + newline.join(lines).encode("utf-8")
+
+
+def _parse_fs_string(element):
+    arguments = []
+    arguments_element = element.find("arguments")
+    if arguments_element is not None:
+        for argument in arguments_element.findall("argument"):
+            string_element = argument.find("string")
+            arguments.append((argument.get("key", ""), _parse_fs_string(string_element), argument.get("value", "")))
+    version = element.get("version")
+    return TranslatedFSString(element.get("handle", ""), int(version) if version else 0,
+                              element.get("value"), arguments)
+
+
+def read_lsx(data):
+    """Parse LSX bytes into a Resource."""
+    root = ET.fromstring(data)
+    version_element = root.find("version")
+    engine_version = (4, 0, 9, 331)
+    byte_swap_guids = True
+    metadata_format = METADATA_FORMAT_KEYS_AND_ADJACENCY
+    if version_element is not None:
+        engine_version = tuple(int(version_element.get(part, "0")) for part in ("major", "minor", "revision", "build"))
+        meta = version_element.get("lslib_meta")
+        if meta is not None:
+            flags = meta.split(",")
+            byte_swap_guids = "bswap_guids" in flags
+            metadata_format = METADATA_FORMAT_KEYS_AND_ADJACENCY if "lsf_keys_adjacency" in flags \
+                else METADATA_FORMAT_NONE
+    if engine_version[0] < 4:
+        raise LSFError(f"LSX files from engine version {engine_version} are not supported")
+
+    def parse_node(element):
+        node = Node(element.get("id"), element.get("key"))
+        for attribute in element.findall("attribute"):
+            type_name = attribute.get("type")
+            type_id = TYPE_IDS.get(type_name)
+            if type_id is None:
+                if type_name is not None and type_name.isdigit():
+                    type_id = int(type_name)
+                else:
+                    raise LSFError(f"Unknown attribute type {type_name!r}")
+            if type_id == DT_TRANSLATEDSTRING:
+                version = attribute.get("version")
+                value = TranslatedString(attribute.get("handle", ""), int(version) if version else 0,
+                                         attribute.get("value") if version is None else None)
+            elif type_id == DT_TRANSLATEDFSSTRING:
+                value = _parse_fs_string(attribute)
+            else:
+                value = _text_to_value(type_id, attribute.get("value", ""))
+            node.attributes[attribute.get("id")] = (type_id, value)
+        children = element.find("children")
+        if children is not None:
+            node.children = [parse_node(child) for child in children.findall("node")]
+        return node
+
+    regions = []
+    for region in root.findall("region"):
+        region_node = region.find("node")
+        if region_node is not None:
+            regions.append(parse_node(region_node))
+    return Resource(regions, LSF_MAX_VERSION, engine_version, metadata_format, byte_swap_guids)
+
+
+def convert_file(source_path, destination_path):
+    """Convert a single .lsf file to .lsx or back, chosen by the source extension."""
+    with open(source_path, "rb") as f:
+        data = f.read()
+    source_extension = os.path.splitext(source_path)[1].lower()
+    if source_extension == ".lsf":
+        output = write_lsx(read_lsf(data))
+    elif source_extension == ".lsx":
+        output = write_lsf(read_lsx(data))
+    else:
+        raise LSFError(f"Cannot convert {source_path}: unsupported extension")
+    temp_path = f"{destination_path}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(output)
+        os.replace(temp_path, destination_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Structural rewriting of TranslatedString handles in LSJ (JSON) resources.
+
+The text is tokenized in a single pass without building any Python objects
+for it. Objects are recognised by their keys, in any order and with any
+whitespace, e.g.
+
+    "TagText" : {
+       "handle" : "h...",
+       "type" : "TranslatedString",
+       "version" : 1
+    }
+
+Only the handle string and the version number are replaced; every other
+character (indentation, key order, escapes, line endings) is left as it was.
+"""
+
+import re
+
+# The key/value pairs that matter, each alternative matching exactly one pair
+_KEYS = (r'"handle"\s*:\s*"([^"\\]*(?:\\.[^"\\]*)*)"'
+         r'|"version"\s*:\s*(-?\d+)(?![.\deE])'
+         r'|"type"\s*:\s*"(TranslatedString)"')
+# Any other string; the lookahead excludes exactly what _KEYS matches
+_OTHER_STRING = r'"(?!handle"\s*:\s*"|version"\s*:\s*-?\d+(?![.\deE])|type"\s*:\s*"TranslatedString")[^"\\]*(?:\\.[^"\\]*)*"'
+# Tokens: a key/value pair (groups 1-3), an opening (4) or closing (5) bracket, or a run of
+# anything else. A run swallows whole strings, so brackets inside strings are never seen, and
+# flat objects without interesting keys ({"type" : "int32", "value" : 2}), so most of a
+# dialog costs one token per line or less.
+_TOKEN = re.compile(_KEYS + r'|([{\[])|([}\]])'
+                    r'|(?:\{[^"{}\[\]]*(?:' + _OTHER_STRING + r'[^"{}\[\]]*)*\}|[^"{}\[\]]+|' + _OTHER_STRING + r')+')
+
+
+_FIELDS = {1: "handle", 2: "version", 3: "type"}
+
+
+class LSJError(ValueError):
+    """The text is not well-formed enough to rewrite structurally."""
+
+
+def patch_translated_strings(text, lookup):
+    """Rewrite TranslatedString handles/versions in LSJ text.
+
+    lookup(handle) returns (new_handle, new_version) or None. The handle of
+    every object with a "handle" key is rewritten; the version only when the
+    object is a "type" : "TranslatedString" and has one, and new_version is
+    an integer.
+
+    Returns (new_text, matches), where matches lists (old_handle, new_handle,
+    new_version, changed) for every object lookup knew. new_version is None
+    for objects without a version, and new_text is text itself when nothing
+    needed to change. Raises LSJError on unbalanced brackets.
+    """
+    stack = []  # Per open container: {key: (start, end, value)} for objects, None for arrays
+    edits = []  # (start, end, replacement)
+    matches = []
+    for token in _TOKEN.finditer(text):
+        group = token.lastindex
+        if group is None:
+            continue
+        if group <= 3:
+            if stack and stack[-1] is not None:
+                stack[-1][_FIELDS[group]] = (token.start(group), token.end(group), token.group(group))
+            continue
+        if group == 4:
+            stack.append({} if token.group(4) == "{" else None)
+            continue
+        first = token.group(5)
+        if not stack or (stack[-1] is None) != (first == "]"):
+            raise LSJError(f"Unbalanced '{first}' at offset {token.start()}")
+        fields = stack.pop()
+        if not fields or "handle" not in fields:
+            continue
+        handle_start, handle_end, handle = fields["handle"]
+        replacement = lookup(handle)
+        if replacement is None:
+            continue
+        new_handle = replacement[0]
+        version = fields.get("version") if "type" in fields else None
+        new_version = None
+        if version is not None:
+            try:
+                new_version = int(replacement[1])
+            except (TypeError, ValueError):
+                version = None  # Not a version number; leave the token as it is
+        object_edits = []
+        if new_handle != handle:
+            object_edits.append((handle_start, handle_end, new_handle))
+        if version is not None and int(version[2]) != new_version:
+            object_edits.append((version[0], version[1], str(new_version)))
+        matches.append((handle, new_handle, new_version, bool(object_edits)))
+        edits.extend(object_edits)
+    if stack:
+        raise LSJError("Unexpected end of text inside an object or array")
+    if not edits:
+        return text, matches
+
+    # Objects close inside out, so restore text order before splicing
+    edits.sort()
+    pieces = []
+    position = 0
+    for start, end, replacement in edits:
+        pieces.append(text[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(text[position:])
+    return "".join(pieces), matches
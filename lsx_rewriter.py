@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Span patching of TranslatedString attributes in LSX (XML) resources.
+
+The raw bytes are run through expat once; no tree is built. For every
+
+    <attribute id="TagText" type="TranslatedString" handle="h..." version="1" />
+
+whose handle is being replaced, the byte offsets of the handle and version
+values inside the start tag are recorded, and the new values are spliced
+into the original buffer. Attribute order, indentation, quoting, line
+endings and everything outside those values stay byte for byte the same.
+"""
+
+import re
+from xml.parsers import expat
+
+# LSX writes the type by name; old LSLib versions wrote the numeric type id
+TRANSLATED_STRING_TYPES = ("TranslatedString", "28")
+
+# One name="value" pair inside a start tag; group 2 is the value without its quotes
+_TAG_ATTRIBUTE = re.compile(rb'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_TAG_END = re.compile(rb'/?>')
+
+
+class LSXError(ValueError):
+    """The bytes are not well-formed XML."""
+
+
+def patch_translated_strings(data, lookup, attribute_ids=None):
+    """Rewrite TranslatedString handles/versions in LSX bytes.
+
+    lookup(handle) returns (new_handle, new_version) or None. attribute_ids,
+    if given, limits the rewrite to attributes with one of those ids. Returns
+    (new_data, matches), where matches lists (old_handle, new_handle,
+    new_version, changed) for every attribute lookup knew, and new_data is
+    data itself when nothing needed to change. Raises LSXError when expat
+    rejects the document.
+    """
+    edits = []  # (start, end, replacement bytes)
+    matches = []
+    parser = expat.ParserCreate()
+
+    def start_element(name, attributes):
+        if name != "attribute" or attributes.get("type") not in TRANSLATED_STRING_TYPES:
+            return
+        if attribute_ids is not None and attributes.get("id") not in attribute_ids:
+            return
+        handle = attributes.get("handle")
+        replacement = lookup(handle) if handle is not None else None
+        if replacement is None:
+            return
+        new_handle, new_version = replacement[0], str(replacement[1])
+        wanted = {b"handle": new_handle, b"version": new_version}
+        changed = False
+        # Walk the start tag's attributes in the raw bytes; quoted values cannot contain
+        # their own quote character, so the first match of /?> after the last pair ends it
+        position = parser.CurrentByteIndex + len(b"<attribute")
+        while True:
+            pair = _TAG_ATTRIBUTE.search(data, position)
+            tag_end = _TAG_END.search(data, position)
+            if pair is None or (tag_end is not None and tag_end.start() < pair.start()):
+                break
+            position = pair.end()
+            value_group = 2 if pair.group(2) is not None else 3
+            new_value = wanted.get(pair.group(1))
+            if new_value is not None and pair.group(value_group) != new_value.encode("utf-8"):
+                edits.append((pair.start(value_group), pair.end(value_group), new_value.encode("utf-8")))
+                changed = True
+        matches.append((handle, new_handle, new_version, changed))
+
+    parser.StartElementHandler = start_element
+    try:
+        parser.Parse(data, True)
+    except expat.ExpatError as e:
+        raise LSXError(str(e)) from None
+    if not edits:
+        return data, matches
+
+    pieces = []
+    position = 0
+    for start, end, replacement in edits:
+        pieces.append(data[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(data[position:])
+    return b"".join(pieces), matches
@@ -0,0 +1,128 @@
+"""Tests for lsf_codec against the LSF resources shipped with the mod."""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import lsf_codec  # noqa: E402
+
+SHIPPED_LSF_FILES = sorted(path for directory in ("Mods", "Public") for path in (REPO_ROOT / directory).rglob("*.lsf"))
+
+
+def iter_translated_strings(resource):
+    """Yield (node, attribute name, TranslatedString) for every TranslatedString in resource."""
+    stack = list(resource.regions)
+    while stack:
+        node = stack.pop()
+        for name, (type_id, value) in node.attributes.items():
+            if type_id == lsf_codec.DT_TRANSLATEDSTRING:
+                yield node, name, value
+        stack.extend(node.children)
+
+
+def first_file_with_translated_strings():
+    for path in SHIPPED_LSF_FILES:
+        data = path.read_bytes()
+        if any(True for _ in iter_translated_strings(lsf_codec.read_lsf(data))):
+            return path, data
+    raise unittest.SkipTest("no shipped LSF file has TranslatedString attributes")
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def test_shipped_files_are_present(self):
+        self.assertTrue(SHIPPED_LSF_FILES)
+
+    def test_write_lsf_round_trip(self):
+        for path in SHIPPED_LSF_FILES:
+            with self.subTest(path=str(path.relative_to(REPO_ROOT))):
+                resource = lsf_codec.read_lsf(path.read_bytes())
+                rewritten = lsf_codec.read_lsf(lsf_codec.write_lsf(resource))
+                self.assertEqual(lsf_codec.write_lsx(rewritten), lsf_codec.write_lsx(resource))
+
+    def test_lsx_round_trip(self):
+        for path in SHIPPED_LSF_FILES:
+            with self.subTest(path=str(path.relative_to(REPO_ROOT))):
+                lsx = lsf_codec.write_lsx(lsf_codec.read_lsf(path.read_bytes()))
+                self.assertEqual(lsf_codec.write_lsx(lsf_codec.read_lsx(lsx)), lsx)
+
+
+class PatchTranslatedStringsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path, self.data = first_file_with_translated_strings()
+        self.resource = lsf_codec.read_lsf(self.data)
+        _, _, self.target = next(iter_translated_strings(self.resource))
+
+    def patch_and_compare(self, new_handle, new_version):
+        def lookup(handle):
+            return (new_handle, new_version) if handle == self.target.handle else None
+
+        patched, matches = lsf_codec.patch_translated_strings(self.data, lookup)
+        self.assertTrue(matches)
+        self.assertTrue(all(match == (self.target.handle, new_handle, new_version) for match in matches))
+
+        # The patched file must decode to the original resource with only that handle changed
+        expected = lsf_codec.read_lsf(self.data)
+        for node, name, value in iter_translated_strings(expected):
+            if value.handle == self.target.handle:
+                value.handle, value.version = new_handle, new_version
+        self.assertEqual(lsf_codec.write_lsx(lsf_codec.read_lsf(patched)), lsf_codec.write_lsx(expected))
+
+    def test_same_length_handle(self):
+        handle = self.target.handle
+        new_handle = handle[:-1] + ("0" if handle[-1] != "0" else "1")
+        self.patch_and_compare(new_handle, self.target.version + 1)
+
+    def test_longer_handle(self):
+        self.patch_and_compare(self.target.handle + "x", self.target.version)
+
+    def test_unknown_handles_leave_data_untouched(self):
+        patched, matches = lsf_codec.patch_translated_strings(self.data, lambda handle: None)
+        self.assertIs(patched, self.data)
+        self.assertEqual(matches, [])
+
+    def test_attribute_filter(self):
+        patched, matches = lsf_codec.patch_translated_strings(
+            self.data, lambda handle: ("h0", 1), attribute_ids=("NoSuchAttribute",))
+        self.assertIs(patched, self.data)
+        self.assertEqual(matches, [])
+
+
+class ConvertFileTest(unittest.TestCase):
+
+    def test_failed_write_removes_temp_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "resource.lsf")
+            destination = os.path.join(directory, "resource.lsx")
+            with open(source, "wb") as f:
+                f.write(SHIPPED_LSF_FILES[0].read_bytes())
+            with mock.patch.object(lsf_codec.os, "replace", side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    lsf_codec.convert_file(source, destination)
+            self.assertEqual(sorted(os.listdir(directory)), ["resource.lsf"])
+
+    def test_convert_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "resource.lsf")
+            lsx = os.path.join(directory, "resource.lsx")
+            back = os.path.join(directory, "back.lsf")
+            data = SHIPPED_LSF_FILES[0].read_bytes()
+            with open(source, "wb") as f:
+                f.write(data)
+            lsf_codec.convert_file(source, lsx)
+            os.rename(lsx, os.path.join(directory, "back.lsx"))
+            lsf_codec.convert_file(os.path.join(directory, "back.lsx"), back)
+            with open(back, "rb") as f:
+                self.assertEqual(lsf_codec.write_lsx(lsf_codec.read_lsf(f.read())),
+                                 lsf_codec.write_lsx(lsf_codec.read_lsf(data)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Long-lived process pool shared by the GUI's operations.
+
+This module is also what the pool's child processes start from: it imports
+nothing beyond the standard library at module level, so a spawned child
+(the default on Windows) never imports PyQt6 or keyring just to run
+fix_translations tasks.
+"""
+
+import sys
+import contextlib
+import multiprocessing
+import threading
+
+
+def _init_child(cancel_event):
+    """Pool initializer: import the task module up front and hand it the pool's cancel event."""
+    import fix_translations
+    fix_translations.init_pool_process(cancel_event)
+
+
+@contextlib.contextmanager
+def _child_main():
+    """Make spawned children import this module as their __main__ instead of the GUI script.
+
+    A spawned child re-imports the parent's __main__ before it runs any
+    task; the GUI's __main__ imports Qt. Only the pool's processes are
+    started while this is in effect. Tasks must then not reference
+    functions defined in the real __main__, which fix_translations tasks
+    never do. Forked children are unaffected.
+    """
+    main_module = sys.modules["__main__"]
+    sys.modules["__main__"] = sys.modules[__name__]
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main_module
+
+
+class WarmPool:
+    """A multiprocessing pool that is started on first use and kept for later operations.
+
+    get() returns the running pool, starting it (or restarting it at a new
+    size) when needed, so only the first operation pays for process start-up.
+    Workers that are given a WarmPool (Worker.pool) run on it instead of
+    starting a pool of their own. cancel_event is shared with the processes;
+    a worker clears it when its run starts and sets it to cancel.
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._processes = 0
+        self._lock = threading.Lock()
+        self.cancel_event = None
+
+    @property
+    def running(self):
+        return self._pool is not None
+
+    def get(self, processes):
+        """Return a running pool of exactly processes processes."""
+        with self._lock:
+            if self._pool is not None and self._processes != processes:
+                self._stop()
+            if self._pool is None:
+                self.cancel_event = multiprocessing.Event()
+                with _child_main():
+                    self._pool = multiprocessing.Pool(processes=processes, initializer=_init_child,
+                                                      initargs=(self.cancel_event,))
+                self._processes = processes
+            return self._pool
+
+    def terminate(self):
+        """Kill the processes and whatever they are running; the next get() starts new ones."""
+        with self._lock:
+            self._stop()
+
+    def _stop(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+            self._processes = 0